@@ -0,0 +1,197 @@
+"""The advice page shown once a user is logged in.
+
+Imported by ``app.py`` only after login, so the login screen never loads the
+rule engine. Like any module it is imported once per process; ``render`` is
+called on every Streamlit rerun.
+"""
+import streamlit as st
+
+from advisor import IncrementalAdvisor, advise
+from db import HISTORY_LIMIT, get_user_advice_history, history_cursor, insert_advice_to_db
+from export_advice import FORMATS, ExportTooLarge, export_bytes
+from facts import BudgetFacts, values_of
+
+# Fields the what-if panel can sweep over their whole slider range.
+WHAT_IF_FIELDS = {
+    'savings_percent': "Savings %",
+    'debt_percent': "Debt %",
+    'subscription_percent': "Subscriptions %",
+    'wants_percent': "Wants %",
+}
+
+
+def load_older_advice():
+    shown = get_user_advice_history(st.session_state.user_id) + st.session_state.older_advice
+    page = get_user_advice_history(st.session_state.user_id,
+                                   before=history_cursor(shown[-1]))
+    st.session_state.older_advice += page
+    st.session_state.advice_exhausted = len(page) < HISTORY_LIMIT
+
+
+def prepare_export():
+    fmt = st.session_state.export_format
+    try:
+        st.session_state.advice_export = (fmt, export_bytes(fmt, st.session_state.user_id))
+    except ExportTooLarge:
+        st.session_state.advice_export_error = (
+            "Your history is too large to download here.")
+
+
+def render_export():
+    # Read from the database only when asked for, so reruns never re-read the
+    # whole history. The (size-capped) bytes are handed to Streamlit on the
+    # rerun that built them and dropped from the session straight away;
+    # Streamlit keeps a rendered download available through the next rerun,
+    # which the click itself triggers.
+    st.radio("Export format", FORMATS, horizontal=True, key='export_format',
+             format_func=str.upper)
+    st.button("📦 Export my full history", on_click=prepare_export)
+    error = st.session_state.pop('advice_export_error', None)
+    if error:
+        st.warning(error)
+    export = st.session_state.pop('advice_export', None)
+    if export:
+        fmt, data = export
+        st.download_button(f"💾 Download advice_history.{fmt}", data=data,
+                           file_name=f"advice_history.{fmt}",
+                           mime='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+
+
+def render_what_if(facts):
+    import rules
+    import what_if
+
+    fields = st.multiselect("Sliders to vary (up to two)", list(WHAT_IF_FIELDS),
+                            default=['savings_percent', 'wants_percent'],
+                            format_func=WHAT_IF_FIELDS.get, max_selections=what_if.MAX_AXES)
+    if not fields:
+        return
+    # A sweep is up to 101 x 101 evaluations; rerun it only when its inputs
+    # change, not on every widget interaction elsewhere on the page.
+    key = (values_of(facts), tuple(fields), rules.RULESET.fingerprint)
+    cached = st.session_state.get('what_if')
+    if cached is None or cached[0] != key:
+        result = what_if.sweep(facts, fields)
+        cached = key, result.minimal_changes(), result.records()
+        st.session_state.what_if = cached
+    _, changes, records = cached
+
+    if not changes:
+        st.info("None of your current advice can be cleared by moving these sliders alone.")
+    for change in changes:
+        moves = ", ".join(f"{WHAT_IF_FIELDS[field]} {facts[field]} → {value}"
+                          for field, value in change.changes.items())
+        line = f"**{change.message}** clears at {moves}"
+        if change.introduces:
+            line += f" (but triggers: {', '.join(change.introduces)})"
+        st.markdown(line)
+
+    # How many pieces of advice each combination of slider values would get.
+    x, y = fields[0], fields[-1]
+    encoding = {'x': {'field': x, 'type': 'quantitative', 'title': WHAT_IF_FIELDS[x]}}
+    if len(fields) == 1:
+        mark = 'line'
+        encoding['y'] = {'field': 'advice', 'type': 'quantitative', 'title': "Advice shown"}
+    else:
+        mark = 'rect'
+        encoding['x']['type'] = 'ordinal'
+        encoding['y'] = {'field': y, 'type': 'ordinal', 'title': WHAT_IF_FIELDS[y],
+                         'sort': 'descending'}
+        encoding['color'] = {'field': 'advice', 'type': 'quantitative', 'title': "Advice shown"}
+    st.vega_lite_chart({'data': {'values': records}, 'mark': mark,
+                        'encoding': encoding}, width='stretch')
+
+
+def render():
+    st.title("💰 Student Budget Advisor")
+    st.sidebar.button("🚪 Logout", on_click=lambda: st.session_state.clear())
+
+    with st.form("budget_form"):
+        st.markdown("### 📊 Financial Ratios")
+        savings_percent = st.slider("Savings (% of income)", 0, 100, 10,
+                                    help="How much of your monthly income do you save?")
+        debt_percent = st.slider("Debt Repayment (% of income)", 0, 100, 10,
+                                  help="How much of your income goes to repaying loans or debt?")
+        subscription_percent = st.slider("Subscription (% of income)", 0, 100, 5,
+                                         help="Monthly subscription fees like Spotify, Netflix, etc.")
+        wants_percent = st.slider("Spending on Wants ((% of income)", 0, 100, 30,
+                                  help="E.g. food delivery, gadgets, fashion (non-essentials)")
+
+        st.markdown("### 🧾 Financial Habits & Reserves")
+        expenses_tracking = st.checkbox("Do you track your daily expenses?",
+                                        help="Do you use apps or notebooks to record daily spending?")
+        emergency_fund = st.number_input("Emergency Fund (RM)", 0,
+                                         help="Cash you can use in case of unexpected situations.")
+
+        st.markdown("### 🎯 Financial Goal")
+        goal_exists = st.checkbox("Do you have a financial goal? (e.g. buy a laptop)", value=False)
+        savings = st.number_input("Current Savings for Goal (RM)", 0,
+                                  help="How much you've saved towards your goal so far.")
+        goal_amount = st.number_input("Goal Target Amount (RM)", 0,
+                                      help="Total amount you need for the goal.")
+
+        # Optional warning if goal is unchecked but inputs are filled
+        if not goal_exists and (savings > 0 or goal_amount > 0):
+            st.warning("You've entered goal details, but did not check the financial goal box.")
+
+        submitted = st.form_submit_button("Get Advice")
+
+    if submitted:
+        # Declare user input facts, validated once here
+        user_facts = BudgetFacts(
+            savings_percent=savings_percent,
+            debt_percent=debt_percent,
+            subscription_percent=subscription_percent,
+            expenses_tracking=expenses_tracking,
+            emergency_fund=emergency_fund,
+            wants_percent=wants_percent,
+            goal_exists=goal_exists,
+            savings=savings,
+            goal_amount=goal_amount
+        )
+
+        # Evaluated on this session's engine; a resubmit with one slider moved
+        # only re-checks the rules that read it.
+        if 'advisor' not in st.session_state:
+            st.session_state.advisor = IncrementalAdvisor()
+        advice_list = advise(user_facts, st.session_state.advisor)
+
+        # Display advice
+        st.subheader("📋 Budgeting Advice")
+        if advice_list:
+            for advice in advice_list:
+                st.write(advice)
+            # Save to DB
+            insert_advice_to_db(
+                user_id=st.session_state.user_id,
+                data_dict=user_facts,
+                advice_text="\n".join(advice_list)
+            )
+            # The first history page changed, so older pages must be re-read after it.
+            st.session_state.pop('older_advice', None)
+        else:
+            st.write("✅ Your budgeting looks healthy. Keep it up!")
+        st.session_state.last_facts = user_facts
+
+    if st.session_state.get('last_facts'):
+        with st.expander("🔍 What would it take to clear this advice?"):
+            render_what_if(st.session_state.last_facts)
+
+    st.markdown("---")
+    with st.expander("📜 View Past Advice"):
+        if 'older_advice' not in st.session_state:
+            st.session_state.older_advice = []
+            st.session_state.advice_exhausted = False
+        past_advice = get_user_advice_history(st.session_state.user_id)
+
+        if not past_advice:
+            st.info("No past advice found.")
+        else:
+            for entry in past_advice + st.session_state.older_advice:
+                st.markdown(f"**Date:** {entry['created_at']}")
+                st.text(f"Savings: {entry['savings_percent']}%, Debt: {entry['debt_percent']}%, Wants: {entry['wants_percent']}%")
+                st.write(entry['advice_text'])
+                st.markdown("---")
+            if len(past_advice) == HISTORY_LIMIT and not st.session_state.advice_exhausted:
+                st.button("⬇️ Load older advice", on_click=load_older_advice)
+            render_export()
@@ -0,0 +1,169 @@
+"""Write-behind queue for ``advice_log`` inserts.
+
+``AdviceWriter`` accepts advice records immediately and a background thread
+flushes them to the database in batches, so a submit no longer waits for a
+MySQL commit before the page finishes rendering. Records that have been
+accepted but not yet written stay visible through ``pending_for`` so a user's
+own history is never missing their latest submit.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE_SIZE = 1000
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 0.5
+PUT_TIMEOUT = 0.1
+
+_STOP = object()
+
+
+class WriterClosed(RuntimeError):
+    """``submit`` was called after ``close`` started."""
+
+
+class AdviceRecord(NamedTuple):
+    user_id: int
+    values: tuple
+    history_row: dict
+
+
+class AdviceWriter:
+    """Background writer that batches advice records.
+
+    ``write_batch`` receives a list of ``AdviceRecord.values`` tuples and must
+    write them all in one transaction, raising on failure. A batch is flushed
+    once it reaches ``batch_size`` records or its oldest record has waited
+    ``flush_interval`` seconds. When the queue is full, ``submit`` blocks for up
+    to ``put_timeout`` seconds before dropping the record. Once ``close`` has
+    started, ``submit`` raises ``WriterClosed``; every record accepted before
+    that is queued ahead of the stop marker and drained.
+
+    ``after_flush``, if given, is called with each flushed batch of records
+    once it is written (or has failed) and no longer returned by
+    ``pending_for``, so callers can drop anything they derived from either.
+    """
+
+    def __init__(self, write_batch: Callable[[List[tuple]], None],
+                 max_queue_size: int = MAX_QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, put_timeout: float = PUT_TIMEOUT,
+                 after_flush: Optional[Callable[[List[AdviceRecord]], None]] = None):
+        self._write_batch = write_batch
+        self._after_flush = after_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        # Notified when the last in-flight submit has finished queueing.
+        self._submits_done = threading.Condition(self._lock)
+        self._submitting = 0
+        self._pending: Dict[int, List[AdviceRecord]] = {}
+        self._stats = {'accepted': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='advice-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, record: AdviceRecord) -> bool:
+        """Queue ``record`` for writing. Returns False if it had to be dropped."""
+        with self._lock:
+            if self._closed:
+                raise WriterClosed("AdviceWriter is closed")
+            self._submitting += 1
+            self._pending.setdefault(record.user_id, []).append(record)
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self._forget([record])
+            with self._lock:
+                self._stats['dropped'] += 1
+            logger.warning("advice_log write-behind queue full; dropped record for user %s",
+                           record.user_id)
+            return False
+        else:
+            with self._lock:
+                self._stats['accepted'] += 1
+            return True
+        finally:
+            with self._lock:
+                self._submitting -= 1
+                if not self._submitting:
+                    self._submits_done.notify_all()
+
+    def pending_for(self, user_id) -> List[dict]:
+        """History rows accepted for ``user_id`` but not yet written, newest first."""
+        with self._lock:
+            records = list(self._pending.get(user_id, ()))
+        return [record.history_row for record in reversed(records)]
+
+    def _forget(self, records: Sequence[AdviceRecord]):
+        with self._lock:
+            for record in records:
+                pending = self._pending.get(record.user_id)
+                if pending is None:
+                    continue
+                pending[:] = [r for r in pending if r is not record]
+                if not pending:
+                    del self._pending[record.user_id]
+
+    def _flush(self, batch: List[AdviceRecord]):
+        try:
+            self._write_batch([record.values for record in batch])
+        except Exception:
+            logger.exception("Failed to write %d advice_log records", len(batch))
+            outcome = 'failed'
+        else:
+            outcome = 'written'
+        self._forget(batch)
+        if self._after_flush is not None:
+            self._after_flush(batch)
+        with self._lock:
+            self._stats[outcome] += len(batch)
+            self._stats['batches'] += 1
+
+    def _run(self):
+        batch: List[AdviceRecord] = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (stopping or len(batch) >= self.batch_size
+                          or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def close(self, timeout: float = None):
+        """Stop accepting records and drain everything already queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Submits that got past the closed check queue ahead of _STOP.
+            while self._submitting:
+                self._submits_done.wait()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(records) for records in self._pending.values())
+        stats['queued'] = self._queue.qsize()
+        return stats
@@ -0,0 +1,319 @@
+"""Advice evaluation shared by every Streamlit session in the process.
+
+Building a ``BudgetAdvisor`` compiles its Rete network, so instead of building
+one per submit, ``EnginePool`` keeps a set of pre-built, warmed engines and
+hands them out one request at a time. In front of the pool, ``AdviceMemo``
+remembers the advice for recently seen inputs, since the bounded form inputs
+make identical submits common.
+"""
+import atexit
+import os
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Hashable, List, Mapping, Optional, Tuple
+
+import rules
+from facts import BudgetFacts
+from metrics import ENGINE_METRICS, MetricsFileWriter
+from rules import FIELDS, UserData, build_engine_class
+from tracing import span
+
+ENGINE_POOL_SIZE = int(os.environ.get('BUDGET_ENGINE_POOL_SIZE', '4'))
+ADVICE_MEMO_SIZE = int(os.environ.get('BUDGET_ADVICE_MEMO_SIZE', '4096'))
+
+# Set to 1 to pool instrumented engines that record into metrics.ENGINE_METRICS.
+# With BUDGET_METRICS_FILE set, the metrics are also written to that file in
+# Prometheus text format every BUDGET_METRICS_INTERVAL seconds.
+ENGINE_METRICS_ENABLED = os.environ.get('BUDGET_ENGINE_METRICS', '0') == '1'
+METRICS_FILE = os.environ.get('BUDGET_METRICS_FILE')
+METRICS_INTERVAL = float(os.environ.get('BUDGET_METRICS_INTERVAL', '15'))
+
+_WARMUP_FACTS = {
+    'savings_percent': 5,
+    'debt_percent': 25,
+    'subscription_percent': 15,
+    'expenses_tracking': False,
+    'emergency_fund': 300,
+    'wants_percent': 35,
+    'goal_exists': True,
+    'savings': 400,
+    'goal_amount': 1000,
+}
+
+
+def run_engine(engine, facts: Mapping) -> List[str]:
+    """Evaluate ``facts`` on ``engine``, clearing any state from earlier runs.
+
+    Returns the advice in catalog order, as ``RuleSet.evaluate`` and
+    ``IncrementalAdvisor`` do, not in experta's firing order.
+    """
+    engine.reset()
+    # reset() clears working memory and the agenda but not our advice list.
+    engine.advice_list = []
+    engine.declare(UserData(**facts))
+    engine.run()
+    return engine.ruleset.in_catalog_order(engine.advice_list)
+
+
+class EnginePool:
+    """A thread-safe pool of pre-built ``BudgetAdvisor`` engines.
+
+    ``size`` engines are built and warmed up front. If every engine is checked
+    out, a checkout builds an extra one rather than waiting; extras are
+    discarded on return once the pool is full again.
+    """
+
+    def __init__(self, engine_class=None, size: int = ENGINE_POOL_SIZE):
+        self.engine_class = engine_class or rules.BudgetAdvisor
+        self.size = size
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._stats = {'checkouts': 0, 'created': 0, 'overflow': 0}
+        for _ in range(size):
+            self._idle.put(self._build())
+
+    def _build(self):
+        engine = self.engine_class()
+        run_engine(engine, _WARMUP_FACTS)
+        with self._lock:
+            self._stats['created'] += 1
+        return engine
+
+    @contextmanager
+    def checkout(self):
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            engine = self._build()
+            with self._lock:
+                self._stats['overflow'] += 1
+        with self._lock:
+            self._stats['checkouts'] += 1
+        try:
+            yield engine
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(engine)
+
+    def evaluate(self, facts: Mapping) -> List[str]:
+        """Return the advice for one ``user_facts`` dict."""
+        with self.checkout() as engine:
+            return run_engine(engine, facts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+
+class IncrementalAdvisor:
+    """One session's engine, kept between submits and updated in place.
+
+    The first ``evaluate`` declares a ``UserData`` fact and fires every rule.
+    Later calls ``modify`` that fact with just the fields that changed and only
+    let the rules that read one of them (``RuleSet.rules_by_field``) fire; every
+    other rule keeps its earlier outcome, which cannot have changed. Not
+    thread-safe: keep one per Streamlit session.
+    """
+
+    def __init__(self, engine_class=None):
+        self._stats = {'full': 0, 'incremental': 0, 'unchanged': 0, 'rules_rechecked': 0}
+        self.rebind(engine_class or get_engine_pool().engine_class)
+
+    def rebind(self, engine_class):
+        """Start over on a new engine class, e.g. after the rules were reloaded."""
+        self.engine_class = engine_class
+        self.ruleset = engine_class.ruleset
+        self.engine = engine_class()
+        self._rule_index = {name: i for i, name in enumerate(self.ruleset.names)}
+        self._fact = None
+        self._fired = set()
+
+    def _fire(self, affected: Optional[set]) -> set:
+        # Match the changed fact, schedule only the activations of rules in
+        # ``affected``, then run; returns the catalog positions that fired.
+        engine = self.engine
+        added, removed = engine.get_activations()
+        if affected is not None:
+            added = [act for act in added if self._rule_index[act.rule.__name__] in affected]
+        engine.strategy.update_agenda(engine.agenda, added, removed)
+        fired = {self._rule_index[act.rule.__name__] for act in engine.agenda.activations}
+        engine.run()
+        return fired
+
+    def evaluate(self, facts: Mapping) -> List[str]:
+        """Advice for ``facts``, the same as a full evaluation, in catalog order."""
+        engine = self.engine
+        if self._fact is None:
+            engine.reset()
+            engine.advice_list = []
+            self._fact = engine.declare(UserData(**facts))
+            self._fired = self._fire(None)
+            self._stats['full'] += 1
+            self._stats['rules_rechecked'] += len(self.ruleset)
+        else:
+            changes = {field: value for field, value in facts.items()
+                       if field not in self._fact or self._fact[field] != value}
+            if not changes:
+                self._stats['unchanged'] += 1
+            else:
+                rules_by_field = self.ruleset.rules_by_field
+                affected = {i for field in changes for i in rules_by_field.get(field, ())}
+                engine.advice_list = []
+                # Outside run(), modify would put every new activation on the
+                # agenda itself; marked as running, it leaves that to _fire.
+                engine.running = True
+                try:
+                    self._fact = engine.modify(self._fact, **changes)
+                finally:
+                    engine.running = False
+                self._fired = (self._fired - affected) | self._fire(affected)
+                self._stats['incremental'] += 1
+                self._stats['rules_rechecked'] += len(affected)
+        messages = self.ruleset.messages
+        return [messages[i] for i in sorted(self._fired)]
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+def fact_key(facts: Mapping) -> Optional[Tuple]:
+    """Canonical, hashable form of a complete ``user_facts`` dict.
+
+    Values keep their own equality, so ``1``, ``1.0`` and ``True`` give the same
+    key, exactly as they match the same experta patterns. Returns None for facts
+    that cannot be memoized (missing fields or unhashable values).
+    """
+    if type(facts) is BudgetFacts:
+        return facts.as_tuple()
+    try:
+        key = tuple(facts[field] for field in FIELDS)
+        hash(key)
+    except (KeyError, TypeError):
+        return None
+    return key
+
+
+class AdviceMemo:
+    """A bounded LRU map from ``fact_key`` to advice, tied to one rule set.
+
+    Every lookup passes the fingerprint of the rule set that would evaluate the
+    facts. When it differs from the one the memo was filled under, the memo is
+    cleared, so advice from an old rule set is never served.
+    """
+
+    def __init__(self, maxsize: int = ADVICE_MEMO_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[str, ...]]" = OrderedDict()
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _check_fingerprint(self, fingerprint: str):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    def get(self, key: Hashable, fingerprint: str) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            advice = self._entries.get(key)
+            if advice is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return advice
+
+    def put(self, key: Hashable, fingerprint: str, advice: List[str]):
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._entries[key] = tuple(advice)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_memo = AdviceMemo()
+_metrics_writer: Optional[MetricsFileWriter] = None
+
+
+def _engine_class():
+    if not ENGINE_METRICS_ENABLED:
+        return rules.BudgetAdvisor
+    global _metrics_writer
+    if METRICS_FILE and _metrics_writer is None:
+        _metrics_writer = MetricsFileWriter(ENGINE_METRICS, METRICS_FILE, METRICS_INTERVAL)
+        atexit.register(_metrics_writer.close)
+    return build_engine_class(rules.RULESET, 'InstrumentedBudgetAdvisor', metrics=ENGINE_METRICS)
+
+
+def get_engine_pool() -> EnginePool:
+    """Return the process-wide engine pool, building it on first use.
+
+    Picks up an edited rules.json (``rules.check_for_updates``) and replaces the
+    pool with one for the new rules. Requests holding the old pool finish on it.
+    """
+    global _pool
+    rules.check_for_updates()
+    pool = _pool
+    if pool is None or pool.engine_class.ruleset is not rules.RULESET:
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.engine_class.ruleset is not rules.RULESET:
+                pool = _pool = EnginePool(_engine_class())
+    return pool
+
+
+def advise(facts: Mapping, session: Optional[IncrementalAdvisor] = None) -> List[str]:
+    """Advice for one submit of the budget form.
+
+    With ``session``, memo misses are evaluated incrementally on that session's
+    engine instead of on a pooled one.
+    """
+    pool = get_engine_pool()
+    if session is not None and session.ruleset is not pool.engine_class.ruleset:
+        session.rebind(pool.engine_class)
+    evaluate = pool.evaluate if session is None else session.evaluate
+    key = fact_key(facts)
+    if key is None:
+        with span('engine.evaluate', memo='skip'):
+            return evaluate(facts)
+
+    fingerprint = pool.engine_class.ruleset.fingerprint
+    advice = _memo.get(key, fingerprint)
+    if advice is None:
+        with span('engine.evaluate', memo='miss', incremental=session is not None):
+            advice = evaluate(facts)
+        _memo.put(key, fingerprint, advice)
+    return list(advice)
+
+
+def memo_stats() -> dict:
+    return _memo.stats()
+
+
+def engine_metrics_text() -> str:
+    """Engine metrics in Prometheus text format (all zero unless instrumentation is on)."""
+    return ENGINE_METRICS.prometheus()
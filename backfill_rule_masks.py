@@ -0,0 +1,69 @@
+"""Convert advice_log rows stored as joined advice text to rule masks.
+
+Walks ``advice_log`` in id order, in batches, mapping each row's advice lines
+back to rule ids in ``rules.json``. Converted rows get ``rule_mask`` set and
+``advice_text`` cleared. Rows with a line the catalog does not recognise are
+left as text and counted. The walk is resumable: already converted rows are
+skipped, so the script can be stopped and run again. A converted row renders
+to the same advice text, so history already cached by running apps stays valid.
+
+Usage::
+
+    python backfill_rule_masks.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import sys
+import time
+from typing import Dict, Optional, TextIO
+
+BATCH_SIZE = 1000
+
+
+def backfill(batch_size: int = BATCH_SIZE, dry_run: bool = False,
+             progress: Optional[TextIO] = sys.stderr) -> Dict[str, int]:
+    """Backfill every text row; returns converted, unmatched and scanned counts."""
+    import db
+    from rules import RULESET
+
+    storage = db.get_storage()
+    counts = {'scanned': 0, 'converted': 0, 'unmatched': 0}
+    after_id = 0
+    start = time.perf_counter()
+    while True:
+        rows = storage.legacy_advice(after_id, batch_size)
+        if not rows:
+            break
+        updates = []
+        for row_id, advice_text in rows:
+            rule_mask = RULESET.mask_for_messages(advice_text.split("\n") if advice_text else [])
+            if rule_mask is None:
+                counts['unmatched'] += 1
+            else:
+                updates.append((rule_mask, row_id))
+        if updates and not dry_run:
+            storage.set_rule_masks(updates)
+        counts['scanned'] += len(rows)
+        counts['converted'] += len(updates)
+        after_id = rows[-1][0]
+        if progress:
+            print(f"{counts['scanned']} rows scanned, {counts['converted']} converted "
+                  f"({time.perf_counter() - start:.1f}s)", file=progress)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill advice_log.rule_mask from advice text.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"rows read and updated per transaction (default: {BATCH_SIZE})")
+    parser.add_argument('--dry-run', action='store_true', help="count rows without updating")
+    parser.add_argument('--quiet', '-q', action='store_true', help="no per-batch progress")
+    args = parser.parse_args(argv)
+
+    counts = backfill(args.batch_size, args.dry_run, progress=None if args.quiet else sys.stderr)
+    verb = "Would convert" if args.dry_run else "Converted"
+    print(f"{verb} {counts['converted']} of {counts['scanned']} text rows; "
+          f"{counts['unmatched']} left as text (advice not in rules.json)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Vectorized evaluation of the BudgetAdvisor rules over many users at once.
+
+The experta engine evaluates one ``UserData`` fact per run. For cohort
+re-scoring we instead take each of the nine fields as a NumPy column and
+evaluate every rule in ``rules.json`` as a boolean mask over the whole column
+at once.
+
+The catalog can be reloaded while the process runs (``rules.check_for_updates``),
+so every function here reads ``rules.RULESET`` when called, and a caller that
+evaluates and then renders should pass the same ``ruleset`` to both.
+"""
+from typing import Dict, Iterable, List, Mapping, Optional, Union
+
+import numpy as np
+
+import rules
+from facts import FactBatch
+from rules import FIELDS, RuleSet
+
+
+def _as_columns(columns: Mapping[str, Iterable]) -> Dict[str, np.ndarray]:
+    if isinstance(columns, FactBatch):
+        return columns.columns()
+    missing = [field for field in FIELDS if field not in columns]
+    if missing:
+        raise KeyError(f"Missing UserData columns: {', '.join(missing)}")
+
+    arrays = {field: np.asarray(columns[field]) for field in FIELDS}
+    lengths = {array.shape for array in arrays.values()}
+    if len(lengths) != 1 or len(next(iter(lengths))) != 1:
+        raise ValueError("All UserData columns must be 1-D arrays of the same length")
+    return arrays
+
+
+def evaluate_batch(columns: Union[FactBatch, Mapping[str, Iterable]],
+                   ruleset: Optional[RuleSet] = None) -> np.ndarray:
+    """Evaluate every rule for every user.
+
+    ``columns`` is a ``FactBatch``, or maps each of the nine ``FIELDS`` to an
+    array-like of equal length. Returns a boolean matrix of shape
+    ``(n_users, len(ruleset))`` whose ``[i, j]`` entry is True when rule
+    ``ruleset.names[j]`` fires for user ``i``. ``ruleset`` defaults to the
+    catalog live at the time of the call.
+    """
+    c = _as_columns(columns)
+    n = len(c[FIELDS[0]])
+    # Constant conditions come back as scalars, and a bare field as its own
+    # column; make each a bool mask with one entry per user.
+    masks = [np.broadcast_to(np.asarray(mask, dtype=bool), (n,))
+             for mask in (ruleset or rules.RULESET).evaluate_columns(c)]
+    return np.column_stack(masks) if masks else np.zeros((n, 0), dtype=bool)
+
+
+def columns_from_facts(facts: Iterable[Mapping]) -> Dict[str, np.ndarray]:
+    """Turn a sequence of ``user_facts`` dicts into per-field columns."""
+    facts = list(facts)
+    return {field: np.array([fact[field] for fact in facts]) for field in FIELDS}
+
+
+def advice_lists(matrix: np.ndarray, ruleset: Optional[RuleSet] = None) -> List[List[str]]:
+    """Render an advice matrix back into one advice list per user.
+
+    Pass the ``ruleset`` the matrix was evaluated with.
+    """
+    messages = (ruleset or rules.RULESET).messages
+    return [
+        [messages[j] for j in np.flatnonzero(row)]
+        for row in matrix
+    ]
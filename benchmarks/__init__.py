@@ -0,0 +1,4 @@
+"""Performance benchmarks for the Student Budget Advisor.
+
+Each module is runnable on its own, e.g. ``python -m benchmarks.bench_rules``.
+"""
@@ -0,0 +1,73 @@
+"""Per-request latency and allocations with and without the engine pool.
+
+"Unpooled" is the old submit path: build a ``BudgetAdvisor``, reset, declare,
+run. "Pooled" checks out a pre-built engine from ``EnginePool`` instead.
+
+Run with ``python -m benchmarks.bench_engine_pool [--requests N]``.
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from advisor import EnginePool, run_engine
+from benchmarks.bench_rules import SAMPLE_FACTS
+from rules import BudgetAdvisor
+
+
+def unpooled(facts=SAMPLE_FACTS):
+    engine = BudgetAdvisor()
+    run_engine(engine, facts)
+    return engine
+
+
+def make_pooled():
+    pool = EnginePool(size=1)
+
+    def pooled(facts=SAMPLE_FACTS):
+        with pool.checkout() as engine:
+            return list(run_engine(engine, facts))
+    return pooled
+
+
+def latency_us(func, requests):
+    func()
+    start = time.perf_counter()
+    for _ in range(requests):
+        func()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def allocations(func):
+    """Memory blocks still held at the end of one request, and its peak traced memory."""
+    func()
+    gc.collect()
+    gc.disable()
+    try:
+        tracemalloc.start()
+        before = sys.getallocatedblocks()
+        result = func()
+        blocks = sys.getallocatedblocks() - before
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    finally:
+        gc.enable()
+    return blocks, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args(argv)
+
+    print(f"{'path':<12}{'us/request':>12}{'blocks/request':>16}{'peak KiB':>10}")
+    for label, func in (('unpooled', unpooled), ('pooled', make_pooled())):
+        us = latency_us(func, args.requests)
+        blocks, peak = allocations(func)
+        print(f"{label:<12}{us:>12.1f}{blocks:>16}{peak / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Per-record memory and construction time of the fact representations.
+
+Compares, for the same synthetic submits:
+
+* ``dict``: the old ``user_facts`` dict,
+* ``dict + UserData``: that dict wrapped in the experta fact the engine declares,
+* ``BudgetFacts``: the slotted record, built (and validated) from form values,
+* ``BudgetFacts + UserData``: the record as the engine still sees it,
+* ``FactBatch``: records appended to the columnar batch.
+
+Memory is what ``tracemalloc`` sees allocated per record while ``--records``
+of them are alive, so shared small ints are not counted. Construction time is
+the best of five runs.
+
+Run with ``python -m benchmarks.bench_facts [--records N]``.
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.bench_parallel import synthetic_records
+from facts import FIELDS, BudgetFacts, FactBatch
+from rules import UserData
+
+
+def build_all(make, values):
+    return [make(v) for v in values]
+
+
+def build_batch(_, values):
+    batch = FactBatch()
+    for v in values:
+        batch.append(BudgetFacts(*v))
+    return batch
+
+
+CASES = {
+    'dict': (build_all, lambda v: dict(zip(FIELDS, v))),
+    'dict + UserData': (build_all, lambda v: UserData(**dict(zip(FIELDS, v)))),
+    'BudgetFacts': (build_all, lambda v: BudgetFacts(*v)),
+    'BudgetFacts + UserData': (build_all, lambda v: UserData(**BudgetFacts(*v))),
+    'FactBatch': (build_batch, None),
+}
+
+
+def measure(build, make, values):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(make, values)
+    per_record = (tracemalloc.get_traced_memory()[0] - before) / len(values)
+    tracemalloc.stop()
+    del kept
+
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        build(make, values)
+        best = min(best, time.perf_counter() - start)
+    return per_record, best / len(values) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=20_000)
+    args = parser.parse_args(argv)
+
+    values = [tuple(record.values()) for record in synthetic_records(args.records)]
+    print(f"{args.records} records")
+    print(f"{'representation':<24}{'bytes/record':>14}{'us/record':>12}")
+    for name, (build, make) in CASES.items():
+        per_record, us = measure(build, make, values)
+        print(f"{name:<24}{per_record:>14,.0f}{us:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Login throughput for several scrypt cost settings.
+
+Each simulated login verifies a password against a stored hash, as
+``check_credentials`` does. Logins are issued from ``--clients`` threads (one
+per concurrent Streamlit session) and hashed either inline or in the process
+pool.
+
+Run with ``python -m benchmarks.bench_login [--clients 8] [--workers 2]``.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import passwords
+from passwords import LegacySha256Hasher, ScryptHasher
+
+COSTS = (2 ** 12, 2 ** 14, 2 ** 15)
+
+
+def run(hasher, workers, clients, logins):
+    passwords.configure(hasher=hasher, workers=workers)
+    stored = passwords.hash_password("correct horse")
+    passwords.verify_password("correct horse", stored)  # warm the worker processes
+
+    latencies = []
+
+    def login(_):
+        start = time.perf_counter()
+        valid, _ = passwords.verify_password("correct horse", stored)
+        latencies.append(time.perf_counter() - start)
+        assert valid
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    passwords._pool.shutdown()
+
+    latencies.sort()
+    return logins / elapsed, latencies[len(latencies) // 2] * 1e3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help="concurrent login threads")
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 4),
+                        help="hashing processes for the pooled runs")
+    parser.add_argument('--logins', type=int, default=64, help="logins per setting")
+    args = parser.parse_args(argv)
+
+    print(f"{'hasher':<24}{'mode':<12}{'logins/s':>12}{'p50 ms':>10}")
+    settings = [('sha256 (legacy)', LegacySha256Hasher())]
+    settings += [(f'scrypt n=2^{n.bit_length() - 1}', ScryptHasher(n=n)) for n in COSTS]
+    for label, hasher in settings:
+        for mode, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+            rate, p50 = run(hasher, workers, args.clients, args.logins)
+            print(f"{label:<24}{mode:<12}{rate:>12.1f}{p50:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Throughput of ``ParallelAdvisor`` from one worker process up to N.
+
+Scores the same synthetic records with 1, 2, ... N workers and reports
+records/sec and the speedup over one worker, next to a single in-process
+``EnginePool`` as the no-multiprocessing baseline. Worker start-up is excluded:
+each pool scores a warm-up batch before it is timed.
+
+Run with ``python -m benchmarks.bench_parallel [--records N] [--max-workers N]``.
+"""
+import argparse
+import os
+import time
+
+from advisor import EnginePool
+from benchmarks.suite import synthetic_columns
+from parallel_advisor import CHUNK_SIZE, ParallelAdvisor
+from rules import FIELDS
+
+
+def synthetic_records(n: int, seed: int = 0) -> list:
+    columns = synthetic_columns(n, seed)
+    return [{field: columns[field][i].item() for field in FIELDS} for i in range(n)]
+
+
+def in_process_rate(records) -> float:
+    pool = EnginePool(size=1)
+    start = time.perf_counter()
+    for facts in records:
+        pool.evaluate(facts)
+    return len(records) / (time.perf_counter() - start)
+
+
+def parallel_rate(records, workers: int, chunk_size: int) -> float:
+    with ParallelAdvisor(workers, chunk_size) as advisor:
+        for _ in advisor.score(records[:workers * chunk_size]):
+            pass
+        start = time.perf_counter()
+        for _ in advisor.score(records):
+            pass
+        return len(records) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure ParallelAdvisor scaling.")
+    parser.add_argument('--records', type=int, default=20_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    records = synthetic_records(args.records)
+    print(f"{args.records} records, chunk size {args.chunk_size}, {os.cpu_count()} CPUs")
+    print(f"{'':<16}{'records/sec':>14}{'speedup':>10}")
+    print(f"{'in-process':<16}{in_process_rate(records):>14,.0f}{'':>10}")
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        rate = parallel_rate(records, workers, args.chunk_size)
+        base = base or rate
+        print(f"{f'{workers} workers':<16}{rate:>14,.0f}{rate / base:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
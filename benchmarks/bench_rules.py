@@ -0,0 +1,65 @@
+"""Per-evaluation latency: compiled rules.json evaluators vs the experta engine.
+
+Run with ``python -m benchmarks.bench_rules [--number N]``.
+"""
+import argparse
+import timeit
+
+from decision_table import get_decision_table
+from rules import RULESET, BudgetAdvisor, UserData
+
+SAMPLE_FACTS = {
+    'savings_percent': 5,
+    'debt_percent': 25,
+    'subscription_percent': 15,
+    'expenses_tracking': False,
+    'emergency_fund': 300,
+    'wants_percent': 35,
+    'goal_exists': True,
+    'savings': 400,
+    'goal_amount': 1000,
+}
+
+
+def knowledge_engine_path(facts=SAMPLE_FACTS):
+    # What app.py does on every submit.
+    engine = BudgetAdvisor()
+    engine.reset()
+    engine.declare(UserData(**facts))
+    engine.run()
+    return engine.advice_list
+
+
+def compiled_path(facts=SAMPLE_FACTS):
+    return RULESET.evaluate(facts)
+
+
+def decision_table_path(facts=SAMPLE_FACTS, table=get_decision_table(RULESET)):
+    return table.evaluate(facts)
+
+
+def per_call_us(func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000,
+                        help="evaluations per timing run (default: 2000)")
+    args = parser.parse_args(argv)
+
+    assert set(knowledge_engine_path()) == set(compiled_path()) == set(decision_table_path())
+
+    engine_us = per_call_us(knowledge_engine_path, max(args.number // 20, 1))
+    compiled_us = per_call_us(compiled_path, args.number)
+    table_us = per_call_us(decision_table_path, args.number)
+    print(f"KnowledgeEngine (new+reset+declare+run): {engine_us:10.2f} us/eval")
+    print(f"Compiled rules.json evaluator:           {compiled_us:10.2f} us/eval"
+          f"  ({engine_us / compiled_us:.0f}x)")
+    print(f"Decision table:                          {table_us:10.2f} us/eval"
+          f"  ({engine_us / table_us:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
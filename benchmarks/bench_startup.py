@@ -0,0 +1,81 @@
+"""Import and rerun cost of the Streamlit app.
+
+Import times are measured in fresh interpreters, on top of ``streamlit``
+itself: what the login screen imports (``db``) and what the first page after
+login adds (``advice_page``, which brings in the rule engine). Rerun times run
+``app.py`` with Streamlit's ``AppTest`` against a throwaway SQLite database,
+once on the login screen and once logged in.
+
+Run with ``python -m benchmarks.bench_startup [--runs 5]``.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'app.py')
+
+_IMPORT_SCRIPT = """
+import time
+{setup}
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def import_seconds(module: str, setup: str = "import streamlit", runs: int = 5) -> list:
+    """Seconds to import ``module`` in a fresh interpreter, after running ``setup``."""
+    script = _IMPORT_SCRIPT.format(setup=setup, module=module)
+    env = dict(os.environ, BUDGET_DB_BACKEND='sqlite')
+    return [float(subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                                 capture_output=True, text=True, check=True).stdout)
+            for _ in range(runs)]
+
+
+def rerun_seconds(logged_in: bool, runs: int = 5) -> list:
+    """Seconds per ``app.py`` rerun after the first, on the login screen or logged in."""
+    from streamlit.testing.v1 import AppTest
+
+    import db
+    from storage import SQLiteStorage
+
+    directory = tempfile.mkdtemp(prefix='budget-bench-')
+    db.configure_storage(SQLiteStorage(os.path.join(directory, 'bench.db')))
+    app = AppTest.from_file(APP_PATH, default_timeout=30)
+    if logged_in:
+        db.create_user("bench", "bench")
+        app.session_state.user_id = db.check_credentials("bench", "bench")
+    app.run()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+    assert not app.exception, app.exception
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app import and rerun times.")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rows = [
+        ("import db (login screen)", import_seconds('db', runs=args.runs)),
+        ("import advice_page (after login)",
+         import_seconds('advice_page', setup="import streamlit, db", runs=args.runs)),
+        ("rerun, login screen", rerun_seconds(False, args.runs)),
+        ("rerun, logged in", rerun_seconds(True, args.runs)),
+    ]
+    print(f"{'':<34}{'median ms':>10}{'min ms':>10}")
+    for label, times in rows:
+        print(f"{label:<34}{statistics.median(times) * 1e3:>10.1f}{min(times) * 1e3:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""Concurrent-session load test for ``app.py``.
+
+Drives ``--sessions`` headless Streamlit sessions (``AppTest``) at once, each
+in its own thread, through the real script: open the login screen, log in with
+``check_credentials``, then ``--submits`` rounds of a ``budget_form`` submit
+followed by a plain rerun that re-reads the past-advice history. Sessions
+pause a random think time (uniform, ``--think-time`` seconds on average)
+between steps and start staggered over the first think time.
+
+Everything runs in this process, the way one ``streamlit run`` server runs all
+of its sessions, against a throwaway SQLite database, so no network, browser
+or MySQL server is needed. Users are created up front, with ``--history``
+earlier advice rows each.
+
+Reports p50/p95/p99 latency and throughput per step. Run with::
+
+    python -m benchmarks.load_test --sessions 20 --submits 5 --think-time 0.5
+
+Password hashing uses the configured scrypt cost; set ``BUDGET_SCRYPT_N`` to
+time logins with a different cost.
+"""
+import argparse
+import atexit
+import datetime
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List
+from unittest import mock
+
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+STEPS = ('open', 'login', 'submit', 'history')
+PASSWORD = "load-test"
+
+# The form's sliders, by label prefix, and the range each submit draws from.
+SLIDERS = {
+    'Savings': (0, 40),
+    'Debt': (0, 50),
+    'Subscription': (0, 30),
+    'Spending on Wants': (10, 60),
+}
+
+
+def percentile(sorted_times: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(sorted_times) - 1, round(p / 100 * len(sorted_times) + 0.5) - 1))
+    return sorted_times[index]
+
+
+@contextmanager
+def shared_runtime():
+    """Let ``AppTest`` sessions run on several threads at once.
+
+    Each ``AppTest`` run installs a mock ``Runtime`` singleton and patches the
+    Streamlit config for its duration, then clears both, so overlapping runs
+    undo each other's setup. Inside this block the first runtime installed is
+    kept for every session, as one server shares one runtime, and the config
+    is patched once for the whole load test.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.util import patch_config_options
+
+    class KeepFirstRuntime(type):
+        def __setattr__(cls, name, value):
+            if name != '_instance':
+                super().__setattr__(name, value)
+            elif value is not None and Runtime._instance is None:
+                Runtime._instance = value
+
+    shared = KeepFirstRuntime('SharedRuntime', (Runtime,), {})
+    try:
+        with mock.patch.object(app_test, 'Runtime', shared), \
+                mock.patch.object(app_test, 'patch_config_options', lambda _: nullcontext()), \
+                patch_config_options({'global.appTest': True}):
+            yield
+    finally:
+        Runtime._instance = None
+
+
+def seed_users(storage, sessions: int, history: int) -> List[str]:
+    """Create one user per session, each with ``history`` earlier advice rows."""
+    import passwords
+    from rules import FIELDS, RULESET
+    from storage import utc_now
+
+    stored = passwords.hash_password(PASSWORD)
+    usernames = [f"load-{i}" for i in range(sessions)]
+    rng = random.Random(0)
+    start = utc_now() - datetime.timedelta(days=history)
+    for username in usernames:
+        storage.add_user(username, stored)
+        user_id = storage.find_user(username)[0]
+        rows = []
+        for day in range(history):
+            values = (rng.randint(0, 40), rng.randint(0, 50), rng.randint(0, 30), True,
+                      rng.randint(0, 2000), rng.randint(10, 60), False, 0, 0)
+            facts = dict(zip(FIELDS, values))
+            rows.append((user_id,) + values
+                        + (None, RULESET.mask(RULESET.fired_indices(facts)),
+                           start + datetime.timedelta(days=day)))
+        if rows:
+            storage.insert_advice_batch(rows)
+    return usernames
+
+
+class Session:
+    """One simulated user, driving its own ``AppTest`` through the app."""
+
+    def __init__(self, username: str, think_time: float, seed: int, timeout: float):
+        self.username = username
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.times: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def think(self):
+        if self.think_time:
+            time.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+    def step(self, name: str, action, check) -> bool:
+        start = time.perf_counter()
+        try:
+            action()
+        except Exception:
+            ok = False
+        else:
+            ok = not self.app.exception and check()
+        self.times[name].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[name] += 1
+        return ok
+
+    def submit(self):
+        app = self.app
+        for slider in app.slider:
+            for prefix, (low, high) in SLIDERS.items():
+                if slider.label.startswith(prefix):
+                    slider.set_value(self.rng.randint(low, high))
+        app.number_input[0].set_value(self.rng.randint(0, 2000))
+        next(button for button in app.button if button.label == "Get Advice").click().run()
+
+    def has_history(self) -> bool:
+        return any(m.value.startswith("**Date:**") for m in self.app.markdown)
+
+    def run(self, submits: int):
+        app = self.app
+        time.sleep(self.rng.uniform(0, self.think_time))
+        if not self.step('open', app.run, lambda: len(app.text_input) >= 2):
+            return
+        self.think()
+        app.text_input[0].input(self.username)
+        app.text_input[1].input(PASSWORD)
+        if not self.step('login', lambda: app.button[0].click().run(),
+                         lambda: 'user_id' in app.session_state):
+            return
+        for _ in range(submits):
+            self.think()
+            self.step('submit', self.submit, lambda: len(app.subheader) > 0)
+            self.think()
+            self.step('history', app.run, self.has_history)
+
+
+def run(sessions: int, submits: int, think_time: float, history: int = 10,
+        timeout: float = 60) -> dict:
+    """Run the load test.
+
+    Returns the wall time and, under ``'steps'``, each step's count, errors,
+    p50/p95/p99 latency in ms and completions per second.
+    """
+    import db
+    from storage import SQLiteStorage
+
+    directory = tempfile.mkdtemp(prefix='budget-load-')
+    atexit.register(shutil.rmtree, directory, True)
+    db.configure_storage(SQLiteStorage(os.path.join(directory, 'load.db')))
+    users = seed_users(db.get_storage(), sessions, history)
+
+    # Import and warm the advice path once, as a long-running server would have.
+    import advisor
+
+    advisor.get_engine_pool()
+
+    clients = [Session(username, think_time, seed, timeout)
+               for seed, username in enumerate(users)]
+    start = time.perf_counter()
+    with shared_runtime(), ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(lambda session: session.run(submits), clients))
+    elapsed = time.perf_counter() - start
+
+    results = {'sessions': sessions, 'elapsed': elapsed, 'steps': {}}
+    for step in STEPS:
+        times = sorted(t for client in clients for t in client.times[step])
+        if not times:
+            continue
+        results['steps'][step] = {
+            'count': len(times),
+            'errors': sum(client.errors[step] for client in clients),
+            'p50': percentile(times, 50) * 1e3,
+            'p95': percentile(times, 95) * 1e3,
+            'p99': percentile(times, 99) * 1e3,
+            'per_sec': len(times) / elapsed,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app.py with concurrent "
+                                                 "headless sessions.")
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent sessions")
+    parser.add_argument('--submits', type=int, default=5,
+                        help="form submits (each followed by a history rerun) per session")
+    parser.add_argument('--think-time', type=float, default=0.5,
+                        help="mean pause between a session's steps, in seconds")
+    parser.add_argument('--history', type=int, default=10,
+                        help="earlier advice rows per user")
+    parser.add_argument('--timeout', type=float, default=60,
+                        help="seconds before a single script run counts as failed")
+    parser.add_argument('--trace', action='store_true',
+                        help="keep the slow-request log (tracing.py) on stderr")
+    args = parser.parse_args(argv)
+
+    # Each AppTest run outside a Streamlit server logs missing-context warnings.
+    streamlit.logger.set_log_level('error')
+    if not args.trace:
+        logging.getLogger('budget.trace').setLevel(logging.ERROR)
+    results = run(args.sessions, args.submits, args.think_time, args.history, args.timeout)
+
+    print(f"{args.sessions} sessions, {args.submits} submits each, "
+          f"{args.think_time}s think time, {results['elapsed']:.1f}s")
+    print(f"{'step':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'per sec':>10}")
+    for step, stats in results['steps'].items():
+        print(f"{step:<10}{stats['count']:>7}{stats['errors']:>8}{stats['p50']:>10.1f}"
+              f"{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['per_sec']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+"""Benchmark suite for the advisor and data paths.
+
+Runs every registered case, prints a summary table and saves the results as
+JSON so runs from different commits can be compared::
+
+    python -m benchmarks.suite --output bench_results.json
+    python -m benchmarks.suite --only engine --compare bench_results.json
+
+Data-path cases run the real ``db`` functions against a throwaway SQLite
+database by default, so no MySQL server is needed; ``--db-backend mysql``
+times the same cases against the configured MySQL server instead.
+"""
+import argparse
+import atexit
+import datetime
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.bench_rules import SAMPLE_FACTS
+
+CASES: Dict[str, Callable[[argparse.Namespace], dict]] = {}
+
+
+def case(name: str):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+def time_calls(func: Callable, number: int, repeat: int = 5) -> dict:
+    """Latency statistics for ``func``, timed in ``repeat`` runs of ``number`` calls."""
+    func()
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        per_call.append((time.perf_counter() - start) / number)
+    best = min(per_call)
+    return {
+        'unit': 'us/op',
+        'best': best * 1e6,
+        'median': statistics.median(per_call) * 1e6,
+        'ops_per_sec': 1 / best,
+        'calls': number * repeat,
+    }
+
+
+def _times_result(times: List[float]) -> dict:
+    """``time_calls``-style result, in ms, for separately timed runs."""
+    return {
+        'unit': 'ms',
+        'best': min(times) * 1e3,
+        'median': statistics.median(times) * 1e3,
+        'ops_per_sec': 1 / min(times),
+        'calls': len(times),
+    }
+
+
+def synthetic_columns(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return {
+        'savings_percent': rng.integers(0, 101, n),
+        'debt_percent': rng.integers(0, 101, n),
+        'subscription_percent': rng.integers(0, 101, n),
+        'expenses_tracking': rng.integers(0, 2, n).astype(bool),
+        'emergency_fund': rng.integers(0, 2000, n),
+        'wants_percent': rng.integers(0, 101, n),
+        'goal_exists': rng.integers(0, 2, n).astype(bool),
+        'savings': rng.integers(0, 5000, n),
+        'goal_amount': rng.integers(0, 5000, n),
+    }
+
+
+@case('engine.run_single')
+def engine_run_single(args):
+    from advisor import run_engine
+    from rules import BudgetAdvisor
+
+    engine = BudgetAdvisor()
+    return time_calls(lambda: run_engine(engine, SAMPLE_FACTS), args.number)
+
+
+@case('engine.run_instrumented')
+def engine_run_instrumented(args):
+    """engine.run_single with metrics on; engine.run_single is the metrics-off cost."""
+    from advisor import run_engine
+    from metrics import EngineMetrics
+    from rules import RULESET, build_engine_class
+
+    engine = build_engine_class(RULESET, metrics=EngineMetrics())()
+    return time_calls(lambda: run_engine(engine, SAMPLE_FACTS), args.number)
+
+
+@case('engine.incremental')
+def engine_incremental(args):
+    """One slider moved per submit, on a session's IncrementalAdvisor."""
+    from advisor import IncrementalAdvisor
+
+    advisor = IncrementalAdvisor()
+    submits = [dict(SAMPLE_FACTS, wants_percent=percent) for percent in (25, 45)]
+    advisor.evaluate(submits[0])
+    state = {'i': 0}
+
+    def submit():
+        state['i'] ^= 1
+        return advisor.evaluate(submits[state['i']])
+    return time_calls(submit, args.number)
+
+
+def _reload_catalog():
+    """A RuleCatalog on a scratch copy of rules.json, and a function that edits it."""
+    import os
+
+    from rules import RULES_PATH, RuleCatalog
+
+    directory = tempfile.mkdtemp(prefix='budget-bench-')
+    atexit.register(shutil.rmtree, directory, True)
+    path = os.path.join(directory, 'rules.json')
+    with open(RULES_PATH, encoding='utf-8') as f:
+        entries = json.load(f)
+    state = {'cutoff': 500}
+
+    def edit():
+        state['cutoff'] += 1
+        for entry in entries:
+            if entry['rule'] == 'low_emergency_fund':
+                entry['condition'] = f"emergency_fund < {state['cutoff']}"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        # Every edit must look new to the mtime check.
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + state['cutoff']))
+
+    edit()
+    return RuleCatalog(path, interval=0), edit
+
+
+@case('rules.reload_check')
+def rules_reload_check(args):
+    """Per-submit cost of checking an unchanged rules.json (no throttling)."""
+    catalog, _ = _reload_catalog()
+    return time_calls(catalog.reload_if_changed, args.number)
+
+
+@case('rules.reload')
+def rules_reload(args):
+    """Detect an edit, re-read, validate and compile the catalog and engine class."""
+    catalog, edit = _reload_catalog()
+    times = []
+    for _ in range(max(args.number // 10, 5)):
+        edit()
+        start = time.perf_counter()
+        assert catalog.reload_if_changed()
+        times.append(time.perf_counter() - start)
+    return _times_result(times)
+
+
+@case('engine.after_reload')
+def engine_after_reload(args):
+    """engine.run_single on an engine pool built for a reloaded catalog."""
+    from advisor import EnginePool
+
+    catalog, edit = _reload_catalog()
+    edit()
+    catalog.reload_if_changed()
+    pool = EnginePool(catalog.engine_class, size=1)
+    return time_calls(lambda: pool.evaluate(SAMPLE_FACTS), args.number)
+
+
+@case('engine.construct')
+def engine_construct(args):
+    from rules import BudgetAdvisor
+
+    return time_calls(BudgetAdvisor, max(args.number // 4, 1))
+
+
+@case('engine.reset')
+def engine_reset(args):
+    from rules import BudgetAdvisor
+
+    engine = BudgetAdvisor()
+    return time_calls(engine.reset, args.number)
+
+
+@case('facts.dict_fact')
+def facts_dict_fact(args):
+    """A user_facts dict wrapped in the experta UserData fact."""
+    from rules import UserData
+
+    return time_calls(lambda: UserData(**dict(SAMPLE_FACTS)), args.number)
+
+
+@case('facts.record')
+def facts_record(args):
+    """A validated BudgetFacts record built from form values."""
+    from facts import BudgetFacts
+
+    return time_calls(lambda: BudgetFacts(**SAMPLE_FACTS), args.number)
+
+
+def _batch_case(n):
+    def run(args):
+        from batch_advisor import evaluate_batch
+
+        columns = synthetic_columns(n)
+        result = time_calls(lambda: evaluate_batch(columns), 1, repeat=args.repeat)
+        result.update(unit='ms/batch', best=result['best'] / 1e3, median=result['median'] / 1e3,
+                      rows=n, rows_per_sec=n * result['ops_per_sec'])
+        return result
+    return run
+
+
+case('batch.10k')(_batch_case(10_000))
+case('batch.100k')(_batch_case(100_000))
+
+
+@case('what_if.sweep_101x101')
+def what_if_sweep(args):
+    """Two sliders over 0-100 plus the minimal clearing change for each rule."""
+    from what_if import sweep
+
+    return time_calls(lambda: sweep(SAMPLE_FACTS, ['savings_percent', 'wants_percent'])
+                      .minimal_changes(), max(args.number // 10, 1), repeat=args.repeat)
+
+
+def _bench_db(args):
+    """``db`` on the chosen backend, with a user to log advice for; returns (db, user_id)."""
+    import db
+    from storage import SQLiteStorage
+
+    if args.db_backend == 'sqlite':
+        directory = tempfile.mkdtemp(prefix='budget-bench-')
+        atexit.register(shutil.rmtree, directory, True)
+        db.configure_storage(SQLiteStorage(f"{directory}/bench.db"))
+    else:
+        db.configure_storage(args.db_backend)
+    storage = db.get_storage()
+    username = f"bench-{time.time_ns()}"
+    storage.add_user(username, "x")
+    return db, storage.find_user(username)[0]
+
+
+def _db_result(args, result):
+    result['backend'] = args.db_backend
+    return result
+
+
+@case('db.insert_advice')
+def db_insert_advice(args):
+    db, user_id = _bench_db(args)
+    return _db_result(args, time_calls(
+        lambda: db.insert_advice_to_db(user_id, SAMPLE_FACTS, "Test advice"), args.number))
+
+
+@case('db.history_uncached')
+def db_history_uncached(args):
+    db, user_id = _bench_db(args)
+    for _ in range(200):
+        db.insert_advice_to_db(user_id, SAMPLE_FACTS, "Test advice")
+
+    def read():
+        db._history_cache.invalidate(user_id)
+        return db.get_user_advice_history(user_id)
+    return _db_result(args, time_calls(read, args.number))
+
+
+@case('db.history_deep_page')
+def db_history_deep_page(args):
+    """A page 10,000 rows into a long history; should cost about the same as page one."""
+    db, user_id = _bench_db(args)
+    start = datetime.datetime(2024, 1, 1)
+    values = tuple(SAMPLE_FACTS[field] for field in (
+        'savings_percent', 'debt_percent', 'subscription_percent', 'expenses_tracking',
+        'emergency_fund', 'wants_percent', 'goal_exists', 'savings', 'goal_amount'))
+    db.insert_advice_batch([
+        (user_id,) + values + (None, 1, start + datetime.timedelta(minutes=i))
+        for i in range(20_000)
+    ])
+    middle = db.get_user_advice_history(user_id, limit=10_000)[-1]
+    before = db.history_cursor(middle)
+    return _db_result(args, time_calls(lambda: db.get_user_advice_history(user_id, before=before),
+                                       args.number))
+
+
+@case('db.history_cached')
+def db_history_cached(args):
+    db, user_id = _bench_db(args)
+    db.insert_advice_to_db(user_id, SAMPLE_FACTS, "Test advice")
+    return _db_result(args, time_calls(lambda: db.get_user_advice_history(user_id),
+                                       args.number))
+
+
+def _log_month(db, user_id, rows=30_000):
+    """Spread ``rows`` advice rows over 30 days."""
+    start = datetime.datetime(2024, 1, 1)
+    values = tuple(SAMPLE_FACTS[field] for field in (
+        'savings_percent', 'debt_percent', 'subscription_percent', 'expenses_tracking',
+        'emergency_fund', 'wants_percent', 'goal_exists', 'savings', 'goal_amount'))
+    step = datetime.timedelta(days=30) / rows
+    db.insert_advice_batch([
+        (user_id,) + values + (None, i & 0xff, start + i * step) for i in range(rows)
+    ])
+    return start.date(), (start + datetime.timedelta(days=29)).date()
+
+
+@case('rollup.refresh_new_rows')
+def rollup_refresh(args):
+    """Folding 100 new rows into rollups of a 30,000-row log."""
+    import rollups
+
+    db, user_id = _bench_db(args)
+    _log_month(db, user_id)
+    rollups.refresh()
+
+    def refresh_hundred():
+        db.insert_advice_batch([(user_id,) + (0,) * 9 + (None, 3, datetime.datetime(2024, 1, 15))
+                                for _ in range(100)])
+        rollups.refresh()
+    return _db_result(args, time_calls(refresh_hundred, max(args.number // 10, 1)))
+
+
+@case('rollup.read_30_days')
+def rollup_read(args):
+    import rollups
+
+    db, user_id = _bench_db(args)
+    start, end = _log_month(db, user_id)
+    rollups.refresh()
+    return _db_result(args, time_calls(
+        lambda: (rollups.daily_stats(start, end), rollups.rule_stats(start, end)), args.number))
+
+
+@case('startup.import_login')
+def startup_import_login(args):
+    from benchmarks.bench_startup import import_seconds
+
+    return _times_result(import_seconds('db', runs=args.repeat))
+
+
+@case('startup.import_advice_page')
+def startup_import_advice_page(args):
+    from benchmarks.bench_startup import import_seconds
+
+    return _times_result(import_seconds('advice_page', setup="import streamlit, db",
+                                        runs=args.repeat))
+
+
+@case('startup.rerun_login')
+def startup_rerun_login(args):
+    from benchmarks.bench_startup import rerun_seconds
+
+    return _times_result(rerun_seconds(False, args.repeat))
+
+
+@case('startup.rerun_logged_in')
+def startup_rerun_logged_in(args):
+    from benchmarks.bench_startup import rerun_seconds
+
+    return _times_result(rerun_seconds(True, args.repeat))
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_cases(names: List[str], args) -> dict:
+    results = {}
+    for name in names:
+        results[name] = CASES[name](args)
+        print(f"  {name:<28}{results[name]['best']:>12.2f} {results[name]['unit']}",
+              file=sys.stderr)
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'db_backend': args.db_backend,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    }
+
+
+def compare(old: dict, new: dict):
+    print(f"{'case':<28}{'before':>12}{'after':>12}{'change':>10}   "
+          f"({old.get('commit')} -> {new.get('commit')})")
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>12}{result['best']:>12.2f}{'new':>10}")
+            continue
+        change = (result['best'] - before['best']) / before['best'] * 100
+        print(f"{name:<28}{before['best']:>12.2f}{result['best']:>12.2f}{change:>+9.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the advisor benchmark suite.")
+    parser.add_argument('--output', '-o', default='bench_results.json',
+                        help="where to save results (default: bench_results.json)")
+    parser.add_argument('--compare', metavar='FILE', help="results file from an earlier run")
+    parser.add_argument('--only', action='append', default=[],
+                        help="run cases whose name starts with this prefix (repeatable)")
+    parser.add_argument('--number', type=int, default=200, help="calls per timing run")
+    parser.add_argument('--repeat', type=int, default=5, help="timing runs for batch cases")
+    parser.add_argument('--db-backend', choices=('sqlite', 'mysql'), default='sqlite',
+                        help="storage backend for the db.* cases (default: sqlite)")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(CASES))
+        return
+    names = [name for name in CASES
+             if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+    report = run_cases(names, args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(names)} results to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
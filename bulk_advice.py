@@ -0,0 +1,244 @@
+"""Score a cohort file of UserData rows in one streaming pass.
+
+Reads a CSV or JSON-lines file in fixed-size chunks, evaluates each chunk with
+the vectorized batch advisor, and writes the advice to an output file and/or to
+``advice_log``. Memory use depends on the chunk size, not the file size.
+
+Usage::
+
+    python bulk_advice.py cohort.csv --output advice.jsonl
+    python bulk_advice.py cohort.jsonl --to-db --user-id 42
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Tuple
+
+import numpy as np
+
+import rules
+from batch_advisor import evaluate_batch
+from facts import FIELDS, BudgetFacts, FactBatch, FactError
+from rules import RuleSet
+from storage import utc_now
+
+CHUNK_SIZE = 5000
+DB_BATCH_SIZE = 500
+
+
+def coerce_row(row: Mapping, line: int) -> BudgetFacts:
+    """Validate one input row's nine fields into a ``BudgetFacts`` record."""
+    try:
+        return BudgetFacts.from_mapping(row)
+    except FactError as exc:
+        raise ValueError(f"row {line}: {exc}") from None
+
+
+def _user_id(row: Mapping, line: int) -> Optional[int]:
+    value = row.get('user_id')
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"row {line}: bad user_id {value!r}") from None
+
+
+def read_rows(f: TextIO, fmt: str) -> Iterator[Mapping]:
+    if fmt == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunks(rows: Iterable[Mapping],
+           size: int) -> Iterator[Tuple[FactBatch, List[Optional[int]]]]:
+    """Validated rows, ``size`` at a time, with each row's user_id (or None)."""
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch, user_ids = FactBatch(), []
+        for line, row in itertools.islice(numbered, size):
+            batch.append(coerce_row(row, line))
+            user_ids.append(_user_id(row, line))
+        if not user_ids:
+            return
+        yield batch, user_ids
+
+
+def score_chunk(batch: FactBatch, ruleset: Optional[RuleSet] = None) -> np.ndarray:
+    return evaluate_batch(batch, ruleset)
+
+
+class OutputWriter:
+    """Writes scored rows as CSV or JSON lines.
+
+    ``ruleset`` must be the catalog the rows were scored with; it defaults to
+    the one live when the writer is created.
+    """
+
+    def __init__(self, f: TextIO, fmt: str, ruleset: Optional[RuleSet] = None):
+        self.fmt = fmt
+        self.f = f
+        self.ruleset = ruleset or rules.RULESET
+        if fmt == 'csv':
+            self._csv = csv.writer(f)
+            self._csv.writerow(FIELDS + ('rules', 'advice_text'))
+
+    def write(self, facts: BudgetFacts, fired: np.ndarray, user_id: Optional[int] = None):
+        indices = np.flatnonzero(fired)
+        names = [self.ruleset.names[i] for i in indices]
+        advice = [self.ruleset.messages[i] for i in indices]
+        if self.fmt == 'csv':
+            self._csv.writerow(list(facts.as_tuple()) + [";".join(names), "\n".join(advice)])
+        else:
+            record = dict(facts)
+            record.update(rules=names, advice=advice)
+            self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class AdviceLogSink:
+    """Buffers scored rows and inserts them into ``advice_log`` in batches.
+
+    Rule masks are built from ``ruleset``, which must be the catalog the rows
+    were scored with; it defaults to the one live when the sink is created.
+    """
+
+    def __init__(self, default_user_id: Optional[int], batch_size: int = DB_BATCH_SIZE,
+                 ruleset: Optional[RuleSet] = None):
+        from db import insert_advice_batch
+
+        self._insert = insert_advice_batch
+        self.ruleset = ruleset or rules.RULESET
+        self.default_user_id = default_user_id
+        self.batch_size = batch_size
+        self.rows: List[tuple] = []
+        self.inserted = 0
+
+    def write(self, facts: BudgetFacts, fired: np.ndarray, user_id: Optional[int] = None):
+        if not fired.any():
+            return  # like the app, only submits that produced advice are logged
+        if user_id is None:
+            user_id = self.default_user_id
+        if user_id is None:
+            raise ValueError("row has no user_id and --user-id was not given")
+        rule_mask = self.ruleset.mask(np.flatnonzero(fired))
+        self.rows.append((user_id,) + facts.as_tuple()
+                         + (None, rule_mask, utc_now()))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self._insert(self.rows)
+            self.inserted += len(self.rows)
+            self.rows = []
+
+
+def check_rows(f: TextIO, fmt: str, default_user_id: Optional[int] = None):
+    """Validate every row, and that each has a user_id, without scoring any.
+
+    Raises ``ValueError`` naming the first bad row.
+    """
+    for line, row in enumerate(read_rows(f, fmt), start=1):
+        coerce_row(row, line)
+        if _user_id(row, line) is None and default_user_id is None:
+            raise ValueError(f"row {line}: no user_id column value and --user-id was not given")
+
+
+def _format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def run(input_path: str, output_path: Optional[str] = None, to_db: bool = False,
+        user_id: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+        input_format: Optional[str] = None, output_format: Optional[str] = None,
+        db_batch_size: int = DB_BATCH_SIZE,
+        progress: Optional[TextIO] = sys.stderr) -> Dict[str, float]:
+    """Score ``input_path``; returns row count, elapsed seconds and rows/sec.
+
+    A bad row raises ``ValueError``. With ``to_db`` the whole file is checked
+    first, since inserted batches cannot be taken back; a partly written
+    ``output_path`` is removed.
+    """
+    in_fmt = _format(input_path, input_format)
+    # One catalog for the whole file, even if rules.json is reloaded meanwhile.
+    ruleset = rules.RULESET
+    start = time.perf_counter()
+    if to_db:
+        with open(input_path, newline='', encoding='utf-8') as f:
+            check_rows(f, in_fmt, user_id)
+    rows = 0
+    sinks = []
+    out_file = None
+    finished = False
+    try:
+        if output_path:
+            out_file = open(output_path, 'w', newline='', encoding='utf-8')
+            sinks.append(OutputWriter(out_file, _format(output_path, output_format), ruleset))
+        if to_db:
+            sinks.append(AdviceLogSink(user_id, db_batch_size, ruleset))
+
+        with open(input_path, newline='', encoding='utf-8') as f:
+            for batch, user_ids in chunks(read_rows(f, in_fmt), chunk_size):
+                matrix = score_chunk(batch, ruleset)
+                for facts, user_id, fired in zip(batch, user_ids, matrix):
+                    for sink in sinks:
+                        sink.write(facts, fired, user_id)
+                rows += len(batch)
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    print(f"{rows} rows, {rows / elapsed:,.0f} rows/sec", file=progress)
+
+        for sink in sinks:
+            if isinstance(sink, AdviceLogSink):
+                sink.flush()
+        finished = True
+    finally:
+        if out_file is not None:
+            out_file.close()
+            if not finished:
+                os.remove(output_path)
+
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_sec': rows / elapsed if elapsed else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a cohort file of UserData rows.")
+    parser.add_argument('input', help="CSV or JSON-lines file with the nine UserData fields")
+    parser.add_argument('--output', '-o', help="write advice to this CSV or JSON-lines file")
+    parser.add_argument('--to-db', action='store_true', help="insert advice into advice_log")
+    parser.add_argument('--user-id', type=int,
+                        help="advice_log user_id for rows without a user_id column")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"rows evaluated per chunk (default: {CHUNK_SIZE})")
+    parser.add_argument('--db-batch-size', type=int, default=DB_BATCH_SIZE,
+                        help=f"rows per advice_log INSERT batch (default: {DB_BATCH_SIZE})")
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'))
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'))
+    parser.add_argument('--quiet', '-q', action='store_true', help="no per-chunk progress")
+    args = parser.parse_args(argv)
+
+    if not args.output and not args.to_db:
+        parser.error("nothing to do: give --output and/or --to-db")
+
+    try:
+        result = run(args.input, args.output, args.to_db, args.user_id, args.chunk_size,
+                     args.input_format, args.output_format, args.db_batch_size,
+                     progress=None if args.quiet else sys.stderr)
+    except ValueError as exc:
+        parser.exit(1, f"{parser.prog}: error: {exc}\n")
+    print(f"Scored {result['rows']} rows in {result['seconds']:.2f}s "
+          f"({result['rows_per_sec']:,.0f} rows/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
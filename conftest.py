@@ -11,4 +11,20 @@ def pytest_configure(config):
     )
     config.addinivalue_line(
         "markers", "unit: marks tests as unit tests"
-    )
\ No newline at end of file
+    )
+
+
+@pytest.fixture
+def sample_user_data():
+    """Fixture providing sample user data for tests"""
+    return {
+        'savings_percent': 15,
+        'debt_percent': 10,
+        'subscription_percent': 5,
+        'expenses_tracking': True,
+        'emergency_fund': 1000,
+        'wants_percent': 25,
+        'goal_exists': True,
+        'savings': 500,
+        'goal_amount': 2000
+    }
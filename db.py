@@ -0,0 +1,735 @@
+"""Data access for the Student Budget Advisor.
+
+Streamlit re-runs ``app.py`` on every interaction, but imported modules stay
+loaded for the life of the process, so the storage backend below (and the
+MySQL connection pool behind the default backend) is shared by every session
+served by that process. Set ``BUDGET_DB_BACKEND=sqlite`` to use an embedded
+SQLite file instead of a MySQL server.
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+from advice_writer import AdviceRecord, AdviceWriter, WriterClosed
+from facts import values_of
+from history_cache import HistoryCache
+from passwords import hash_password, verify_password
+from storage import SQLiteStorage, Storage, rule_fire_counts_sql, utc_now
+from tracing import span
+
+DB_CONFIG = {
+    'host': "localhost",
+    'user': "root",          # replace if different
+    'password': "",  # change to your actual MySQL root password
+    'database': "budget_app",
+    # advice_log.created_at holds naive UTC (storage.utc_now); keep MySQL's
+    # own clock (CURRENT_TIMESTAMP, NOW()) and any TIMESTAMP column on UTC too.
+    'time_zone': '+00:00',
+}
+
+# 'mysql' or 'sqlite'; see ``BACKENDS``.
+BACKEND = os.environ.get('BUDGET_DB_BACKEND', 'mysql')
+
+POOL_SIZE = int(os.environ.get('BUDGET_DB_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.environ.get('BUDGET_DB_POOL_TIMEOUT', '10'))
+# Idle connections older than this are pinged before being handed out.
+HEALTH_CHECK_INTERVAL = float(os.environ.get('BUDGET_DB_HEALTH_CHECK_INTERVAL', '30'))
+
+# Set to 1 to queue advice_log inserts and write them from a background thread.
+WRITE_BEHIND = os.environ.get('BUDGET_ADVICE_WRITE_BEHIND', '0') == '1'
+
+# Advice history reads are cached per user for this many seconds.
+HISTORY_CACHE_TTL = float(os.environ.get('BUDGET_HISTORY_CACHE_TTL', '60'))
+HISTORY_CACHE_USERS = int(os.environ.get('BUDGET_HISTORY_CACHE_USERS', '1024'))
+
+# Statements shared by the data-access functions. Each pooled connection keeps
+# one prepared cursor per statement, keyed on these exact string objects.
+SELECT_USER_SQL = "SELECT user_id, password FROM users WHERE username = %s"
+INSERT_USER_SQL = "INSERT INTO users (username, password) VALUES (%s, %s)"
+UPDATE_PASSWORD_SQL = "UPDATE users SET password = %s WHERE user_id = %s"
+# New advice is stored as ``rule_mask``, bit ``rule.id`` per fired rule, with
+# ``advice_text`` left NULL and rendered from the catalog when read. Rows from
+# before the mask existed keep their text until backfill_rule_masks.py runs.
+# ``created_at`` is always given, from ``storage.utc_now``, never left to the
+# column default: the server's clock and time zone may not match Python's.
+INSERT_ADVICE_SQL = """
+        INSERT INTO advice_log (
+            user_id, savings_percent, debt_percent, subscription_percent, expenses_tracking,
+            emergency_fund, wants_percent, goal_exists, savings, goal_amount, advice_text,
+            rule_mask, created_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+# A separate string: each pooled connection prepares INSERT_ADVICE_SQL, while
+# batches go through executemany on a plain cursor.
+INSERT_ADVICE_BATCH_SQL = """
+        INSERT INTO advice_log (
+            user_id, savings_percent, debt_percent, subscription_percent, expenses_tracking,
+            emergency_fund, wants_percent, goal_exists, savings, goal_amount, advice_text,
+            rule_mask, created_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+SELECT_LEGACY_ADVICE_SQL = """
+        SELECT id, advice_text FROM advice_log
+        WHERE id > %s AND rule_mask IS NULL
+        ORDER BY id
+        LIMIT %s
+    """
+SET_RULE_MASK_SQL = "UPDATE advice_log SET rule_mask = %s, advice_text = NULL WHERE id = %s"
+
+# Rollup tables (see rollups.py).
+EXPORT_ADVICE_SQL = """
+        SELECT id, user_id, created_at, savings_percent, debt_percent, subscription_percent,
+               expenses_tracking, emergency_fund, wants_percent, goal_exists, savings,
+               goal_amount, advice_text, rule_mask
+        FROM advice_log
+        ORDER BY id
+    """
+EXPORT_USER_ADVICE_SQL = """
+        SELECT id, user_id, created_at, savings_percent, debt_percent, subscription_percent,
+               expenses_tracking, emergency_fund, wants_percent, goal_exists, savings,
+               goal_amount, advice_text, rule_mask
+        FROM advice_log
+        WHERE user_id = %s
+        ORDER BY id
+    """
+SELECT_ADVICE_SINCE_SQL = """
+        SELECT id, created_at, savings_percent, debt_percent, wants_percent, advice_text,
+               rule_mask
+        FROM advice_log
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    """
+SELECT_HIGH_WATER_SQL = "SELECT high_water FROM rollup_state WHERE name = %s"
+INIT_HIGH_WATER_SQL = "INSERT IGNORE INTO rollup_state (name, high_water) VALUES (%s, 0)"
+ADVANCE_HIGH_WATER_SQL = """
+        UPDATE rollup_state SET high_water = %s WHERE name = %s AND high_water = %s
+    """
+UPSERT_DAILY_SQL = """
+        INSERT INTO advice_daily (
+            day, evaluations, savings_percent_sum, debt_percent_sum, wants_percent_sum
+        )
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            evaluations = evaluations + VALUES(evaluations),
+            savings_percent_sum = savings_percent_sum + VALUES(savings_percent_sum),
+            debt_percent_sum = debt_percent_sum + VALUES(debt_percent_sum),
+            wants_percent_sum = wants_percent_sum + VALUES(wants_percent_sum)
+    """
+UPSERT_RULE_DAILY_SQL = """
+        INSERT INTO advice_rule_daily (day, rule_id, fires)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE fires = fires + VALUES(fires)
+    """
+SELECT_DAILY_SQL = """
+        SELECT day, evaluations, savings_percent_sum, debt_percent_sum, wants_percent_sum
+        FROM advice_daily
+        WHERE day >= %s AND day <= %s
+        ORDER BY day
+    """
+SELECT_RULE_DAILY_SQL = """
+        SELECT day, rule_id, fires
+        FROM advice_rule_daily
+        WHERE day >= %s AND day <= %s
+        ORDER BY day, rule_id
+    """
+# Rows per page of advice history. Pages are read newest first with a keyset
+# cursor on (created_at, id), which the (user_id, created_at) index in
+# schema.sql serves at the same cost however many rows a user has.
+HISTORY_LIMIT = 10
+SELECT_HISTORY_SQL = """
+        SELECT id, created_at, savings_percent, debt_percent, wants_percent, advice_text,
+               rule_mask
+        FROM advice_log
+        WHERE user_id = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """
+SELECT_HISTORY_BEFORE_SQL = """
+        SELECT id, created_at, savings_percent, debt_percent, wants_percent, advice_text,
+               rule_mask
+        FROM advice_log
+        WHERE user_id = %s AND created_at <= %s AND (created_at < %s OR id < %s)
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """
+
+
+def get_connection():
+    """Open a new, unpooled connection. The pool uses this as its factory."""
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+class PooledConnection:
+    """A pooled connection plus the prepared cursors opened on it."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_used = time.monotonic()
+        # Set to close the connection on release instead of returning it.
+        self.discard = False
+        self._statements: Dict[tuple, object] = {}
+
+    def statement(self, sql: str, dictionary: bool = False):
+        """Return a prepared cursor for ``sql``, preparing it on first use."""
+        key = (sql, dictionary)
+        cursor = self._statements.get(key)
+        if cursor is None:
+            cursor = self.conn.cursor(prepared=True, dictionary=dictionary)
+            self._statements[key] = cursor
+        return cursor
+
+    def close(self):
+        for cursor in self._statements.values():
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+        self._statements.clear()
+        try:
+            self.conn.close()
+        except mysql.connector.Error:
+            pass
+
+
+class ConnectionPool:
+    """A fixed-size, thread-safe pool of MySQL connections.
+
+    Connections are created lazily up to ``size``. A checkout that finds the
+    pool exhausted waits up to ``timeout`` seconds for a connection to be
+    returned and then raises ``PoolError``.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 health_check_interval: float = HEALTH_CHECK_INTERVAL,
+                 connect: Callable = get_connection):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'in_use': 0,
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'health_checks': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _record(self, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                self._stats[key] += value
+
+    def _healthy(self, pooled: PooledConnection) -> bool:
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        self._record(health_checks=1)
+        try:
+            pooled.conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _acquire(self) -> PooledConnection:
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._record(timeouts=1)
+            raise PoolError(f"No connection available within {self.timeout}s "
+                            f"(pool size {self.size})")
+        waited = time.monotonic() - start
+
+        try:
+            pooled = None
+            while pooled is None:
+                try:
+                    pooled = self._idle.get_nowait()
+                except queue.Empty:
+                    with span('db.connect'):
+                        pooled = PooledConnection(self._connect())
+                    self._record(connections_created=1)
+                    break
+                if not self._healthy(pooled):
+                    pooled.close()
+                    self._record(connections_discarded=1)
+                    pooled = None
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return pooled
+
+    def _release(self, pooled: PooledConnection, broken: bool = False):
+        try:
+            if not broken:
+                try:
+                    # Never hand out a connection with an open transaction: the
+                    # next reader would see this one's stale snapshot.
+                    if pooled.conn.in_transaction:
+                        pooled.conn.rollback()
+                except mysql.connector.Error:
+                    broken = True
+            if broken:
+                pooled.close()
+                self._record(connections_discarded=1)
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.put(pooled)
+        finally:
+            self._record(in_use=-1)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a ``PooledConnection`` for the duration of a ``with`` block."""
+        with span('db.checkout'):
+            pooled = self._acquire()
+        broken = False
+        try:
+            yield pooled
+        except (mysql.connector.errors.OperationalError,
+                mysql.connector.errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(pooled, broken or pooled.discard)
+
+    def stats(self) -> dict:
+        """Snapshot of the pool's counters, for sizing the pool."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        stats['wait_time_avg'] = (stats['wait_time_total'] / stats['checkouts']
+                                  if stats['checkouts'] else 0.0)
+        return stats
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def configure_pool(**kwargs) -> ConnectionPool:
+    """Replace the process-wide pool, e.g. with a different size."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(**kwargs)
+    return _pool
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
+class MySQLStorage(Storage):
+    """``Storage`` over the process-wide MySQL connection pool."""
+
+    name = 'mysql'
+
+    def find_user(self, username):
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(SELECT_USER_SQL)
+            cursor.execute(SELECT_USER_SQL, (username,))
+            rows = cursor.fetchall()
+        return tuple(rows[0]) if rows else None
+
+    def add_user(self, username, password_hash):
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(INSERT_USER_SQL)
+            try:
+                cursor.execute(INSERT_USER_SQL, (username, password_hash))
+                pooled.conn.commit()
+                return True
+            except mysql.connector.errors.IntegrityError:
+                return False  # Username already exists
+
+    def update_password(self, user_id, password_hash):
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(UPDATE_PASSWORD_SQL)
+            cursor.execute(UPDATE_PASSWORD_SQL, (password_hash, user_id))
+            pooled.conn.commit()
+
+    def insert_advice(self, values):
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(INSERT_ADVICE_SQL)
+            cursor.execute(INSERT_ADVICE_SQL, values)
+            pooled.conn.commit()
+
+    def insert_advice_batch(self, rows):
+        with get_pool().connection() as pooled:
+            # A plain cursor lets executemany send one multi-row INSERT.
+            cursor = pooled.conn.cursor()
+            try:
+                cursor.executemany(INSERT_ADVICE_BATCH_SQL, rows)
+                pooled.conn.commit()
+            except mysql.connector.Error:
+                pooled.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def advice_history(self, user_id, limit, before=None):
+        if before is None:
+            sql, params = SELECT_HISTORY_SQL, (user_id, limit)
+        else:
+            created_at, row_id = before
+            sql, params = SELECT_HISTORY_BEFORE_SQL, (user_id, created_at, created_at,
+                                                      row_id, limit)
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(sql, dictionary=True)
+            cursor.execute(sql, params)
+            return list(cursor.fetchall())
+
+    def legacy_advice(self, after_id, limit):
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(SELECT_LEGACY_ADVICE_SQL)
+            cursor.execute(SELECT_LEGACY_ADVICE_SQL, (after_id, limit))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def set_rule_masks(self, updates):
+        with get_pool().connection() as pooled:
+            cursor = pooled.conn.cursor()
+            try:
+                cursor.executemany(SET_RULE_MASK_SQL, updates)
+                pooled.conn.commit()
+            except mysql.connector.Error:
+                pooled.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def rule_fire_counts(self, rule_ids):
+        sql = rule_fire_counts_sql(rule_ids)
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(sql)
+            cursor.execute(sql)
+            row = cursor.fetchone()
+        return {rule_id: int(count or 0) for rule_id, count in zip(rule_ids, row)}
+
+    def export_advice(self, user_id, batch_size):
+        if user_id is None:
+            sql, params = EXPORT_ADVICE_SQL, ()
+        else:
+            sql, params = EXPORT_USER_ADVICE_SQL, (user_id,)
+        with get_pool().connection() as pooled:
+            # Unbuffered: the result stays on the server and is read batch by batch.
+            cursor = pooled.conn.cursor(buffered=False)
+            finished = False
+            try:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        finished = True
+                        return
+                    yield [tuple(row) for row in rows]
+            finally:
+                if finished:
+                    cursor.close()
+                else:
+                    # Abandoned part-way, with the rest of the result still unread
+                    # on the wire; closing the connection is cheaper than draining it.
+                    pooled.discard = True
+
+    def advice_since(self, after_id, limit):
+        return self._fetch(SELECT_ADVICE_SINCE_SQL, (after_id, limit))
+
+    def rollup_high_water(self, name):
+        rows = self._fetch(SELECT_HIGH_WATER_SQL, (name,))
+        return rows[0][0] if rows else 0
+
+    def apply_rollup(self, name, old_high_water, new_high_water, days, rule_days):
+        with get_pool().connection() as pooled:
+            cursor = pooled.conn.cursor()
+            try:
+                cursor.execute(INIT_HIGH_WATER_SQL, (name,))
+                cursor.execute(ADVANCE_HIGH_WATER_SQL, (new_high_water, name, old_high_water))
+                if cursor.rowcount != 1:
+                    pooled.conn.rollback()
+                    return False
+                if days:
+                    cursor.executemany(UPSERT_DAILY_SQL, days)
+                if rule_days:
+                    cursor.executemany(UPSERT_RULE_DAILY_SQL, rule_days)
+                pooled.conn.commit()
+                return True
+            except mysql.connector.Error:
+                pooled.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def daily_rollup(self, start, end):
+        return self._fetch(SELECT_DAILY_SQL, (start, end))
+
+    def rule_rollup(self, start, end):
+        return self._fetch(SELECT_RULE_DAILY_SQL, (start, end))
+
+    def _fetch(self, sql, params):
+        with get_pool().connection() as pooled:
+            cursor = pooled.statement(sql)
+            cursor.execute(sql, params)
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def stats(self) -> dict:
+        stats = pool_stats()
+        stats['backend'] = self.name
+        return stats
+
+    def close(self):
+        get_pool().close()
+
+
+BACKENDS = {
+    'mysql': MySQLStorage,
+    'sqlite': SQLiteStorage,
+}
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage backend, creating it on first use."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown BUDGET_DB_BACKEND {BACKEND!r}; "
+                                     f"expected one of {sorted(BACKENDS)}")
+                _storage = BACKENDS[BACKEND]()
+    return _storage
+
+
+def configure_storage(storage) -> Storage:
+    """Replace the process-wide backend with a ``Storage`` or a ``BACKENDS`` name."""
+    global _storage
+    if isinstance(storage, str):
+        storage = BACKENDS[storage]()
+    with _storage_lock:
+        old, _storage = _storage, storage
+    if old is not None and old is not storage:
+        old.close()
+    _history_cache.clear()
+    return storage
+
+
+def storage_stats() -> dict:
+    return get_storage().stats()
+
+
+def check_credentials(username, password):
+    with span('db.find_user'):
+        user = get_storage().find_user(username)
+    if user is None:
+        return None
+    user_id, stored_hash = user
+    # Hashing happens outside any checkout so a slow KDF never holds a connection.
+    with span('passwords.verify'):
+        valid, needs_rehash = verify_password(password, stored_hash)
+    if not valid:
+        return None
+    if needs_rehash:
+        with span('db.update_password'):
+            get_storage().update_password(user_id, hash_password(password))
+    return user_id
+
+
+def create_user(username, password):
+    with span('passwords.hash'):
+        password_hash = hash_password(password)
+    with span('db.add_user'):
+        return get_storage().add_user(username, password_hash)
+
+
+_writer: Optional[AdviceWriter] = None
+_writer_lock = threading.Lock()
+_history_cache = HistoryCache(max_users=HISTORY_CACHE_USERS, ttl=HISTORY_CACHE_TTL)
+
+
+def history_cache_stats() -> dict:
+    return _history_cache.stats()
+
+
+def insert_advice_batch(rows):
+    """Insert many advice rows (``INSERT_ADVICE_BATCH_SQL`` order) in one transaction."""
+    get_storage().insert_advice_batch(rows)
+
+
+def enable_write_behind(**kwargs) -> AdviceWriter:
+    """Route ``insert_advice_to_db`` through a background ``AdviceWriter``.
+
+    Keyword arguments are passed to ``AdviceWriter``. Queued records are drained
+    when the process exits.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AdviceWriter(insert_advice_batch, after_flush=_flushed, **kwargs)
+            atexit.register(_writer.close)
+    return _writer
+
+
+def _flushed(records):
+    # A history read that overlapped the flush may have missed these rows (read
+    # from the database before the commit, then from pending_for after it) or
+    # seen them twice; either way it must not stay cached.
+    for user_id in {record.user_id for record in records}:
+        _history_cache.invalidate(user_id)
+
+
+def disable_write_behind(timeout: float = None):
+    """Drain and stop the background writer; inserts become synchronous again."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close(timeout)
+        atexit.unregister(writer.close)
+
+
+def writer_stats() -> Optional[dict]:
+    return _writer.stats() if _writer is not None else None
+
+
+def insert_advice_to_db(user_id, data_dict, advice_text):
+    if WRITE_BEHIND and _writer is None:
+        enable_write_behind()
+
+    import rules  # deferred so the login screen never loads the rule engine
+
+    # Advice made of catalog messages is stored as a rule mask; anything else
+    # (a message the catalog no longer has) is kept as text.
+    rule_mask = rules.RULESET.mask_for_messages(advice_text.split("\n") if advice_text else [])
+    stored_text = advice_text if rule_mask is None else None
+
+    # ``data_dict`` is a facts.BudgetFacts record or a plain user_facts dict.
+    created_at = utc_now()
+    values = (user_id,) + values_of(data_dict) + (stored_text, rule_mask, created_at)
+
+    writer = _writer
+    if writer is not None:
+        history_row = {
+            'created_at': created_at,
+            'savings_percent': data_dict['savings_percent'],
+            'debt_percent': data_dict['debt_percent'],
+            'wants_percent': data_dict['wants_percent'],
+            'advice_text': advice_text,
+            'rule_mask': rule_mask,
+        }
+        try:
+            with span('db.insert_advice', queued=True):
+                writer.submit(AdviceRecord(user_id, values, history_row))
+        except WriterClosed:
+            pass  # write-behind was turned off meanwhile; write it directly
+        else:
+            _history_cache.invalidate(user_id)
+            return
+
+    with span('db.insert_advice'):
+        get_storage().insert_advice(values)
+    _history_cache.invalidate(user_id)
+
+
+def render_advice(row: dict) -> dict:
+    """Fill in ``advice_text`` of a history row stored as a rule mask."""
+    if row.get('advice_text') is None and row.get('rule_mask') is not None:
+        import rules
+
+        row = dict(row)
+        row['advice_text'] = "\n".join(rules.RULESET.messages_for_mask(row['rule_mask']))
+    return row
+
+
+def history_cursor(entry: dict) -> Tuple:
+    """Cursor for the page of history after ``entry``, for ``before=``."""
+    # Queued write-behind rows have no id yet; they are newer than any written row.
+    row_id = entry.get('id')
+    return entry['created_at'], sys.maxsize if row_id is None else row_id
+
+
+def get_user_advice_history(user_id, limit=HISTORY_LIMIT, before=None):
+    """One page of a user's advice history, newest first.
+
+    Pass ``before=history_cursor(last_entry)`` to get the page after
+    ``last_entry``. The first page of ``HISTORY_LIMIT`` rows is cached.
+    """
+    if before is not None or limit != HISTORY_LIMIT:
+        with span('db.history', page='older'):
+            rows = get_storage().advice_history(user_id, limit, before)
+        return [render_advice(row) for row in rows]
+
+    cached = _history_cache.get(user_id)
+    if cached is not None:
+        return list(cached)
+
+    generation = _history_cache.generation(user_id)
+    with span('db.history', page='first'):
+        rows = get_storage().advice_history(user_id, HISTORY_LIMIT)
+    rows = [render_advice(row) for row in rows]
+
+    writer = _writer
+    if writer is not None:
+        # The user's own queued submits are newer than anything already written.
+        pending = writer.pending_for(user_id)
+        if pending:
+            rows = (pending + list(rows))[:HISTORY_LIMIT]
+
+    _history_cache.put(user_id, tuple(rows), generation)
+    return list(rows)
+
+
+def rule_fire_counts() -> Dict[str, int]:
+    """How many logged evaluations each catalog rule fired in.
+
+    Counted with integer operations on ``rule_mask``; rows still stored as text
+    are not included until they have been backfilled.
+    """
+    import rules
+
+    ruleset = rules.RULESET
+    counts = get_storage().rule_fire_counts(ruleset.ids)
+    return {name: counts[rule_id] for name, rule_id in zip(ruleset.names, ruleset.ids)}
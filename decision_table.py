@@ -0,0 +1,202 @@
+"""Precomputed decision table for the threshold rules.
+
+Most rules compare a field against a fixed threshold, so each field only ever
+falls into a handful of intervals between those thresholds. ``DecisionTable``
+compiles the rule set ahead of time into per-field interval boundaries and one
+lookup table indexed by the combination of intervals, holding the bitmask of
+rules that fire. Evaluating a fact is then one ``bisect`` per field and one
+table index. Rules that relate fields to each other (``low_savings_for_goal``)
+cannot be tabulated and are checked separately as residual predicates.
+
+Nothing in the app evaluates advice through it. The generated ``RuleSet``
+evaluator runs each condition once as plain Python comparisons, which
+measures about twice as fast as the table's per-field ``bisect`` lookups and
+residual checks (``python -m benchmarks.bench_rules``), so the table is kept
+only as that benchmark's comparison point. ``verify_against_engine`` still
+checks the rule set against the experta engine over the whole slider domain,
+and ``what_if`` reuses ``SLIDER_DOMAINS``.
+"""
+import ast
+import itertools
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from rules import FIELDS, RuleDef, RuleSet, build_engine_class, compile_predicate
+
+# Refuse to build tables larger than this many entries.
+MAX_TABLE_SIZE = 1 << 20
+
+# Values each field can take in the budget form, for verification.
+SLIDER_DOMAINS = {
+    'savings_percent': range(0, 101),
+    'debt_percent': range(0, 101),
+    'subscription_percent': range(0, 101),
+    'wants_percent': range(0, 101),
+    'expenses_tracking': (False, True),
+    'goal_exists': (False, True),
+}
+
+
+def _threshold_constants(rule: RuleDef) -> Optional[Dict[str, List[float]]]:
+    """Thresholds per field if every comparison in ``rule`` is field-vs-constant."""
+    thresholds: Dict[str, List[float]] = {}
+    tree = ast.parse(rule.expression, mode='eval')
+    for node in ast.walk(tree):
+        if isinstance(node, ast.BinOp):
+            return None
+        if not isinstance(node, ast.Compare):
+            continue
+        left, right = node.left, node.comparators[0]
+        if isinstance(left, ast.Name) and isinstance(right, ast.Constant):
+            name, value = left.id, right.value
+        elif isinstance(right, ast.Name) and isinstance(left, ast.Constant):
+            name, value = right.id, left.value
+        elif (isinstance(left, ast.Name) and isinstance(right, ast.UnaryOp)
+              and isinstance(right.op, ast.USub) and isinstance(right.operand, ast.Constant)):
+            name, value = left.id, -right.operand.value
+        else:
+            return None
+        thresholds.setdefault(name, []).append(value)
+    if any(isinstance(node, ast.Name) and node.id not in thresholds for node in ast.walk(tree)):
+        return None  # a bare field used as a truth value
+    return thresholds
+
+
+def _region_representatives(boundaries: Tuple[float, ...]) -> List[float]:
+    """One value inside each region: below, at and between the boundaries."""
+    values = []
+    for j, bound in enumerate(boundaries):
+        low = boundaries[j - 1] if j else bound - 2
+        values.append(low + 1 if low + 1 < bound else (low + bound) / 2)
+        values.append(bound)
+    values.append(boundaries[-1] + 1)
+    return values
+
+
+class DecisionTable:
+    """A rule set compiled into interval boundaries and a bitmask table."""
+
+    def __init__(self, ruleset: RuleSet):
+        self.ruleset = ruleset
+        self.fingerprint = ruleset.fingerprint
+
+        thresholds: Dict[str, set] = {}
+        table_rules, residual = [], []
+        for index, rule in enumerate(ruleset.rules):
+            constants = _threshold_constants(rule)
+            if constants is None:
+                residual.append(index)
+                continue
+            table_rules.append(index)
+            for field, values in constants.items():
+                thresholds.setdefault(field, set()).update(values)
+
+        self.fields = tuple(field for field in FIELDS if field in thresholds)
+        self.boundaries = tuple(tuple(sorted(thresholds[field])) for field in self.fields)
+        # Each field has 2 * len(boundaries) + 1 regions; strides give the
+        # mixed-radix table index of a combination of regions.
+        self.radices = tuple(2 * len(b) + 1 for b in self.boundaries)
+        self.strides = []
+        stride = 1
+        for radix in reversed(self.radices):
+            self.strides.insert(0, stride)
+            stride *= radix
+        self.size = stride
+        if self.size > MAX_TABLE_SIZE:
+            raise ValueError(f"Decision table would need {self.size} entries")
+        self.table_rules = tuple(table_rules)
+        self.residual_rules = tuple(residual)
+
+        self.table = self._build_table()
+        self._residual = [(1 << index, ruleset.rules[index].fields, compile_predicate(ruleset.rules[index]))
+                          for index in residual]
+        self._lookup = list(zip(self.fields, self.boundaries, self.strides))
+        self._messages: Dict[int, Tuple[str, ...]] = {}
+
+    def _build_table(self) -> List[int]:
+        rules = self.ruleset.rules
+        predicates = [(1 << index, rules[index].fields, compile_predicate(rules[index]))
+                      for index in self.table_rules]
+        representatives = [_region_representatives(b) for b in self.boundaries]
+        table = []
+        for combination in itertools.product(*representatives):
+            values = dict(zip(self.fields, combination))
+            mask = 0
+            for bit, fields, predicate in predicates:
+                if predicate(*(values[field] for field in fields)):
+                    mask |= bit
+            table.append(mask)
+        return table
+
+    def mask(self, facts: Mapping) -> int:
+        """Bitmask of fired rules; bit ``i`` is rule ``ruleset.rules[i]``."""
+        index = 0
+        for field, boundaries, stride in self._lookup:
+            value = facts[field]
+            j = bisect_left(boundaries, value)
+            region = 2 * j + 1 if j < len(boundaries) and boundaries[j] == value else 2 * j
+            index += region * stride
+        mask = self.table[index]
+        for bit, fields, predicate in self._residual:
+            if predicate(*(facts[field] for field in fields)):
+                mask |= bit
+        return mask
+
+    def evaluate(self, facts: Mapping) -> Tuple[str, ...]:
+        """Advice messages for ``facts``, in catalog order."""
+        mask = self.mask(facts)
+        messages = self._messages.get(mask)
+        if messages is None:
+            messages = tuple(message for i, message in enumerate(self.ruleset.messages)
+                             if mask >> i & 1)
+            self._messages[mask] = messages
+        return messages
+
+
+_table: Optional[DecisionTable] = None
+_table_lock = threading.Lock()
+
+
+def get_decision_table(ruleset: RuleSet) -> DecisionTable:
+    """The decision table for ``ruleset``, rebuilt whenever the rules change."""
+    global _table
+    table = _table
+    if table is None or table.fingerprint != ruleset.fingerprint:
+        with _table_lock:
+            if _table is None or _table.fingerprint != ruleset.fingerprint:
+                _table = DecisionTable(ruleset)
+            table = _table
+    return table
+
+
+def verification_facts(table: DecisionTable, base: Mapping) -> Iterable[dict]:
+    """Facts covering every table entry and every slider value of each field.
+
+    Every combination of regions is visited once using a representative value
+    per region, and each field is then swept across its whole form domain
+    (or, for RM amounts, its thresholds and their neighbours) with the other
+    fields taken from ``base``.
+    """
+    representatives = [_region_representatives(b) for b in table.boundaries]
+    for combination in itertools.product(*representatives):
+        yield dict(base, **dict(zip(table.fields, combination)))
+    for field, boundaries in zip(table.fields, table.boundaries):
+        domain = SLIDER_DOMAINS.get(field)
+        if domain is None:
+            domain = sorted({0, *boundaries, *(b - 1 for b in boundaries),
+                             *(b + 1 for b in boundaries)})
+        for value in domain:
+            yield dict(base, **{field: value})
+
+
+def verify_against_engine(table: DecisionTable, base: Mapping, engine_class=None) -> List[dict]:
+    """Compare the table with the experta engine; returns the facts that disagree."""
+    from advisor import run_engine
+
+    engine = (engine_class or build_engine_class(table.ruleset))()
+    mismatches = []
+    for facts in verification_facts(table, base):
+        if set(table.evaluate(facts)) != set(run_engine(engine, facts)):
+            mismatches.append(facts)
+    return mismatches
@@ -0,0 +1,126 @@
+"""Export ``advice_log`` as CSV or JSON lines, streamed in constant memory.
+
+Rows are read ``BATCH_SIZE`` at a time through ``Storage.export_advice``: an
+unbuffered, server-side cursor on MySQL, short keyset queries on SQLite. Each
+batch is rendered and written before the next is read, so memory use depends
+on the batch size, not on how many rows are exported. Advice stored as a rule
+mask is rendered back to text; the mask is exported as well.
+
+That holds for the CLI and ``write_export``. The app's download button is
+different: Streamlit (1.45) needs the whole file as bytes, so ``export_bytes``
+costs memory in proportion to the rows exported and refuses exports over
+``BUDGET_EXPORT_UI_MAX_BYTES`` (20 MB by default); use the CLI for those.
+
+Usage::
+
+    python export_advice.py --output advice_log.csv              # every user
+    python export_advice.py --user-id 42 --output advice.jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from typing import Iterator, Optional, TextIO
+
+from storage import EXPORT_COLUMNS
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+UI_MAX_BYTES = int(os.environ.get('BUDGET_EXPORT_UI_MAX_BYTES', str(20 * 1024 * 1024)))
+
+
+class ExportTooLarge(ValueError):
+    """Raised when an export for the app's download button exceeds its size cap."""
+
+
+def export_rows(user_id: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                storage=None) -> Iterator[list]:
+    """Batches of export rows, ``EXPORT_COLUMNS`` order, with ``advice_text`` filled in."""
+    import db
+    import rules
+
+    storage = storage or db.get_storage()
+    text = EXPORT_COLUMNS.index('advice_text')
+    for batch in storage.export_advice(user_id, batch_size):
+        messages_for_mask = rules.RULESET.messages_for_mask
+        rows = []
+        for row in batch:
+            row = list(row)
+            if row[text] is None and row[-1] is not None:
+                row[text] = "\n".join(messages_for_mask(row[-1]))
+            rows.append(row)
+        yield rows
+
+
+def iter_export(fmt: str, user_id: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                storage=None) -> Iterator[str]:
+    """The export as text, one chunk per batch (the CSV header comes first)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(FORMATS)}")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(EXPORT_COLUMNS)
+    for rows in export_rows(user_id, batch_size, storage):
+        if writer is not None:
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str,
+                                        ensure_ascii=False) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_export(f: TextIO, fmt: str, user_id: Optional[int] = None,
+                 batch_size: int = BATCH_SIZE, storage=None) -> int:
+    """Write the export to ``f`` as it is read; returns the characters written."""
+    written = 0
+    for chunk in iter_export(fmt, user_id, batch_size, storage):
+        written += f.write(chunk)
+    return written
+
+
+def export_bytes(fmt: str, user_id: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                 max_bytes: int = UI_MAX_BYTES, storage=None) -> bytes:
+    """The whole export as UTF-8 bytes, for ``st.download_button``.
+
+    Raises ``ExportTooLarge`` as soon as it grows past ``max_bytes``.
+    """
+    data = bytearray()
+    for chunk in iter_export(fmt, user_id, batch_size, storage):
+        data += chunk.encode('utf-8')
+        if len(data) > max_bytes:
+            raise ExportTooLarge(f"export is larger than {max_bytes:,} bytes")
+    return bytes(data)
+
+
+def main(argv=None, progress: Optional[TextIO] = sys.stderr):
+    parser = argparse.ArgumentParser(description="Export advice_log as CSV or JSON lines.")
+    parser.add_argument('--output', '-o', required=True, help="file to write ('-' for stdout)")
+    parser.add_argument('--user-id', type=int, help="only this user's advice")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="default: from the output file extension, else jsonl")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"rows read per batch (default: {BATCH_SIZE})")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    start = time.perf_counter()
+    if args.output == '-':
+        written = write_export(sys.stdout, fmt, args.user_id, args.batch_size)
+    else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            written = write_export(f, fmt, args.user_id, args.batch_size)
+    print(f"Exported {written:,} characters in {time.perf_counter() - start:.2f}s",
+          file=progress)
+
+
+if __name__ == "__main__":
+    main()
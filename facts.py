@@ -0,0 +1,236 @@
+"""Typed records for the nine budget fields, one at a time or in columns.
+
+``BudgetFacts`` is the fixed-schema form of one submit of the budget form. It
+validates and converts its values once, when it is built from form widgets, a
+cohort file row or any other ``user_facts`` mapping, and keeps them in
+``__slots__``. It is also a read-only mapping, so code written against
+``user_facts`` dicts (``facts['savings']``, ``UserData(**facts)``, the generated
+``RuleSet`` evaluator) takes a record unchanged.
+
+``FactBatch`` holds many records as one compact ``array.array`` per field and
+hands them to the vectorized evaluator as NumPy views, without copying.
+
+Kept free of experta and NumPy imports so the login screen can load ``db``,
+which uses it, cheaply.
+"""
+import math
+from array import array
+from collections.abc import Mapping
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, Union
+
+# The nine UserData fields, in the order the budget form collects them.
+FIELDS = (
+    'savings_percent',
+    'debt_percent',
+    'subscription_percent',
+    'expenses_tracking',
+    'emergency_fund',
+    'wants_percent',
+    'goal_exists',
+    'savings',
+    'goal_amount',
+)
+
+BOOL_FIELDS = ('expenses_tracking', 'goal_exists')
+PERCENT_FIELDS = ('savings_percent', 'debt_percent', 'subscription_percent', 'wants_percent')
+
+_TRUE = {'1', 'true', 'yes', 'y', 't'}
+_FALSE = {'0', 'false', 'no', 'n', 'f', ''}
+
+_FIELD_SET = frozenset(FIELDS)
+_values = attrgetter(*FIELDS)
+
+Number = Union[int, float]
+
+
+class FactError(ValueError):
+    """Raised when a value cannot be converted to its budget field's type."""
+
+
+def parse_bool(value) -> bool:
+    """A checkbox value from a bool, a number or one of the usual spellings."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _number(value) -> Number:
+    # Whole numbers become ints, so 500, 500.0 and "500" are the same record.
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value!r}")
+    if type(value) is int:
+        return value
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return int(number) if number.is_integer() else number
+
+
+def _convert(field: str, value):
+    try:
+        if field in BOOL_FIELDS:
+            return parse_bool(value)
+        number = _number(value)
+    except (TypeError, ValueError) as exc:
+        raise FactError(f"bad value for '{field}': {exc}") from None
+    if number < 0 or (field in PERCENT_FIELDS and number > 100):
+        bounds = "0 to 100" if field in PERCENT_FIELDS else "at least 0"
+        raise FactError(f"bad value for '{field}': {value!r} is not {bounds}")
+    return number
+
+
+class BudgetFacts(Mapping):
+    """One validated set of the nine budget fields.
+
+    Percentages must be 0-100 and amounts non-negative; whole numbers are
+    stored as ints, checkboxes as bools. Read fields as attributes or by key.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, savings_percent: Number, debt_percent: Number,
+                 subscription_percent: Number, expenses_tracking: bool,
+                 emergency_fund: Number, wants_percent: Number, goal_exists: bool,
+                 savings: Number, goal_amount: Number):
+        values = (savings_percent, debt_percent, subscription_percent, expenses_tracking,
+                  emergency_fund, wants_percent, goal_exists, savings, goal_amount)
+        for (field, set_field, kind, low, high), value in zip(_CHECKS, values):
+            # Plain in-range ints and bools (what the form sends) need no conversion.
+            if type(value) is not kind or not low <= value <= high:
+                value = _convert(field, value)
+            set_field(self, value)
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> 'BudgetFacts':
+        """A record from a ``user_facts`` dict or a cohort file row; extra keys are ignored."""
+        if type(data) is cls:
+            return data
+        try:
+            return cls(*[data[field] for field in FIELDS])
+        except KeyError as exc:
+            raise FactError(f"missing field '{exc.args[0]}'") from None
+
+    @classmethod
+    def _trusted(cls, values: Iterable) -> 'BudgetFacts':
+        # Values already converted (e.g. read back out of a FactBatch).
+        record = object.__new__(cls)
+        for check, value in zip(_CHECKS, values):
+            check[1](record, value)
+        return record
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BudgetFacts records are read-only")
+
+    def __getitem__(self, field: str):
+        if field not in _FIELD_SET:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __eq__(self, other):
+        if type(other) is BudgetFacts:
+            return _values(self) == _values(other)
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash(_values(self))
+
+    def __reduce__(self):
+        return BudgetFacts._trusted, (_values(self),)
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={value!r}" for field, value in zip(FIELDS, _values(self)))
+        return f"BudgetFacts({fields})"
+
+    def as_tuple(self) -> tuple:
+        """The values in ``FIELDS`` order."""
+        return _values(self)
+
+    def replace(self, **changes) -> 'BudgetFacts':
+        """A copy with some fields changed (and validated)."""
+        return BudgetFacts(**{**dict(zip(FIELDS, _values(self))), **changes})
+
+
+# Per field: its slot's setter, and the type and range that need no conversion.
+_CHECKS = tuple(
+    (field, getattr(BudgetFacts, field).__set__)
+    + ((bool, False, True) if field in BOOL_FIELDS
+       else (int, 0, 100) if field in PERCENT_FIELDS else (int, 0, math.inf))
+    for field in FIELDS
+)
+
+
+def values_of(facts: Mapping) -> tuple:
+    """The nine values of a ``BudgetFacts`` record or ``user_facts`` dict, in ``FIELDS`` order."""
+    if type(facts) is BudgetFacts:
+        return _values(facts)
+    return tuple(facts[field] for field in FIELDS)
+
+
+def _whole(value: float) -> Number:
+    return int(value) if value.is_integer() else value
+
+
+class FactBatch:
+    """Many ``BudgetFacts`` records stored column-wise.
+
+    Each field is one ``array.array``: 8-byte floats for numbers, one byte per
+    checkbox, so a record costs 58 bytes however many there are. ``columns``
+    exposes them to ``batch_advisor.evaluate_batch`` as NumPy arrays that
+    share the same memory. Indexing rebuilds a ``BudgetFacts`` record.
+    """
+
+    __slots__ = ('_columns',)
+
+    def __init__(self, records: Iterable[Mapping] = ()):
+        self._columns = {field: array('B' if field in BOOL_FIELDS else 'd') for field in FIELDS}
+        self.extend(records)
+
+    def append(self, facts: Mapping):
+        """Add one record; a plain mapping is validated first."""
+        for column, value in zip(self._columns.values(),
+                                 _values(BudgetFacts.from_mapping(facts))):
+            column.append(value)
+
+    def extend(self, records: Iterable[Mapping]):
+        for facts in records:
+            self.append(facts)
+
+    def __len__(self) -> int:
+        return len(self._columns[FIELDS[0]])
+
+    def __getitem__(self, index: int) -> BudgetFacts:
+        return BudgetFacts._trusted(
+            bool(column[index]) if field in BOOL_FIELDS else _whole(column[index])
+            for field, column in self._columns.items())
+
+    def __iter__(self) -> Iterator[BudgetFacts]:
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in self._columns.values())
+
+    def columns(self) -> Dict[str, object]:
+        """One NumPy array per field, sharing this batch's memory: float64 or bool.
+
+        The batch cannot grow while these arrays are alive.
+        """
+        import numpy as np
+
+        return {field: np.frombuffer(column, dtype=bool if field in BOOL_FIELDS else np.float64)
+                for field, column in self._columns.items()}
@@ -0,0 +1,99 @@
+"""Per-user cache for advice history reads.
+
+The "View Past Advice" expander re-reads a user's history on every Streamlit
+rerun. ``HistoryCache`` keeps the latest result per user, shared by every
+session in the process, bounded by a TTL and an LRU size limit.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+MAX_USERS = 1024
+TTL = 60.0
+
+_MISSING = object()
+
+
+class HistoryCache:
+    """A thread-safe TTL + LRU cache keyed by user id.
+
+    Writers call ``invalidate`` after changing a user's history. A reader that
+    raced with such a write is prevented from caching its stale result: it
+    passes the ``generation`` it saw before querying to ``put``, and the put is
+    ignored if the user's generation has moved on since.
+
+    Generations are only needed while such a read is in flight, so they are
+    kept for the ``max_users`` most recently invalidated users. Every
+    invalidation takes a new, higher number from one counter, and a user
+    without a stored generation is at the highest one dropped so far: a
+    generation never goes back to a value an earlier reader could hold.
+    """
+
+    def __init__(self, max_users: int = MAX_USERS, ttl: float = TTL, clock=time.monotonic):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._generations: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._next_generation = 1
+        # The highest generation dropped from ``_generations``.
+        self._dropped_generation = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                       'invalidations': 0}
+
+    def get(self, user_id, default=None):
+        with self._lock:
+            entry = self._entries.get(user_id, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if self._clock() < expires:
+                    self._entries.move_to_end(user_id)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[user_id]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return default
+
+    def generation(self, user_id) -> int:
+        with self._lock:
+            return self._generations.get(user_id, self._dropped_generation)
+
+    def put(self, user_id, value, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generations.get(
+                    user_id, self._dropped_generation):
+                return
+            self._entries[user_id] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._next_generation
+            self._generations.move_to_end(user_id)
+            self._next_generation += 1
+            while len(self._generations) > self.max_users:
+                _, dropped = self._generations.popitem(last=False)
+                self._dropped_generation = max(self._dropped_generation, dropped)
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._dropped_generation = self._next_generation - 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['generations'] = len(self._generations)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
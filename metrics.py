@@ -0,0 +1,191 @@
+"""Instrumentation for the experta advice engine.
+
+``EngineMetrics`` collects per-rule fire counts, the duration of each engine
+phase (``reset``, ``declare`` and ``run``), and the number of facts declared
+and activations fired. It renders them in the Prometheus text exposition
+format, either on demand or into a metrics file that a textfile collector can
+pick up.
+
+Only engines built with ``build_engine_class(..., metrics=...)`` record
+anything. The plain ``BudgetAdvisor`` has no hooks at all, so turning
+instrumentation off costs nothing. ``advisor`` switches to an instrumented
+class when ``BUDGET_ENGINE_METRICS=1``.
+"""
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+# Upper bounds, in seconds, of the phase duration histogram buckets.
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+PHASES = ('reset', 'declare', 'run')
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class EngineMetrics:
+    """Thread-safe counters and timings shared by every instrumented engine."""
+
+    def __init__(self, rule_names: Iterable[str] = (), buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._fires: Dict[str, int] = dict.fromkeys(rule_names, 0)
+        self._phases = {phase: _Histogram(len(self.buckets)) for phase in PHASES}
+        self._facts_declared = 0
+        self._activations = 0
+        self._working_memory = 0
+
+    def add_rules(self, rule_names: Iterable[str]):
+        """Make sure ``rule_names`` are exported, with zero fires if they never fire."""
+        with self._lock:
+            for name in rule_names:
+                self._fires.setdefault(name, 0)
+
+    def observe(self, phase: str, seconds: float):
+        with self._lock:
+            histogram = self._phases[phase]
+            histogram.counts[bisect_left(self.buckets, seconds)] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def fired(self, rule_name: str):
+        with self._lock:
+            self._fires[rule_name] = self._fires.get(rule_name, 0) + 1
+            self._activations += 1
+
+    def declared(self, facts: int, working_memory: int):
+        with self._lock:
+            self._facts_declared += facts
+            self._working_memory = working_memory
+
+    def snapshot(self) -> dict:
+        """Plain-dict copy of every metric."""
+        with self._lock:
+            return {
+                'fires': dict(self._fires),
+                'activations': self._activations,
+                'facts_declared': self._facts_declared,
+                'working_memory_facts': self._working_memory,
+                'phases': {phase: {'count': h.count, 'seconds': h.total, 'buckets': list(h.counts)}
+                           for phase, h in self._phases.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._fires = dict.fromkeys(self._fires, 0)
+            self._phases = {phase: _Histogram(len(self.buckets)) for phase in PHASES}
+            self._facts_declared = self._activations = self._working_memory = 0
+
+    def prometheus(self, prefix: str = 'budget_engine') -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines: List[str] = [
+            f"# HELP {prefix}_rule_fires_total Times each rule fired.",
+            f"# TYPE {prefix}_rule_fires_total counter",
+        ]
+        lines += [f'{prefix}_rule_fires_total{{rule="{name}"}} {count}'
+                  for name, count in sorted(snap['fires'].items())]
+        lines += [
+            f"# HELP {prefix}_activations_total Rule activations fired by engine runs.",
+            f"# TYPE {prefix}_activations_total counter",
+            f"{prefix}_activations_total {snap['activations']}",
+            f"# HELP {prefix}_facts_declared_total Facts declared into working memory.",
+            f"# TYPE {prefix}_facts_declared_total counter",
+            f"{prefix}_facts_declared_total {snap['facts_declared']}",
+            f"# HELP {prefix}_working_memory_facts Facts in working memory after the last declare.",
+            f"# TYPE {prefix}_working_memory_facts gauge",
+            f"{prefix}_working_memory_facts {snap['working_memory_facts']}",
+            f"# HELP {prefix}_phase_seconds Time spent in each engine phase.",
+            f"# TYPE {prefix}_phase_seconds histogram",
+        ]
+        for phase, histogram in snap['phases'].items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{le}"}} '
+                             f'{cumulative}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {histogram["seconds"]!r}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically replace ``path`` with the current metrics."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.prometheus())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class InstrumentedEngineMixin:
+    """Times ``reset``, ``declare`` and ``run`` and reports them to ``metrics``.
+
+    ``build_engine_class`` places this in front of the engine base class and
+    makes each rule's action call ``_rule_fired`` when given ``metrics``.
+    """
+
+    metrics: EngineMetrics
+
+    def reset(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().reset(*args, **kwargs)
+        finally:
+            self.metrics.observe('reset', time.perf_counter() - start)
+
+    def declare(self, *facts):
+        start = time.perf_counter()
+        try:
+            return super().declare(*facts)
+        finally:
+            self.metrics.observe('declare', time.perf_counter() - start)
+            self.metrics.declared(len(facts), len(self.facts))
+
+    def run(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().run(*args, **kwargs)
+        finally:
+            self.metrics.observe('run', time.perf_counter() - start)
+
+    def _rule_fired(self, name: str):
+        self.metrics.fired(name)
+
+
+class MetricsFileWriter:
+    """Rewrites a metrics file every ``interval`` seconds from a daemon thread."""
+
+    def __init__(self, metrics: EngineMetrics, path: str, interval: float = 15.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='metrics-file-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.metrics.write_textfile(self.path)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.metrics.write_textfile(self.path)
+
+
+ENGINE_METRICS = EngineMetrics()
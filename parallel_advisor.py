@@ -0,0 +1,177 @@
+"""Score many UserData records with the experta engine on several cores.
+
+``KnowledgeEngine.run`` is pure Python and holds the GIL, so threads cannot
+speed up engine scoring. ``ParallelAdvisor`` instead splits the records into
+chunks and scores them in worker processes. Each worker builds and warms one
+``BudgetAdvisor`` (an ``EnginePool`` of size one) when it starts and reuses it
+for every chunk it gets.
+
+Results come back in input order. At most ``max_pending`` chunks are in flight
+at once, so memory use depends on the chunk size and worker count, not on how
+many records there are.
+
+Workers are started with ``spawn``: the parent may be a Streamlit server or a
+process holding database connections and lock-guarded state, none of which
+should be forked.
+
+The catalog is the one live (``rules.RULESET``) when the ``ParallelAdvisor``
+is created. Its rules are sent to every worker, which builds its engine from
+them rather than from ``rules.json``, so masks are always decoded with the
+catalog that produced them, even if the file changes while workers start.
+
+For plain cohort scoring ``bulk_advice`` (NumPy over whole columns) is much
+faster still; this runner is for when results must come from the experta engine
+itself.
+
+Usage::
+
+    python parallel_advisor.py cohort.csv --output advice.jsonl --workers 8
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+
+import rules
+from facts import FIELDS, values_of
+from rules import RuleDef, RuleSet
+
+WORKERS = int(os.environ.get('BUDGET_PARALLEL_WORKERS', '0')) or os.cpu_count() or 1
+CHUNK_SIZE = int(os.environ.get('BUDGET_PARALLEL_CHUNK_SIZE', '500'))
+
+_engine_pool = None
+
+
+def _start_worker(rule_defs: Tuple[RuleDef, ...]):
+    global _engine_pool
+    from advisor import EnginePool
+
+    _engine_pool = EnginePool(rules.build_engine_class(RuleSet(rule_defs)), size=1)
+
+
+def _score_chunk(chunk: List[tuple]) -> List[int]:
+    # Records travel as tuples in FIELDS order and come back as rule masks:
+    # both pickle far smaller than dicts and message lists.
+    ruleset = _engine_pool.engine_class.ruleset
+    position = {name: i for i, name in enumerate(ruleset.names)}
+    masks = []
+    with _engine_pool.checkout() as engine:
+        for values in chunk:
+            engine.reset()
+            engine.advice_list = []
+            engine.declare(rules.UserData(**dict(zip(FIELDS, values))))
+            # Every matched rule fires; read them off the agenda by rule name,
+            # since several rules may share one advice message.
+            fired = [position[act.rule.__name__] for act in engine.agenda.activations]
+            engine.run()
+            masks.append(ruleset.mask(fired))
+    return masks
+
+
+def _chunks(records: Iterable[Mapping], size: int) -> Iterator[List[Mapping]]:
+    chunk = []
+    for facts in records:
+        chunk.append(facts)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ParallelAdvisor:
+    """A pool of worker processes, each with one warm ``BudgetAdvisor``.
+
+    Every worker evaluates ``ruleset``, by default the catalog live when the
+    pool is created. Use as a context manager, or call ``close`` when done.
+    """
+
+    def __init__(self, workers: int = WORKERS, chunk_size: int = CHUNK_SIZE,
+                 max_pending: Optional[int] = None, ruleset: Optional[RuleSet] = None):
+        if workers < 1 or chunk_size < 1:
+            raise ValueError("workers and chunk_size must be at least 1")
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 2 * workers
+        self.ruleset = ruleset or rules.RULESET
+        self._executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_start_worker, initargs=(self.ruleset.rules,))
+
+    def score(self, records: Iterable[Mapping]) -> Iterator[Tuple[Mapping, int]]:
+        """``(record, rule_mask)`` for each record, in input order.
+
+        The mask is ``self.ruleset.mask`` of the rules that fired for the record.
+        """
+        pending = collections.deque()
+        for chunk in _chunks(records, self.chunk_size):
+            if len(pending) >= self.max_pending:
+                done, future = pending.popleft()
+                yield from zip(done, future.result())
+            values = [values_of(facts) for facts in chunk]
+            pending.append((chunk, self._executor.submit(_score_chunk, values)))
+        while pending:
+            done, future = pending.popleft()
+            yield from zip(done, future.result())
+
+    def advise(self, records: Iterable[Mapping]) -> Iterator[List[str]]:
+        """Advice messages for each record, in input order and catalog order."""
+        messages_for_mask = self.ruleset.messages_for_mask
+        for _, mask in self.score(records):
+            yield messages_for_mask(mask)
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    from bulk_advice import CHUNK_SIZE as READ_CHUNK_SIZE
+    from bulk_advice import OutputWriter, _format, chunks, read_rows
+
+    parser = argparse.ArgumentParser(description="Score a cohort file with experta engines "
+                                                 "in parallel worker processes.")
+    parser.add_argument('input', help="CSV or JSON-lines file with the nine UserData fields")
+    parser.add_argument('--output', '-o', required=True,
+                        help="write advice to this CSV or JSON-lines file")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f"worker processes (default: {WORKERS})")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"records per worker task (default: {CHUNK_SIZE})")
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'))
+    parser.add_argument('--output-format', choices=('csv', 'jsonl'))
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    start = time.perf_counter()
+    rows = 0
+    with open(args.input, newline='', encoding='utf-8') as f, \
+            open(args.output, 'w', newline='', encoding='utf-8') as out, \
+            ParallelAdvisor(args.workers, args.chunk_size) as advisor:
+        ids = np.array(advisor.ruleset.ids)
+        writer = OutputWriter(out, _format(args.output, args.output_format), advisor.ruleset)
+        records = (facts for batch, _ in chunks(read_rows(f, _format(args.input,
+                                                                      args.input_format)),
+                                                READ_CHUNK_SIZE)
+                   for facts in batch)
+        for row, mask in advisor.score(records):
+            writer.write(row, (mask >> ids) & 1 == 1)
+            rows += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec) "
+          f"with {args.workers} workers", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Password hashing for the Student Budget Advisor.
+
+Passwords are stored as self-describing strings so the parameters used for a
+hash live next to it, e.g. ``scrypt$16384$8$1$<salt>$<hash>``. Rows written
+before this existed hold a bare, unsalted SHA-256 hex digest; those still
+verify, and ``verify_password`` flags them for re-hashing.
+
+scrypt is deliberately slow, so hashing runs in a bounded process pool instead
+of on the Streamlit script thread, where it would hold the GIL and stall every
+other session served by the process.
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+SCRYPT_N = int(os.environ.get('BUDGET_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.environ.get('BUDGET_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('BUDGET_SCRYPT_P', '1'))
+# Worker processes for hashing; 0 hashes inline on the calling thread.
+HASH_WORKERS = int(os.environ.get('BUDGET_HASH_WORKERS', '2'))
+# Hash jobs allowed in flight at once; further callers wait for a free slot.
+HASH_MAX_PENDING = int(os.environ.get('BUDGET_HASH_MAX_PENDING', '16'))
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text.encode('ascii'))
+
+
+class Hasher:
+    """Base class for password hashing schemes."""
+
+    scheme = ''
+
+    def hash(self, password: str) -> str:
+        raise NotImplementedError
+
+    def verify(self, password: str, encoded: str) -> bool:
+        raise NotImplementedError
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """True if ``encoded`` was not produced with this hasher's settings."""
+        return True
+
+
+class LegacySha256Hasher(Hasher):
+    """The original unsalted SHA-256 hex digest. Only used to verify old rows."""
+
+    scheme = 'sha256'
+
+    def hash(self, password: str) -> str:
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password: str, encoded: str) -> bool:
+        return hmac.compare_digest(self.hash(password), encoded)
+
+
+class ScryptHasher(Hasher):
+    """Salted, memory-hard scrypt. Cost grows with ``n`` (CPU and memory) and ``r``."""
+
+    scheme = 'scrypt'
+
+    def __init__(self, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P,
+                 salt_size: int = 16, dklen: int = 32):
+        if n < 2 or n & (n - 1):
+            raise ValueError("scrypt n must be a power of two greater than 1")
+        self.n, self.r, self.p = n, r, p
+        self.salt_size = salt_size
+        self.dklen = dklen
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int, dklen: int) -> bytes:
+        # scrypt needs about 128 * n * r bytes; leave headroom over OpenSSL's 32 MiB default.
+        maxmem = 256 * n * r * p + 1024 * 1024
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=maxmem, dklen=dklen)
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(self.salt_size)
+        key = self._derive(password, salt, self.n, self.r, self.p, self.dklen)
+        return f"{self.scheme}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    @staticmethod
+    def _parse(encoded: str) -> Tuple[int, int, int, bytes, bytes]:
+        _, n, r, p, salt, key = encoded.split('$')
+        return int(n), int(r), int(p), _b64decode(salt), _b64decode(key)
+
+    def verify(self, password: str, encoded: str) -> bool:
+        # A truncated or corrupted hash, or one with impossible parameters,
+        # matches no password rather than failing the login page.
+        try:
+            n, r, p, salt, key = self._parse(encoded)
+            return hmac.compare_digest(self._derive(password, salt, n, r, p, len(key)), key)
+        except ValueError:  # includes binascii.Error from bad base64
+            return False
+
+    def needs_rehash(self, encoded: str) -> bool:
+        n, r, p, salt, key = self._parse(encoded)
+        return (n, r, p, len(salt), len(key)) != (self.n, self.r, self.p,
+                                                  self.salt_size, self.dklen)
+
+
+HASHERS: Dict[str, Hasher] = {
+    LegacySha256Hasher.scheme: LegacySha256Hasher(),
+    ScryptHasher.scheme: ScryptHasher(),
+}
+
+
+def identify(encoded: str) -> Hasher:
+    """Return the hasher able to verify ``encoded``."""
+    scheme = encoded.split('$', 1)[0] if '$' in encoded else LegacySha256Hasher.scheme
+    try:
+        return HASHERS[scheme]
+    except KeyError:
+        raise ValueError(f"Unknown password hash scheme '{scheme}'") from None
+
+
+def _hash_job(hasher: Hasher, password: str) -> str:
+    return hasher.hash(password)
+
+
+def _verify_job(hasher: Hasher, password: str, encoded: str) -> bool:
+    return hasher.verify(password, encoded)
+
+
+class HashingPool:
+    """A bounded process pool for password hashing.
+
+    At most ``max_pending`` jobs are in flight; further callers block until one
+    finishes, so a burst of logins queues here instead of growing without limit.
+
+    Workers are started with ``spawn``: the pool is created lazily inside the
+    multithreaded Streamlit server, whose database connections and held locks
+    must not be forked into them.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def run(self, func, *args):
+        if self.workers == 0:
+            return func(*args)
+        with self._slots:
+            return self._get_executor().submit(func, *args).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+_hasher: Hasher = HASHERS[ScryptHasher.scheme]
+_pool = HashingPool()
+
+
+def configure(hasher: Optional[Hasher] = None, workers: Optional[int] = None,
+              max_pending: int = HASH_MAX_PENDING):
+    """Change the hasher used for new hashes and/or the hashing pool size."""
+    global _hasher, _pool
+    if hasher is not None:
+        _hasher = hasher
+        HASHERS[hasher.scheme] = hasher
+    if workers is not None:
+        _pool.shutdown()
+        _pool = HashingPool(workers, max_pending)
+
+
+def hash_password(password: str) -> str:
+    """Hash ``password`` with the current hasher, off the calling thread."""
+    return _pool.run(_hash_job, _hasher, password)
+
+
+def verify_password(password: str, encoded: str) -> Tuple[bool, bool]:
+    """Check ``password`` against a stored hash.
+
+    Returns ``(valid, needs_rehash)``. ``needs_rehash`` is only meaningful when
+    the password is valid: the stored hash uses an old scheme or old parameters
+    and should be replaced with ``hash_password(password)``.
+    """
+    hasher = identify(encoded)
+    valid = _pool.run(_verify_job, hasher, password, encoded)
+    needs_rehash = valid and (hasher.scheme != _hasher.scheme or _hasher.needs_rehash(encoded))
+    return valid, needs_rehash
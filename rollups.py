@@ -0,0 +1,150 @@
+"""Daily rollups of ``advice_log`` for dashboards.
+
+``advice_daily`` holds per-day evaluation counts and sums of the three
+percentage sliders; ``advice_rule_daily`` holds per-day fire counts for each
+rule id. ``refresh`` folds in only the ``advice_log`` rows written since the
+last run, tracked by a high-water mark on ``advice_log.id``, so it can run as
+often as the dashboard needs. Reads then cost one row per day (and per rule),
+however large ``advice_log`` grows.
+
+Ids are handed out at insert but become visible at commit, so a row can appear
+after a higher id has been folded. ``refresh`` therefore only folds rows whose
+``created_at`` is at least ``BUDGET_ROLLUP_GRACE`` seconds (default 300) old,
+stops at the first newer row, and leaves the mark on the last row it folded.
+A row still uncommitted below that mark would have been inserted before the
+folded row, so no row is missed as long as every row commits within half the
+grace period of its ``created_at``. The write-behind writer flushes well
+within a second.
+
+Run it periodically, e.g. from cron::
+
+    python rollups.py              # fold in new rows once
+    python rollups.py --every 60   # keep folding them in every minute
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, TextIO
+
+ROLLUP_NAME = 'advice_daily'
+BATCH_SIZE = 5000
+GRACE_SECONDS = float(os.environ.get('BUDGET_ROLLUP_GRACE', '300'))
+
+
+def _day(created_at) -> datetime.date:
+    if isinstance(created_at, datetime.datetime):
+        return created_at.date()
+    if isinstance(created_at, datetime.date):
+        return created_at
+    return datetime.date.fromisoformat(str(created_at)[:10])
+
+
+def fold(rows, ruleset):
+    """Per-day and per-(day, rule) deltas for a batch of ``advice_since`` rows."""
+    days: Dict[datetime.date, List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    fires: Dict[tuple, int] = defaultdict(int)
+    for _, created_at, savings_percent, debt_percent, wants_percent, advice_text, rule_mask in rows:
+        day = _day(created_at)
+        totals = days[day]
+        totals[0] += 1
+        totals[1] += savings_percent or 0
+        totals[2] += debt_percent or 0
+        totals[3] += wants_percent or 0
+        if rule_mask is None:
+            # A text row not yet backfilled; count it if the catalog knows its advice.
+            rule_mask = ruleset.mask_for_messages(advice_text.split("\n") if advice_text else [])
+            if rule_mask is None:
+                continue
+        rule_id = 0
+        while rule_mask:
+            if rule_mask & 1:
+                fires[day, rule_id] += 1
+            rule_mask >>= 1
+            rule_id += 1
+    return ([(day,) + tuple(totals) for day, totals in sorted(days.items())],
+            [key + (count,) for key, count in sorted(fires.items())])
+
+
+def refresh(batch_size: int = BATCH_SIZE, storage=None, grace: float = GRACE_SECONDS) -> int:
+    """Fold every settled ``advice_log`` row after the high-water mark; returns rows folded.
+
+    A row is settled once its ``created_at`` is ``grace`` seconds old.
+    """
+    import db
+    from rules import RULESET
+    from storage import utc_now
+
+    storage = storage or db.get_storage()
+    cutoff = utc_now() - datetime.timedelta(seconds=grace)
+    folded = 0
+    while True:
+        high_water = storage.rollup_high_water(ROLLUP_NAME)
+        rows = storage.advice_since(high_water, batch_size)
+        # Stop at the first row too recent to fold: the mark must not pass it.
+        rows = rows[:next((i for i, row in enumerate(rows) if row[1] > cutoff), len(rows))]
+        if not rows:
+            return folded
+        days, rule_days = fold(rows, RULESET)
+        if storage.apply_rollup(ROLLUP_NAME, high_water, rows[-1][0], days, rule_days):
+            folded += len(rows)
+        # Otherwise another refresh applied this batch first; carry on from its mark.
+
+
+def daily_stats(start: datetime.date, end: datetime.date, storage=None) -> List[dict]:
+    """Per-day evaluation counts and slider averages for ``start`` to ``end`` inclusive."""
+    import db
+
+    storage = storage or db.get_storage()
+    stats = []
+    for day, evaluations, savings_sum, debt_sum, wants_sum in storage.daily_rollup(start, end):
+        stats.append({
+            'day': _day(day),
+            'evaluations': evaluations,
+            'avg_savings_percent': savings_sum / evaluations,
+            'avg_debt_percent': debt_sum / evaluations,
+            'avg_wants_percent': wants_sum / evaluations,
+        })
+    return stats
+
+
+def rule_stats(start: datetime.date, end: datetime.date,
+               storage=None) -> Dict[datetime.date, Dict[str, int]]:
+    """Per-day fire counts for each catalog rule, ``start`` to ``end`` inclusive."""
+    import db
+    from rules import RULESET
+
+    storage = storage or db.get_storage()
+    names = dict(zip(RULESET.ids, RULESET.names))
+    stats: Dict[datetime.date, Dict[str, int]] = {}
+    for day, rule_id, fires in storage.rule_rollup(start, end):
+        counts = stats.setdefault(_day(day), dict.fromkeys(RULESET.names, 0))
+        if rule_id in names:
+            counts[names[rule_id]] = fires
+    return stats
+
+
+def main(argv=None, progress: Optional[TextIO] = sys.stderr):
+    parser = argparse.ArgumentParser(description="Fold new advice_log rows into the rollups.")
+    parser.add_argument('--every', type=float, metavar='SECONDS',
+                        help="keep running, refreshing at this interval")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"rows folded per transaction (default: {BATCH_SIZE})")
+    parser.add_argument('--grace', type=float, default=GRACE_SECONDS, metavar='SECONDS',
+                        help=f"leave rows younger than this for a later run "
+                             f"(default: {GRACE_SECONDS:g})")
+    args = parser.parse_args(argv)
+
+    while True:
+        start = time.perf_counter()
+        folded = refresh(args.batch_size, grace=args.grace)
+        print(f"Folded {folded} rows in {time.perf_counter() - start:.2f}s", file=progress)
+        if args.every is None:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,482 @@
-from experta import *
+"""Rule catalog for the Student Budget Advisor.
+
+``rules.json`` is the single source of truth for the advice rules. Each rule's
+``condition`` is parsed and validated once, then compiled into:
+
+* one generated Python function that evaluates every rule for a fact dict,
+  with no experta matching and no per-rule lambda calls, and
+* the experta ``BudgetAdvisor`` knowledge engine used by the Streamlit app.
+
+``RULESET`` and ``BudgetAdvisor`` are the process's current catalog. Call
+``check_for_updates`` (``advisor.get_engine_pool`` does, on every submit) to pick
+up an edited rules.json without restarting: a changed file is validated and
+compiled, then swapped in as a whole. A file that fails to compile is logged
+and ignored, and the running catalog stays in place.
+"""
+import ast
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from experta import MATCH, TEST, Fact, KnowledgeEngine, P, Rule
+
+from facts import FIELDS
+from metrics import EngineMetrics, InstrumentedEngineMixin
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+# Seconds between checks of rules.json for changes; negative disables reloading.
+RELOAD_INTERVAL = float(os.environ.get('BUDGET_RULES_RELOAD_INTERVAL', '2'))
+
+logger = logging.getLogger('budget.rules')
+
+# Action kinds allowed in rules.json and the marker shown before their message.
+ACTION_PREFIXES = {
+    'warn_user': "⚠️",
+    'suggest_action': "✅",
+    'recommend_action': "📌",
+}
+
+# Rule ids are bit positions in stored advice masks (``RuleSet.mask``), which
+# must fit a signed 64-bit column.
+MAX_RULE_ID = 62
+
+_ACTION_RE = re.compile(r"^\s*(\w+)\(\s*'((?:[^'\\]|\\.)*)'\s*\)\s*$")
+_KEYWORDS = {'AND': 'and', 'OR': 'or', 'NOT': 'not', 'true': 'True', 'false': 'False'}
+_KEYWORD_RE = re.compile(r"\b(%s)\b" % "|".join(_KEYWORDS))
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div,
+    ast.Name, ast.Load, ast.Constant,
+)
+
+
+class RuleCatalogError(ValueError):
+    """Raised when rules.json contains a rule that cannot be compiled."""
+
 
 class UserData(Fact):
     """User financial data"""
     pass
 
-class BudgetAdvisor(KnowledgeEngine):
 
-    @Rule(UserData(savings_percent=P(lambda x: x < 10)))
-    def low_savings(self):
-        print("Warning: Your savings are below 10% of your income.")
+class RuleDef(NamedTuple):
+    id: int
+    name: str
+    condition: str
+    expression: str
+    fields: Tuple[str, ...]
+    kind: str
+    message: str
+    description: str
+
+
+def _parse_condition(name: str, condition: str) -> ast.Expression:
+    source = _KEYWORD_RE.sub(lambda m: _KEYWORDS[m.group(1)], condition)
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as exc:
+        raise RuleCatalogError(f"Rule '{name}': cannot parse condition {condition!r}") from exc
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise RuleCatalogError(
+                f"Rule '{name}': unsupported syntax {type(node).__name__} in {condition!r}")
+        if isinstance(node, ast.Compare) and len(node.ops) != 1:
+            raise RuleCatalogError(f"Rule '{name}': chained comparisons are not supported")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (bool, int, float)):
+            raise RuleCatalogError(f"Rule '{name}': unsupported literal {node.value!r}")
+        if isinstance(node, ast.Name) and node.id not in FIELDS:
+            hint = difflib.get_close_matches(node.id, FIELDS, n=1)
+            suffix = f" (did you mean '{hint[0]}'?)" if hint else ""
+            raise RuleCatalogError(f"Rule '{name}': unknown field '{node.id}'{suffix}")
+    return tree
+
+
+def _parse_action(name: str, action: str) -> Tuple[str, str]:
+    match = _ACTION_RE.match(action)
+    if not match:
+        raise RuleCatalogError(f"Rule '{name}': cannot parse action {action!r}")
+    kind, text = match.groups()
+    if kind not in ACTION_PREFIXES:
+        raise RuleCatalogError(f"Rule '{name}': unknown action '{kind}'")
+    return kind, f"{ACTION_PREFIXES[kind]} {text}"
+
+
+def _referenced_fields(node: ast.AST) -> Tuple[str, ...]:
+    names = {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+    return tuple(field for field in FIELDS if field in names)
+
+
+class _Vectorize(ast.NodeTransformer):
+    """Rewrite boolean operators into NumPy's element-wise logical functions.
+
+    Bitwise ``~``/``&``/``|`` would only be right for bool columns: on an int
+    0/1 column ``~1`` is -2, which is truthy.
+    """
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        func = 'logical_and' if isinstance(node.op, ast.And) else 'logical_or'
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.Call(func=ast.Name(id=func, ctx=ast.Load()), args=[result, value],
+                              keywords=[])
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.Call(func=ast.Name(id='logical_not', ctx=ast.Load()),
+                            args=[node.operand], keywords=[])
+        return node
+
+
+def _compile_lambda(args: Tuple[str, ...], expression: str) -> Callable:
+    return eval(compile(f"lambda {', '.join(args)}: {expression}", '<rules.json>', 'eval'), {})
+
+
+def compile_predicate(rule: RuleDef) -> Callable:
+    """Compile ``rule``'s condition into a function taking its fields positionally."""
+    return _compile_lambda(rule.fields, rule.expression)
+
+
+def parse_rules(entries: List[Mapping]) -> List[RuleDef]:
+    """Validate raw rules.json entries and parse them into ``RuleDef`` tuples."""
+    rules = []
+    seen = set()
+    seen_ids = set()
+    for position, entry in enumerate(entries):
+        try:
+            name, condition, action = entry['rule'], entry['condition'], entry['action']
+        except KeyError as exc:
+            raise RuleCatalogError(f"Rule entry {entry!r} is missing {exc.args[0]!r}") from None
+        if not name.isidentifier():
+            raise RuleCatalogError(f"Rule name {name!r} is not a valid identifier")
+        if name in seen:
+            raise RuleCatalogError(f"Duplicate rule '{name}'")
+        seen.add(name)
+        # Ids default to the catalog position; rules.json pins them so stored
+        # masks keep their meaning when rules are reordered or removed.
+        rule_id = entry.get('id', position)
+        if (not isinstance(rule_id, int) or isinstance(rule_id, bool)
+                or not 0 <= rule_id <= MAX_RULE_ID):
+            raise RuleCatalogError(f"Rule '{name}': id must be an integer from 0 to {MAX_RULE_ID}")
+        if rule_id in seen_ids:
+            raise RuleCatalogError(f"Rule '{name}': duplicate id {rule_id}")
+        seen_ids.add(rule_id)
+
+        tree = _parse_condition(name, condition)
+        kind, message = _parse_action(name, action)
+        rules.append(RuleDef(
+            id=rule_id,
+            name=name,
+            condition=condition,
+            expression=ast.unparse(tree.body),
+            fields=_referenced_fields(tree),
+            kind=kind,
+            message=message,
+            description=entry.get('description', ''),
+        ))
+    return rules
+
+
+class RuleSet:
+    """A compiled rule catalog.
+
+    ``evaluate`` runs a single generated function over a complete fact dict and
+    returns the advice messages of the rules that fire, in catalog order.
+    """
+
+    def __init__(self, rules: List[RuleDef]):
+        self.rules = tuple(rules)
+        self.ids = tuple(rule.id for rule in self.rules)
+        self.names = tuple(rule.name for rule in self.rules)
+        self.messages = tuple(rule.message for rule in self.rules)
+        self._id_by_message = {rule.message: rule.id for rule in self.rules}
+        self._position_by_message = {}
+        for index, message in enumerate(self.messages):
+            self._position_by_message.setdefault(message, index)
+        self.fields = tuple(f for f in FIELDS if any(f in rule.fields for rule in self.rules))
+        # Catalog positions of the rules whose condition reads each field.
+        self.rules_by_field = {
+            field: tuple(i for i, rule in enumerate(self.rules) if field in rule.fields)
+            for field in FIELDS
+        }
+        # Identifies the rule set's behaviour, for caches of its results.
+        self.fingerprint = hashlib.sha256(json.dumps(
+            [(rule.id, rule.name, rule.expression, rule.message) for rule in self.rules]
+        ).encode()).hexdigest()
+        self.source = self._generate_source()
+        namespace: Dict[str, Callable] = {}
+        exec(compile(self.source, '<rules.json>', 'exec'), namespace)
+        self._fired = namespace['fired']
+        self._masks = namespace['masks']
+
+    def _generate_source(self) -> str:
+        lines = ["def fired(facts):"]
+        lines += [f"    {field} = facts[{field!r}]" for field in self.fields]
+        lines.append("    result = []")
+        for index, rule in enumerate(self.rules):
+            lines.append(f"    if {rule.expression}:  # {rule.name}")
+            lines.append(f"        result.append({index})")
+        lines.append("    return result")
+
+        # Same rules over whole columns (NumPy arrays), one mask per rule.
+        lines.append("")
+        lines.append("def masks(columns):")
+        lines.append("    from numpy import logical_and, logical_not, logical_or")
+        lines += [f"    {field} = columns[{field!r}]" for field in self.fields]
+        lines.append("    return (")
+        for rule in self.rules:
+            tree = _Vectorize().visit(ast.parse(rule.expression, mode='eval'))
+            lines.append(f"        ({ast.unparse(tree)}),  # {rule.name}")
+        lines.append("    )")
+        return "\n".join(lines) + "\n"
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def fired_indices(self, facts: Mapping) -> List[int]:
+        """Return the catalog positions of the rules that fire for ``facts``."""
+        return self._fired(facts)
+
+    def fired_rules(self, facts: Mapping) -> List[str]:
+        names = self.names
+        return [names[i] for i in self._fired(facts)]
+
+    def evaluate(self, facts: Mapping) -> List[str]:
+        messages = self.messages
+        return [messages[i] for i in self._fired(facts)]
+
+    def evaluate_columns(self, columns: Mapping) -> Tuple:
+        """Evaluate every rule over array columns, returning one mask per rule.
+
+        A rule that is a bare field, or a constant, comes back as that column
+        or scalar; ``batch_advisor.evaluate_batch`` makes every mask bool.
+        """
+        return self._masks(columns)
+
+    def mask(self, indices: Iterable[int]) -> int:
+        """Stored form of a set of fired rules: bit ``rule.id`` for each catalog position."""
+        ids = self.ids
+        mask = 0
+        for i in indices:
+            mask |= 1 << ids[i]
+        return mask
+
+    def mask_for_messages(self, messages: Iterable[str]) -> Optional[int]:
+        """The mask for advice given as messages, or None if one is not in the catalog."""
+        mask = 0
+        for message in messages:
+            rule_id = self._id_by_message.get(message)
+            if rule_id is None:
+                return None
+            mask |= 1 << rule_id
+        return mask
+
+    def in_catalog_order(self, messages: Iterable[str]) -> List[str]:
+        """Advice messages sorted into catalog order; unknown messages go last.
+
+        An experta engine fires rules in an order that varies with the hash seed.
+        """
+        positions = self._position_by_message
+        return sorted(messages, key=lambda message: positions.get(message, len(positions)))
+
+    def messages_for_mask(self, mask: int) -> List[str]:
+        """Advice messages for a stored mask, in catalog order.
+
+        Bits of rules no longer in the catalog are ignored.
+        """
+        return [rule.message for rule in self.rules if mask >> rule.id & 1]
+
+
+def _compile_catalog(data: bytes, path: str) -> RuleSet:
+    try:
+        entries = json.loads(data)
+    except ValueError as exc:
+        raise RuleCatalogError(f"{path} is not valid JSON: {exc}") from None
+    if not isinstance(entries, list):
+        raise RuleCatalogError(f"{path} must contain a JSON list of rules")
+    return RuleSet(parse_rules(entries))
+
+
+def load_rules(path: str = RULES_PATH) -> RuleSet:
+    """Load, validate and compile a rules.json catalog."""
+    with open(path, 'rb') as f:
+        return _compile_catalog(f.read(), path)
+
+
+def _conjuncts(node: ast.AST) -> List[ast.AST]:
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+        return [term for value in node.values for term in _conjuncts(value)]
+    return [node]
+
+
+def _experta_rule(rule: RuleDef, instrumented: bool = False) -> Rule:
+    # Single-field terms become predicate constraints on the fact; terms that
+    # relate several fields bind them with MATCH and are checked in a TEST.
+    constraints: Dict[str, object] = {}
+    tests = []
+    for term in _conjuncts(ast.parse(rule.expression, mode='eval').body):
+        fields = _referenced_fields(term)
+        expression = ast.unparse(term)
+        if len(fields) == 1:
+            predicate = P(_compile_lambda(fields, expression))
+            field = fields[0]
+            constraints[field] = constraints[field] & predicate if field in constraints else predicate
+        else:
+            tests.append(TEST(_compile_lambda(fields, expression)))
+            for field in fields:
+                binding = getattr(MATCH, field)
+                constraints[field] = constraints[field] & binding if field in constraints else binding
+
+    message, name = rule.message, rule.name
+
+    if instrumented:
+        def action(self):
+            self._rule_fired(name)
+            self._add_advice(message)
+    else:
+        def action(self):
+            self._add_advice(message)
+
+    action.__name__ = action.__qualname__ = rule.name
+    return Rule(UserData(**constraints), *tests)(action)
+
+
+class _AdviceEngine(KnowledgeEngine):
+    ruleset: RuleSet
+
+    def __init__(self):
+        super().__init__()
+        self.advice_list = []
+
+    def _add_advice(self, msg):
+        self.advice_list.append(msg)
+
+
+def build_engine_class(ruleset: RuleSet, name: str = 'BudgetAdvisor',
+                       metrics: Optional[EngineMetrics] = None) -> type:
+    """Generate an experta ``KnowledgeEngine`` subclass with one rule per catalog entry.
+
+    With ``metrics``, the class also records rule fires and phase timings there
+    (see ``metrics.InstrumentedEngineMixin``).
+    """
+    instrumented = metrics is not None
+    namespace = {rule.name: _experta_rule(rule, instrumented) for rule in ruleset.rules}
+    namespace['ruleset'] = ruleset
+    namespace['__module__'] = __name__
+    if not instrumented:
+        return type(name, (_AdviceEngine,), namespace)
+    metrics.add_rules(ruleset.names)
+    namespace['metrics'] = metrics
+    return type(name, (InstrumentedEngineMixin, _AdviceEngine), namespace)
+
+
+class RuleCatalog:
+    """A rules.json file compiled into a ``RuleSet`` and engine class, reloaded on change.
+
+    ``reload_if_changed`` stats the file at most every ``interval`` seconds and
+    only re-reads it when its mtime or size moved; the content hash then decides
+    whether it really changed. The new rule set and engine class are published
+    together in one assignment, so a reader sees the old pair or the new one,
+    never a mix. Evaluations already running keep the objects they started with.
+    """
+
+    def __init__(self, path: str = RULES_PATH, interval: float = RELOAD_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._stats = {'reloads': 0, 'rejected': 0, 'last_error': None, 'reload_seconds': 0.0}
+        with open(path, 'rb') as f:
+            data = f.read()
+        self._stat = self._file_stat()
+        self._digest = hashlib.sha256(data).hexdigest()
+        self._rejected = None
+        ruleset = _compile_catalog(data, path)
+        self.current = (ruleset, build_engine_class(ruleset))
+
+    @property
+    def ruleset(self) -> RuleSet:
+        return self.current[0]
+
+    @property
+    def engine_class(self) -> type:
+        return self.current[1]
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
 
-    @Rule(UserData(debt_percent=P(lambda x: x > 20)))
-    def pay_debt(self):
-        print("Warning: More than 20% of your income goes to debt repayment.")
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Swap in the file's rules if it changed and compiles; True if swapped."""
+        if self.interval < 0 and not force:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        with self._lock:
+            self._next_check = now + max(self.interval, 0)
+            stat = self._file_stat()
+            if stat is None or (stat == self._stat and not force):
+                return False
+            start = time.perf_counter()
+            try:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return False  # mid-replace; try again at the next check
+            self._stat = stat
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in (self._digest, self._rejected):
+                return False
+            try:
+                ruleset = _compile_catalog(data, self.path)
+                engine_class = build_engine_class(ruleset)
+            except Exception as exc:
+                # Remember the bad file so it is not recompiled until it changes again.
+                self._rejected = digest
+                self._stats['rejected'] += 1
+                self._stats['last_error'] = str(exc)
+                logger.error("Keeping the current rules; %s was rejected: %s", self.path, exc)
+                return False
+            self.current = (ruleset, engine_class)
+            self._digest = digest
+            self._stats['reloads'] += 1
+            self._stats['last_error'] = None
+            self._stats['reload_seconds'] = time.perf_counter() - start
+            logger.info("Reloaded %d rules from %s", len(ruleset), self.path)
+            return True
 
-    @Rule(UserData(savings_percent=P(lambda x: x > 20)))
-    def encourage_investment(self):
-        print("Recommendation: Consider investment as part of your savings.")
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats['fingerprint'] = self.ruleset.fingerprint
+        return stats
 
-    @Rule(UserData(expenses_tracking=False))
-    def recommend_track_expenses(self):
-        print("Recommendation: Track daily expenses to manage your budget better.")
 
-    @Rule(UserData(subscription_percent=P(lambda x: x > 10)))
-    def recommend_reduce_subscriptions(self):
-        print("Recommendation: Reduce unnecessary subscriptions.")
+CATALOG = RuleCatalog()
+RULESET, BudgetAdvisor = CATALOG.current
 
-    @Rule(UserData(emergency_fund=P(lambda x: x < 500)))
-    def low_emergency_fund(self):
-        print("Recommendation: Build an emergency fund for unexpected expenses.")
 
-    @Rule(UserData(goal_exists=True, savings=P(lambda x: x < 500), goal_amount=1000))
-    def low_savings_for_goal(self):
-        print("Recommendation: Create a monthly savings plan to reach your goal.")
+def check_for_updates(force: bool = False) -> bool:
+    """Reload ``RULESET`` and ``BudgetAdvisor`` if rules.json changed; True if they did."""
+    global RULESET, BudgetAdvisor
+    swapped = CATALOG.reload_if_changed(force)
+    RULESET, BudgetAdvisor = CATALOG.current
+    return swapped
 
-    @Rule(UserData(wants_percent=P(lambda x: x > 30)))
-    def high_wants_spending(self):
-        print("Warning: Too much spending on non-essentials. Consider adjusting your budget.")
 
 #testing, hardcoded before connecting to streamlit
 if __name__ == "__main__":
@@ -54,3 +494,5 @@ if __name__ == "__main__":
         wants_percent=35
     ))
     engine.run()
+    for advice in engine.advice_list:
+        print(advice)
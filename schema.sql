@@ -0,0 +1,73 @@
+-- MySQL schema for the Student Budget Advisor.
+--
+--   mysql -u root -p < schema.sql
+--
+-- The embedded SQLite backend creates the equivalent tables itself
+-- (storage.SQLITE_SCHEMA).
+
+CREATE DATABASE IF NOT EXISTS budget_app;
+USE budget_app;
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(255) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS advice_log (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    savings_percent FLOAT,
+    debt_percent FLOAT,
+    subscription_percent FLOAT,
+    expenses_tracking BOOLEAN,
+    emergency_fund FLOAT,
+    wants_percent FLOAT,
+    goal_exists BOOLEAN,
+    savings FLOAT,
+    goal_amount FLOAT,
+    -- NULL for new rows: the advice is rendered from rule_mask at read time.
+    advice_text TEXT,
+    -- Bit n set when the rule with "id": n in rules.json fired.
+    rule_mask BIGINT,
+    -- UTC: every insert sets it from storage.utc_now rather than the default.
+    -- DATETIME, not TIMESTAMP, so MySQL stores the value as given instead of
+    -- converting it through the session time_zone (and past 2038).
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Serves every history page: equality on user_id, then a range scan down
+    -- (created_at, id). InnoDB appends the primary key to secondary indexes,
+    -- so id breaks ties between rows logged in the same second.
+    INDEX idx_advice_log_user_created (user_id, created_at),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- Daily rollups of advice_log for dashboards, maintained by rollups.py.
+-- rollup_state.high_water is the last advice_log.id folded into them.
+CREATE TABLE IF NOT EXISTS advice_daily (
+    day DATE PRIMARY KEY,
+    evaluations BIGINT NOT NULL,
+    savings_percent_sum DOUBLE NOT NULL,
+    debt_percent_sum DOUBLE NOT NULL,
+    wants_percent_sum DOUBLE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS advice_rule_daily (
+    day DATE NOT NULL,
+    rule_id TINYINT NOT NULL,
+    fires BIGINT NOT NULL,
+    PRIMARY KEY (day, rule_id)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name VARCHAR(64) PRIMARY KEY,
+    high_water BIGINT NOT NULL
+);
+
+-- For a database created before this file shipped:
+--   ALTER TABLE advice_log ADD INDEX idx_advice_log_user_created (user_id, created_at);
+--   ALTER TABLE advice_log ADD COLUMN rule_mask BIGINT NULL AFTER advice_text;
+-- and, if created_at is still a TIMESTAMP, read it back out in UTC while
+-- converting (db.py also opens every connection with time_zone '+00:00'):
+--   SET time_zone = '+00:00';
+--   ALTER TABLE advice_log MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP;
+-- then convert the existing text rows with: python backfill_rule_masks.py
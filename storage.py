@@ -0,0 +1,454 @@
+"""Storage backends behind the data-access functions in ``db``.
+
+``Storage`` is the interface ``db`` programs against: look up and add users,
+update a password hash, append to ``advice_log`` and read a user's recent
+history. ``db.MySQLStorage`` implements it over the pooled MySQL connections;
+``SQLiteStorage`` below keeps everything in one embedded SQLite file, for
+single-node deployments, tests and benchmarks that should not need a server.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SQLITE_PATH = os.environ.get('BUDGET_SQLITE_PATH', 'budget_app.db')
+
+# Every advice_log column, in the order ``Storage.export_advice`` returns them.
+EXPORT_COLUMNS = (
+    'id', 'user_id', 'created_at', 'savings_percent', 'debt_percent', 'subscription_percent',
+    'expenses_tracking', 'emergency_fund', 'wants_percent', 'goal_exists', 'savings',
+    'goal_amount', 'advice_text', 'rule_mask',
+)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS advice_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    savings_percent REAL,
+    debt_percent REAL,
+    subscription_percent REAL,
+    expenses_tracking INTEGER,
+    emergency_fund REAL,
+    wants_percent REAL,
+    goal_exists INTEGER,
+    savings REAL,
+    goal_amount REAL,
+    advice_text TEXT,
+    rule_mask INTEGER,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_advice_log_user_created ON advice_log (user_id, created_at);
+CREATE TABLE IF NOT EXISTS advice_daily (
+    day TEXT PRIMARY KEY,
+    evaluations INTEGER NOT NULL,
+    savings_percent_sum REAL NOT NULL,
+    debt_percent_sum REAL NOT NULL,
+    wants_percent_sum REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS advice_rule_daily (
+    day TEXT NOT NULL,
+    rule_id INTEGER NOT NULL,
+    fires INTEGER NOT NULL,
+    PRIMARY KEY (day, rule_id)
+);
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name TEXT PRIMARY KEY,
+    high_water INTEGER NOT NULL
+);
+"""
+
+# Applied to every SQLite connection. WAL lets readers run while a write is
+# in progress; synchronous=NORMAL is durable across crashes of the app in WAL
+# mode and only risks the last commits on power loss.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA busy_timeout = 5000",
+)
+
+SQLITE_SELECT_USER_SQL = "SELECT user_id, password FROM users WHERE username = ?"
+SQLITE_INSERT_USER_SQL = "INSERT INTO users (username, password) VALUES (?, ?)"
+SQLITE_UPDATE_PASSWORD_SQL = "UPDATE users SET password = ? WHERE user_id = ?"
+SQLITE_INSERT_ADVICE_SQL = """
+        INSERT INTO advice_log (
+            user_id, savings_percent, debt_percent, subscription_percent, expenses_tracking,
+            emergency_fund, wants_percent, goal_exists, savings, goal_amount, advice_text,
+            rule_mask, created_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+SQLITE_INSERT_ADVICE_BATCH_SQL = SQLITE_INSERT_ADVICE_SQL
+SQLITE_SELECT_HISTORY_SQL = """
+        SELECT id, created_at, savings_percent, debt_percent, wants_percent, advice_text,
+               rule_mask
+        FROM advice_log
+        WHERE user_id = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """
+SQLITE_SELECT_HISTORY_BEFORE_SQL = """
+        SELECT id, created_at, savings_percent, debt_percent, wants_percent, advice_text,
+               rule_mask
+        FROM advice_log
+        WHERE user_id = ? AND created_at <= ? AND (created_at < ? OR id < ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """
+SQLITE_SELECT_LEGACY_ADVICE_SQL = """
+        SELECT id, advice_text FROM advice_log
+        WHERE id > ? AND rule_mask IS NULL
+        ORDER BY id
+        LIMIT ?
+    """
+SQLITE_SET_RULE_MASK_SQL = "UPDATE advice_log SET rule_mask = ?, advice_text = NULL WHERE id = ?"
+SQLITE_EXPORT_ADVICE_SQL = """
+        SELECT id, user_id, created_at, savings_percent, debt_percent, subscription_percent,
+               expenses_tracking, emergency_fund, wants_percent, goal_exists, savings,
+               goal_amount, advice_text, rule_mask
+        FROM advice_log
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """
+SQLITE_EXPORT_USER_ADVICE_SQL = """
+        SELECT id, user_id, created_at, savings_percent, debt_percent, subscription_percent,
+               expenses_tracking, emergency_fund, wants_percent, goal_exists, savings,
+               goal_amount, advice_text, rule_mask
+        FROM advice_log
+        WHERE user_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    """
+SQLITE_SELECT_ADVICE_SINCE_SQL = """
+        SELECT id, created_at, savings_percent, debt_percent, wants_percent, advice_text,
+               rule_mask
+        FROM advice_log
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """
+SQLITE_SELECT_HIGH_WATER_SQL = "SELECT high_water FROM rollup_state WHERE name = ?"
+SQLITE_INIT_HIGH_WATER_SQL = "INSERT OR IGNORE INTO rollup_state (name, high_water) VALUES (?, 0)"
+SQLITE_ADVANCE_HIGH_WATER_SQL = """
+        UPDATE rollup_state SET high_water = ? WHERE name = ? AND high_water = ?
+    """
+SQLITE_UPSERT_DAILY_SQL = """
+        INSERT INTO advice_daily (
+            day, evaluations, savings_percent_sum, debt_percent_sum, wants_percent_sum
+        )
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (day) DO UPDATE SET
+            evaluations = evaluations + excluded.evaluations,
+            savings_percent_sum = savings_percent_sum + excluded.savings_percent_sum,
+            debt_percent_sum = debt_percent_sum + excluded.debt_percent_sum,
+            wants_percent_sum = wants_percent_sum + excluded.wants_percent_sum
+    """
+SQLITE_UPSERT_RULE_DAILY_SQL = """
+        INSERT INTO advice_rule_daily (day, rule_id, fires)
+        VALUES (?, ?, ?)
+        ON CONFLICT (day, rule_id) DO UPDATE SET fires = fires + excluded.fires
+    """
+SQLITE_SELECT_DAILY_SQL = """
+        SELECT day, evaluations, savings_percent_sum, debt_percent_sum, wants_percent_sum
+        FROM advice_daily
+        WHERE day >= ? AND day <= ?
+        ORDER BY day
+    """
+SQLITE_SELECT_RULE_DAILY_SQL = """
+        SELECT day, rule_id, fires
+        FROM advice_rule_daily
+        WHERE day >= ? AND day <= ?
+        ORDER BY day, rule_id
+    """
+
+
+def rule_fire_counts_sql(rule_ids: Sequence[int]) -> str:
+    """One pass over ``advice_log`` counting the rows each rule id fired in."""
+    sums = ", ".join(f"SUM((rule_mask >> {int(rule_id)}) & 1)" for rule_id in rule_ids)
+    return f"SELECT {sums} FROM advice_log WHERE rule_mask IS NOT NULL"
+
+
+class Storage:
+    """Interface for the persistence used by ``db``.
+
+    ``advice`` values are tuples in ``db.INSERT_ADVICE_SQL`` column order,
+    ending with ``created_at`` (see ``utc_now``). History rows are dicts with
+    ``id``, ``created_at`` (a ``datetime``), ``savings_percent``,
+    ``debt_percent``, ``wants_percent``, ``advice_text`` and ``rule_mask``,
+    newest first.
+    """
+
+    name = ''
+
+    def find_user(self, username: str) -> Optional[Tuple[int, str]]:
+        """``(user_id, password_hash)`` for ``username``, or None."""
+        raise NotImplementedError
+
+    def add_user(self, username: str, password_hash: str) -> bool:
+        """Create a user; False if the username is already taken."""
+        raise NotImplementedError
+
+    def update_password(self, user_id: int, password_hash: str):
+        raise NotImplementedError
+
+    def insert_advice(self, values: Sequence):
+        raise NotImplementedError
+
+    def insert_advice_batch(self, rows: Iterable[Sequence]):
+        """Insert many rows in one transaction."""
+        raise NotImplementedError
+
+    def advice_history(self, user_id: int, limit: int,
+                       before: Optional[Tuple[datetime.datetime, int]] = None) -> List[dict]:
+        """Up to ``limit`` rows, starting after the ``(created_at, id)`` cursor ``before``."""
+        raise NotImplementedError
+
+    def legacy_advice(self, after_id: int, limit: int) -> List[Tuple[int, str]]:
+        """``(id, advice_text)`` of rows without a rule mask, in id order after ``after_id``."""
+        raise NotImplementedError
+
+    def set_rule_masks(self, updates: Iterable[Tuple[int, int]]):
+        """Apply ``(rule_mask, id)`` pairs, clearing those rows' text, in one transaction."""
+        raise NotImplementedError
+
+    def rule_fire_counts(self, rule_ids: Sequence[int]) -> Dict[int, int]:
+        """Number of masked rows in which each rule id fired."""
+        raise NotImplementedError
+
+    def export_advice(self, user_id: Optional[int], batch_size: int) -> Iterator[List[tuple]]:
+        """Every ``advice_log`` row (of ``user_id``, or of all users) in id order.
+
+        Yields lists of up to ``batch_size`` rows in ``EXPORT_COLUMNS`` order,
+        reading each batch only when the previous one has been consumed.
+        """
+        raise NotImplementedError
+
+    def advice_since(self, after_id: int, limit: int) -> List[tuple]:
+        """Rows after ``after_id`` in id order, for the rollup job.
+
+        Each row is ``(id, created_at, savings_percent, debt_percent,
+        wants_percent, advice_text, rule_mask)``.
+        """
+        raise NotImplementedError
+
+    def rollup_high_water(self, name: str) -> int:
+        """Last ``advice_log.id`` folded into rollup ``name``; 0 before the first run."""
+        raise NotImplementedError
+
+    def apply_rollup(self, name: str, old_high_water: int, new_high_water: int,
+                     days: Sequence[tuple], rule_days: Sequence[tuple]) -> bool:
+        """Add deltas to the rollup tables and advance the high-water mark, atomically.
+
+        ``days`` rows are ``(day, evaluations, savings_percent_sum,
+        debt_percent_sum, wants_percent_sum)`` and ``rule_days`` rows are
+        ``(day, rule_id, fires)``. Returns False, changing nothing, if the
+        high-water mark is no longer ``old_high_water`` (another job got there
+        first).
+        """
+        raise NotImplementedError
+
+    def daily_rollup(self, start: datetime.date, end: datetime.date) -> List[tuple]:
+        """``advice_daily`` rows for ``start <= day <= end``, in day order."""
+        raise NotImplementedError
+
+    def rule_rollup(self, start: datetime.date, end: datetime.date) -> List[tuple]:
+        """``(day, rule_id, fires)`` rows for ``start <= day <= end``."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {'backend': self.name}
+
+    def close(self):
+        pass
+
+
+def utc_now() -> datetime.datetime:
+    """The ``created_at`` for a row logged now: naive UTC, whole seconds.
+
+    Every insert path sets ``created_at`` from this one clock, the same one
+    SQLite's ``CURRENT_TIMESTAMP`` uses, so history order, keyset pages and
+    rollup days agree whichever path wrote a row.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def _sqlite_value(value):
+    # The sqlite3 default datetime adapter is deprecated; store the same
+    # "YYYY-MM-DD HH:MM:SS" text CURRENT_TIMESTAMP produces.
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+class SQLiteStorage(Storage):
+    """Embedded SQLite storage on one shared connection.
+
+    SQLite serializes writers anyway, so one connection guarded by a lock
+    serves every session in the process without the cost of opening
+    connections. The schema is created on first use.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        for pragma in SQLITE_PRAGMAS:
+            self._conn.execute(pragma)
+        self._conn.executescript(SQLITE_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(advice_log)")}
+        if 'rule_mask' not in columns:
+            # A database created before advice was stored as a rule mask.
+            self._conn.execute("ALTER TABLE advice_log ADD COLUMN rule_mask INTEGER")
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._stats = {'queries': 0, 'query_time_total': 0.0}
+
+    @contextmanager
+    def _transaction(self):
+        """The connection, inside one transaction, for the duration of a ``with`` block."""
+        start = time.perf_counter()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self._conn
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            finally:
+                self._stats['queries'] += 1
+                self._stats['query_time_total'] += time.perf_counter() - start
+
+    def _execute(self, sql: str, params: Sequence = (), fetch: bool = False,
+                 many: bool = False):
+        if many:
+            with self._transaction() as conn:
+                conn.executemany(sql, params)
+            return None
+        start = time.perf_counter()
+        with self._lock:
+            try:
+                cursor = self._conn.execute(sql, params)
+                return cursor.fetchall() if fetch else None
+            finally:
+                self._stats['queries'] += 1
+                self._stats['query_time_total'] += time.perf_counter() - start
+
+    def find_user(self, username):
+        rows = self._execute(SQLITE_SELECT_USER_SQL, (username,), fetch=True)
+        return tuple(rows[0]) if rows else None
+
+    def add_user(self, username, password_hash):
+        try:
+            self._execute(SQLITE_INSERT_USER_SQL, (username, password_hash))
+            return True
+        except sqlite3.IntegrityError:
+            return False  # Username already exists
+
+    def update_password(self, user_id, password_hash):
+        self._execute(SQLITE_UPDATE_PASSWORD_SQL, (password_hash, user_id))
+
+    def insert_advice(self, values):
+        self._execute(SQLITE_INSERT_ADVICE_SQL, tuple(_sqlite_value(value) for value in values))
+
+    def insert_advice_batch(self, rows):
+        rows = [tuple(_sqlite_value(value) for value in row) for row in rows]
+        self._execute(SQLITE_INSERT_ADVICE_BATCH_SQL, rows, many=True)
+
+    def advice_history(self, user_id, limit, before=None):
+        if before is None:
+            rows = self._execute(SQLITE_SELECT_HISTORY_SQL, (user_id, limit), fetch=True)
+        else:
+            created_at, row_id = _sqlite_value(before[0]), before[1]
+            rows = self._execute(SQLITE_SELECT_HISTORY_BEFORE_SQL,
+                                 (user_id, created_at, created_at, row_id, limit), fetch=True)
+        history = []
+        for row in rows:
+            entry = dict(row)
+            entry['created_at'] = datetime.datetime.fromisoformat(entry['created_at'])
+            history.append(entry)
+        return history
+
+    def legacy_advice(self, after_id, limit):
+        rows = self._execute(SQLITE_SELECT_LEGACY_ADVICE_SQL, (after_id, limit), fetch=True)
+        return [tuple(row) for row in rows]
+
+    def set_rule_masks(self, updates):
+        self._execute(SQLITE_SET_RULE_MASK_SQL, list(updates), many=True)
+
+    def rule_fire_counts(self, rule_ids):
+        row = self._execute(rule_fire_counts_sql(rule_ids), fetch=True)[0]
+        return {rule_id: count or 0 for rule_id, count in zip(rule_ids, row)}
+
+    def export_advice(self, user_id, batch_size):
+        # One short query per batch, so the shared connection is never held
+        # while the caller writes a batch out.
+        after_id = 0
+        while True:
+            if user_id is None:
+                rows = self._execute(SQLITE_EXPORT_ADVICE_SQL, (after_id, batch_size), fetch=True)
+            else:
+                rows = self._execute(SQLITE_EXPORT_USER_ADVICE_SQL,
+                                     (user_id, after_id, batch_size), fetch=True)
+            if not rows:
+                return
+            yield [tuple(row[:2]) + (datetime.datetime.fromisoformat(row[2]),) + tuple(row)[3:]
+                   for row in rows]
+            after_id = rows[-1][0]
+
+    def advice_since(self, after_id, limit):
+        rows = self._execute(SQLITE_SELECT_ADVICE_SINCE_SQL, (after_id, limit), fetch=True)
+        return [(row[0], datetime.datetime.fromisoformat(row[1])) + tuple(row)[2:]
+                for row in rows]
+
+    def rollup_high_water(self, name):
+        rows = self._execute(SQLITE_SELECT_HIGH_WATER_SQL, (name,), fetch=True)
+        return rows[0][0] if rows else 0
+
+    def apply_rollup(self, name, old_high_water, new_high_water, days, rule_days):
+        with self._transaction() as conn:
+            conn.execute(SQLITE_INIT_HIGH_WATER_SQL, (name,))
+            cursor = conn.execute(SQLITE_ADVANCE_HIGH_WATER_SQL,
+                                  (new_high_water, name, old_high_water))
+            if cursor.rowcount != 1:
+                return False
+            conn.executemany(SQLITE_UPSERT_DAILY_SQL,
+                             [(day.isoformat(),) + tuple(rest) for day, *rest in days])
+            conn.executemany(SQLITE_UPSERT_RULE_DAILY_SQL,
+                             [(day.isoformat(),) + tuple(rest) for day, *rest in rule_days])
+        return True
+
+    def daily_rollup(self, start, end):
+        rows = self._execute(SQLITE_SELECT_DAILY_SQL, (start.isoformat(), end.isoformat()),
+                             fetch=True)
+        return [(datetime.date.fromisoformat(row[0]),) + tuple(row)[1:] for row in rows]
+
+    def rule_rollup(self, start, end):
+        rows = self._execute(SQLITE_SELECT_RULE_DAILY_SQL, (start.isoformat(), end.isoformat()),
+                             fetch=True)
+        return [(datetime.date.fromisoformat(row[0]),) + tuple(row)[1:] for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats: Dict[str, object] = dict(self._stats)
+        stats['backend'] = self.name
+        stats['path'] = self.path
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,163 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import db
+from advice_writer import AdviceRecord, AdviceWriter, WriterClosed
+
+
+def record(user_id, text="Test advice"):
+    return AdviceRecord(user_id, (user_id, text), {'advice_text': text})
+
+
+class TestAdviceWriter:
+    """Test cases for the write-behind advice queue"""
+
+    def test_batches_flushed_by_size(self):
+        """A full batch is written in a single call"""
+        batches = []
+        writer = AdviceWriter(batches.append, batch_size=3, flush_interval=60)
+        for i in range(3):
+            writer.submit(record(1, f"advice {i}"))
+        writer.close(timeout=2)
+
+        assert batches == [[(1, "advice 0"), (1, "advice 1"), (1, "advice 2")]]
+        assert writer.stats()['written'] == 3
+        assert writer.stats()['batches'] == 1
+
+    def test_partial_batch_flushed_by_interval(self):
+        """A batch that never fills is still written after the flush interval"""
+        written = threading.Event()
+        writer = AdviceWriter(lambda rows: written.set(), batch_size=100, flush_interval=0.05)
+        writer.submit(record(1))
+
+        assert written.wait(2)
+        writer.close(timeout=2)
+
+    def test_close_drains_queue(self):
+        """Shutting down writes every accepted record"""
+        rows = []
+        writer = AdviceWriter(rows.extend, batch_size=100, flush_interval=60)
+        for i in range(10):
+            writer.submit(record(i))
+        writer.close(timeout=2)
+
+        assert len(rows) == 10
+        assert writer.stats()['pending'] == 0
+        with pytest.raises(WriterClosed):
+            writer.submit(record(1))
+
+    def test_close_waits_for_inflight_submit(self):
+        """A submit blocked on a full queue when close starts is still written"""
+        release = threading.Event()
+        rows = []
+        writer = AdviceWriter(lambda batch: (release.wait(2), rows.extend(batch)),
+                              max_queue_size=1, batch_size=1, flush_interval=60, put_timeout=2)
+        writer.submit(record(1, "being written"))
+        while writer.stats()['queued']:
+            pass  # the writer thread has taken the first record
+        writer.submit(record(1, "queued"))
+        submitter = threading.Thread(target=writer.submit, args=(record(1, "in flight"),))
+        submitter.start()
+        while writer.stats()['pending'] < 3:
+            pass
+        closer = threading.Thread(target=writer.close, args=(2,))
+        closer.start()
+        release.set()
+        submitter.join(2)
+        closer.join(2)
+
+        assert [text for _, text in rows] == ["being written", "queued", "in flight"]
+        assert writer.pending_for(1) == []
+
+    def test_pending_visible_until_written(self):
+        """A user's queued records are visible, newest first, until flushed"""
+        release = threading.Event()
+        writer = AdviceWriter(lambda rows: release.wait(2), batch_size=1, flush_interval=60)
+        writer.submit(record(1, "first"))
+        writer.submit(record(1, "second"))
+        writer.submit(record(2, "other user"))
+
+        assert [row['advice_text'] for row in writer.pending_for(1)] == ["second", "first"]
+        release.set()
+        writer.close(timeout=2)
+        assert writer.pending_for(1) == []
+
+    def test_full_queue_drops_after_backpressure(self):
+        """When the queue stays full, submit waits briefly and then drops"""
+        release = threading.Event()
+        writer = AdviceWriter(lambda rows: release.wait(2), max_queue_size=1,
+                              batch_size=1, flush_interval=60, put_timeout=0.01)
+        accepted = [writer.submit(record(1)) for _ in range(5)]
+        release.set()
+        writer.close(timeout=2)
+
+        stats = writer.stats()
+        assert False in accepted
+        assert stats['dropped'] == accepted.count(False)
+        assert stats['written'] == accepted.count(True)
+
+    def test_failed_batch_reported(self):
+        """Records in a batch that fails to write are counted as failed"""
+        writer = AdviceWriter(MagicMock(side_effect=RuntimeError("db down")),
+                              batch_size=2, flush_interval=60)
+        writer.submit(record(1))
+        writer.submit(record(1))
+        writer.close(timeout=2)
+
+        assert writer.stats()['failed'] == 2
+        assert writer.pending_for(1) == []
+
+
+class TestWriteBehindDataAccess:
+    """insert_advice_to_db and history reads with write-behind enabled"""
+
+    def test_history_includes_pending_writes(self, sample_user_data):
+        """A user sees their own submit before it reaches the database"""
+        release = threading.Event()
+        pool = MagicMock()
+        cursor = pool.connection.return_value.__enter__.return_value.statement.return_value
+        cursor.fetchall.return_value = [{'advice_text': 'older'}]
+
+        with patch('db._pool', pool), \
+                patch('db.insert_advice_batch', side_effect=lambda rows: release.wait(2)):
+            db.enable_write_behind(batch_size=1, flush_interval=60)
+            try:
+                db.insert_advice_to_db(1, sample_user_data, "newest")
+                history = db.get_user_advice_history(1)
+            finally:
+                release.set()
+                db.disable_write_behind(timeout=2)
+
+        assert [row['advice_text'] for row in history] == ["newest", "older"]
+        assert history[0]['savings_percent'] == sample_user_data['savings_percent']
+
+    def test_insert_after_writer_closed_is_synchronous(self, sample_user_data):
+        """A submit racing disable_write_behind falls back to a direct insert"""
+        storage = MagicMock()
+
+        with patch('db.get_storage', return_value=storage), \
+                patch('db.insert_advice_batch'):
+            writer = db.enable_write_behind()
+            writer.close(timeout=2)
+            try:
+                db.insert_advice_to_db(1, sample_user_data, "late")
+            finally:
+                db.disable_write_behind(timeout=2)
+
+        storage.insert_advice.assert_called_once()
+        assert storage.insert_advice.call_args[0][0][0] == 1
+
+    def test_insert_advice_batch_single_transaction(self):
+        """A batch is written with one executemany and one commit"""
+        pool = db.ConnectionPool(size=1, connect=MagicMock())
+        rows = [(1,) * 12, (2,) * 12]
+
+        with patch('db._pool', pool):
+            db.insert_advice_batch(rows)
+
+        with pool.connection() as pooled:
+            conn = pooled.conn
+        conn.cursor.return_value.executemany.assert_called_once_with(db.INSERT_ADVICE_BATCH_SQL, rows)
+        conn.commit.assert_called_once()
@@ -0,0 +1,277 @@
+import random
+import threading
+
+import pytest
+
+import advisor
+import rules
+
+from advisor import (AdviceMemo, EnginePool, IncrementalAdvisor, advise, fact_key,
+                     get_engine_pool, run_engine)
+from metrics import EngineMetrics
+from rules import FIELDS, RULESET, BudgetAdvisor, build_engine_class
+from test_rules import random_facts, write_catalog
+
+
+class TestEnginePool:
+    """Test cases for the pre-built BudgetAdvisor pool"""
+
+    def test_engines_built_up_front(self):
+        """The pool builds and warms its engines when created"""
+        pool = EnginePool(size=2)
+
+        assert pool.stats()['created'] == 2
+        assert pool.stats()['idle'] == 2
+
+    def test_reused_engine_starts_clean(self, sample_user_data):
+        """Advice from an earlier request never leaks into the next one"""
+        pool = EnginePool(size=1)
+        healthy = dict(sample_user_data, savings=2000)
+        problematic = dict(healthy, savings_percent=3, debt_percent=30)
+
+        first = pool.evaluate(problematic)
+        second = pool.evaluate(healthy)
+
+        assert len(first) == 2
+        assert second == []
+        assert pool.stats()['created'] == 1
+
+    def test_matches_fresh_engine(self):
+        """Pooled evaluation gives the same advice as a new engine per request"""
+        pool = EnginePool(size=1)
+        rng = random.Random(3)
+        for _ in range(100):
+            facts = random_facts(rng)
+            assert pool.evaluate(facts) == run_engine(BudgetAdvisor(), facts)
+
+    def test_catalog_order(self):
+        """Pooled and incremental advice both come back in catalog order"""
+        pool = EnginePool(size=1)
+        advisor = IncrementalAdvisor(pool.engine_class)
+        rng = random.Random(4)
+        for _ in range(100):
+            facts = random_facts(rng)
+            assert pool.evaluate(facts) == advisor.evaluate(facts) == RULESET.evaluate(facts)
+
+    def test_exhausted_pool_overflows(self, sample_user_data):
+        """A checkout with every engine busy gets a temporary extra engine"""
+        pool = EnginePool(size=1)
+        with pool.checkout() as busy:
+            with pool.checkout() as extra:
+                assert extra is not busy
+
+        stats = pool.stats()
+        assert stats['overflow'] == 1
+        assert stats['idle'] == 1
+
+    def test_concurrent_sessions(self):
+        """Many threads can evaluate through one pool"""
+        pool = EnginePool(size=2)
+        rng = random.Random(11)
+        cases = [random_facts(rng) for _ in range(40)]
+        results = {}
+
+        def worker(i):
+            results[i] = pool.evaluate(cases[i])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(cases))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i, facts in enumerate(cases):
+            assert set(results[i]) == set(RULESET.evaluate(facts))
+
+    def test_advise_uses_shared_pool(self, sample_user_data):
+        """advise() evaluates through the process-wide pool"""
+        assert advise(dict(sample_user_data, wants_percent=40, goal_exists=False)) == [
+            "⚠️ Too much spending on non-essentials."]
+
+
+class TestAdviceMemo:
+    """Test cases for memoized advice"""
+
+    def test_equal_values_share_a_key(self, sample_user_data):
+        """Facts that experta treats alike map to the same key"""
+        as_ints = dict(sample_user_data, expenses_tracking=1, goal_exists=1)
+        as_floats = dict(sample_user_data, savings_percent=15.0)
+
+        assert fact_key(as_ints) == fact_key(sample_user_data) == fact_key(as_floats)
+        assert fact_key(dict(sample_user_data, savings_percent=16)) != fact_key(sample_user_data)
+
+    def test_incomplete_facts_not_memoized(self, sample_user_data):
+        """Partial or unhashable facts have no key"""
+        partial = dict(sample_user_data)
+        del partial['savings']
+
+        assert fact_key(partial) is None
+        assert fact_key(dict(sample_user_data, savings=[500])) is None
+
+    def test_hit_rate_reported(self):
+        """Repeat lookups are served from the memo and counted"""
+        memo = AdviceMemo()
+        assert memo.get(('k',), 'rules-v1') is None
+        memo.put(('k',), 'rules-v1', ["advice"])
+
+        assert memo.get(('k',), 'rules-v1') == ("advice",)
+        assert memo.stats()['hit_rate'] == 0.5
+
+    def test_rule_set_change_invalidates(self):
+        """Entries made under another rule set are never returned"""
+        memo = AdviceMemo()
+        memo.put(('k',), 'rules-v1', ["old advice"])
+
+        assert memo.get(('k',), 'rules-v2') is None
+        assert memo.stats()['invalidations'] == 1
+        assert memo.stats()['size'] == 0
+
+    def test_least_recently_used_evicted(self):
+        """The memo never grows past its size"""
+        memo = AdviceMemo(maxsize=2)
+        for key in ('a', 'b', 'c'):
+            memo.put(key, 'rules-v1', [key])
+
+        assert memo.get('a', 'rules-v1') is None
+        assert memo.stats()['evictions'] == 1
+
+    def test_advise_memoizes_repeat_submits(self, sample_user_data):
+        """A repeated submit does not touch the engine pool again"""
+        facts = dict(sample_user_data, debt_percent=47)
+        first = advise(facts)
+        checkouts = get_engine_pool().stats()['checkouts']
+
+        assert advise(dict(facts)) == first
+        assert get_engine_pool().stats()['checkouts'] == checkouts
+
+
+class TestIncrementalAdvisor:
+    """Test cases for a session's engine updated with modify"""
+
+    def _check_walk(self, advisor, seed, steps=300):
+        rng = random.Random(seed)
+        facts = random_facts(rng)
+        for _ in range(steps):
+            # Mostly one slider moved, sometimes a whole new form.
+            if rng.random() < 0.8:
+                field = rng.choice(FIELDS)
+                facts = dict(facts, **{field: random_facts(rng)[field]})
+            else:
+                facts = random_facts(rng)
+            assert advisor.evaluate(facts) == RULESET.evaluate(facts)
+            assert set(advisor.evaluate(facts)) == set(run_engine(BudgetAdvisor(), facts))
+
+    def test_matches_full_evaluation(self):
+        """Every submit gives the advice a full re-evaluation would"""
+        self._check_walk(IncrementalAdvisor(BudgetAdvisor), seed=5)
+
+    def test_instrumented_engine_matches(self):
+        """The instrumented class updates incrementally too"""
+        engine_class = build_engine_class(RULESET, metrics=EngineMetrics())
+        self._check_walk(IncrementalAdvisor(engine_class), seed=9, steps=100)
+
+    def test_only_affected_rules_rechecked(self):
+        """Moving one slider fires just the rules that read it"""
+        metrics = EngineMetrics()
+        advisor = IncrementalAdvisor(build_engine_class(RULESET, metrics=metrics))
+        # Every rule but encourage_investment fires for these facts.
+        facts = {'savings_percent': 5, 'debt_percent': 25, 'subscription_percent': 15,
+                 'expenses_tracking': False, 'emergency_fund': 300, 'wants_percent': 35,
+                 'goal_exists': True, 'savings': 400, 'goal_amount': 1000}
+        advisor.evaluate(facts)
+        metrics.reset()
+
+        advice = advisor.evaluate(dict(facts, savings_percent=25))
+
+        fired = {name for name, count in metrics.snapshot()['fires'].items() if count}
+        assert fired == {'encourage_investment'}
+        assert advice == RULESET.evaluate(dict(facts, savings_percent=25))
+        assert advisor.stats()['rules_rechecked'] == (
+            len(RULESET) + len(RULESET.rules_by_field['savings_percent']))
+
+    def test_fact_modified_in_place(self, sample_user_data):
+        """Working memory keeps a single UserData fact across submits"""
+        advisor = IncrementalAdvisor(BudgetAdvisor)
+        for savings in (100, 200, 300):
+            advisor.evaluate(dict(sample_user_data, savings=savings))
+
+        assert len(advisor.engine.facts) == 2  # InitialFact and UserData
+        assert advisor.stats()['full'] == 1
+
+    def test_unchanged_submit_skips_engine(self, sample_user_data):
+        """Resubmitting the same form does no matching at all"""
+        advisor = IncrementalAdvisor(BudgetAdvisor)
+        first = advisor.evaluate(sample_user_data)
+
+        assert advisor.evaluate(dict(sample_user_data)) == first
+        assert advisor.stats()['unchanged'] == 1
+
+    def test_advise_with_session(self, sample_user_data):
+        """advise() evaluates memo misses on the session's engine"""
+        advisor = IncrementalAdvisor()
+        facts = dict(sample_user_data, debt_percent=33, savings_percent=4)
+
+        assert advise(facts, advisor) == RULESET.evaluate(facts)
+        assert advisor.stats()['full'] == 1
+
+
+@pytest.fixture
+def live_catalog(tmp_path, monkeypatch):
+    """Point the process-wide catalog at a copy of rules.json the test can edit"""
+    path = tmp_path / "rules.json"
+    write_catalog(path)
+    catalog = rules.RuleCatalog(str(path), interval=0)
+    monkeypatch.setattr(rules, 'CATALOG', catalog)
+    monkeypatch.setattr(rules, 'RULESET', catalog.ruleset)
+    monkeypatch.setattr(rules, 'BudgetAdvisor', catalog.engine_class)
+    monkeypatch.setattr(advisor, '_pool', None)
+    yield path
+    advisor._memo.clear()
+
+
+class TestReload:
+    """The engine pool follows rules.json edits"""
+
+    def test_pool_rebuilt_for_new_rules(self, live_catalog, sample_user_data):
+        """After an edit, advise() uses engines built from the new catalog"""
+        facts = dict(sample_user_data, savings=2000, emergency_fund=700)
+        assert advise(facts) == []
+        old_pool = get_engine_pool()
+
+        write_catalog(live_catalog, emergency_fund_cutoff=1000)
+
+        assert advise(facts) == ["📌 Build an emergency fund for unexpected expenses."]
+        assert get_engine_pool() is not old_pool
+        assert rules.RULESET is get_engine_pool().engine_class.ruleset
+
+    def test_in_flight_pool_keeps_old_rules(self, live_catalog, sample_user_data):
+        """A request that already has the old pool finishes on the old rules"""
+        facts = dict(sample_user_data, savings=2000, emergency_fund=700)
+        old_pool = get_engine_pool()
+
+        write_catalog(live_catalog, emergency_fund_cutoff=1000)
+        get_engine_pool()
+
+        assert old_pool.evaluate(facts) == []
+
+    def test_bad_edit_keeps_pool(self, live_catalog, sample_user_data):
+        """A broken rules.json leaves the running pool in place"""
+        pool = get_engine_pool()
+
+        write_catalog(live_catalog, text="not json")
+
+        assert get_engine_pool() is pool
+        assert advise(dict(sample_user_data, savings=2000, debt_percent=35)) == [
+            "⚠️ More than 20% of your income goes to debt repayment."]
+
+    def test_session_rebinds(self, live_catalog, sample_user_data):
+        """A session's incremental engine moves to the new rules"""
+        session = IncrementalAdvisor()
+        facts = dict(sample_user_data, savings=2000, emergency_fund=700)
+        assert advise(facts, session) == []
+
+        write_catalog(live_catalog, emergency_fund_cutoff=1000)
+
+        assert advise(dict(facts), session) == [
+            "📌 Build an emergency fund for unexpected expenses."]
+        assert session.ruleset is rules.RULESET
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runs app.py once in a fresh interpreter and reports which modules it loaded.
+_SCRIPT = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+import db
+app = AppTest.from_file({app!r}, default_timeout=30)
+if {logged_in!r}:
+    db.create_user("alice", "secret")
+    app.session_state.user_id = db.check_credentials("alice", "secret")
+app.run()
+print(json.dumps({{'exception': [str(e.value) for e in app.exception],
+                  'titles': [t.value for t in app.title],
+                  'modules': sorted(m for m in ('experta', 'rules', 'advisor', 'advice_page')
+                                    if m in sys.modules)}}))
+"""
+
+
+def run_app(tmp_path, logged_in):
+    env = dict(os.environ, BUDGET_DB_BACKEND='sqlite',
+               BUDGET_SQLITE_PATH=str(tmp_path / "budget.db"), BUDGET_HASH_WORKERS='0',
+               BUDGET_SCRYPT_N='16')
+    script = _SCRIPT.format(app=os.path.join(ROOT, 'app.py'), logged_in=logged_in)
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.integration
+class TestStartup:
+    """The login screen loads only what it needs"""
+
+    def test_login_screen_skips_rule_engine(self, tmp_path):
+        """Rendering the login screen never imports the rule engine"""
+        result = run_app(tmp_path, logged_in=False)
+
+        assert result['exception'] == []
+        assert result['modules'] == []
+
+    def test_advice_page_after_login(self, tmp_path):
+        """A logged-in session renders the advice page"""
+        result = run_app(tmp_path, logged_in=True)
+
+        assert result['exception'] == []
+        assert result['titles'] == ["💰 Student Budget Advisor"]
+        assert 'advice_page' in result['modules']
@@ -1,8 +1,11 @@
 import pytest
 import hashlib
 import mysql.connector
+import numpy as np
 from unittest.mock import Mock, patch, MagicMock
-from experta import *
+
+from batch_advisor import FIELDS, advice_lists, columns_from_facts, evaluate_batch
+from rules import RULESET, BudgetAdvisor, RuleSet, UserData, parse_rules
 
 # # Run all tests without coverage
 # pytest test_budget_advisor.py -v
@@ -108,52 +111,6 @@ def get_user_advice_history(user_id):
     return results
 
 
-class UserData(Fact):
-    pass
-
-
-class BudgetAdvisor(KnowledgeEngine):
-    def __init__(self):
-        super().__init__()
-        self.advice_list = []
-
-    def _add_advice(self, msg):
-        self.advice_list.append(msg)
-
-    @Rule(UserData(savings_percent=P(lambda x: x < 10)))
-    def low_savings(self):
-        self._add_advice("⚠️ Your savings are below 10% of your income.")
-
-    @Rule(UserData(debt_percent=P(lambda x: x > 20)))
-    def pay_debt(self):
-        self._add_advice("⚠️ More than 20% of your income goes to debt repayment.")
-
-    @Rule(UserData(savings_percent=P(lambda x: x > 20)))
-    def encourage_investment(self):
-        self._add_advice("✅ Consider investment as part of your savings.")
-
-    @Rule(UserData(expenses_tracking=False))
-    def recommend_track_expenses(self):
-        self._add_advice("📌 Track daily expenses to manage your budget better.")
-
-    @Rule(UserData(subscription_percent=P(lambda x: x > 10)))
-    def recommend_reduce_subscriptions(self):
-        self._add_advice("📌 Reduce unnecessary subscriptions.")
-
-    @Rule(UserData(emergency_fund=P(lambda x: x < 500)))
-    def low_emergency_fund(self):
-        self._add_advice("📌 Build an emergency fund for unexpected expenses.")
-
-    @Rule(UserData(goal_exists=True, savings=MATCH.s, goal_amount=MATCH.g))
-    def low_savings_for_goal(self, s, g):
-        if s < g:
-            self._add_advice("📌 Create a monthly savings plan to reach your goal.")
-
-    @Rule(UserData(wants_percent=P(lambda x: x > 30)))
-    def high_wants_spending(self):
-        self._add_advice("⚠️ Too much spending on non-essentials.")
-
-
 # Mock functions for database operations
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -474,23 +431,84 @@ class TestIntegration:
         assert "savings plan to reach your goal" in advice_text
 
 
-# Pytest fixtures for common test data
-@pytest.fixture
-def sample_user_data():
-    """Fixture providing sample user data for tests"""
-    return {
-        'savings_percent': 15,
-        'debt_percent': 10,
-        'subscription_percent': 5,
-        'expenses_tracking': True,
-        'emergency_fund': 1000,
-        'wants_percent': 25,
-        'goal_exists': True,
-        'savings': 500,
-        'goal_amount': 2000
-    }
-
+class TestBatchEvaluation:
+    """Vectorized batch evaluation must agree with the experta engine"""
 
+    def run_engine(self, facts):
+        engine = BudgetAdvisor()
+        engine.reset()
+        engine.declare(UserData(**facts))
+        engine.run()
+        return engine.advice_list
+
+    def test_matches_engine_row_for_row(self):
+        """Every synthetic user gets exactly the advice the engine gives"""
+        rng = np.random.default_rng(42)
+        n = 500
+        columns = {
+            'savings_percent': rng.integers(0, 101, n),
+            'debt_percent': rng.integers(0, 101, n),
+            'subscription_percent': rng.integers(0, 101, n),
+            'expenses_tracking': rng.integers(0, 2, n).astype(bool),
+            'emergency_fund': rng.integers(0, 1000, n),
+            'wants_percent': rng.integers(0, 101, n),
+            'goal_exists': rng.integers(0, 2, n).astype(bool),
+            'savings': rng.integers(0, 3000, n),
+            'goal_amount': rng.integers(0, 3000, n),
+        }
+        matrix = evaluate_batch(columns)
+
+        assert matrix.shape == (n, len(RULESET))
+        for i, advice in enumerate(advice_lists(matrix)):
+            facts = {field: columns[field][i].item() for field in FIELDS}
+            # experta's firing order is not stable, so compare as sets
+            assert set(advice) == set(self.run_engine(facts))
+
+    def test_threshold_boundaries(self, sample_user_data, problematic_user_data):
+        """Values exactly on a threshold do not fire"""
+        boundary = dict(sample_user_data, savings_percent=10, debt_percent=20,
+                        subscription_percent=10, emergency_fund=500,
+                        wants_percent=30, savings=2000, goal_amount=2000)
+        facts = [sample_user_data, problematic_user_data, boundary]
+        matrix = evaluate_batch(columns_from_facts(facts))
+
+        for row, advice in zip(facts, advice_lists(matrix)):
+            assert set(advice) == set(self.run_engine(row))
+        assert not matrix[2].any()
+
+    def test_int_flag_columns(self):
+        """NOT, AND, OR and bare fields over int 0/1 columns match row-by-row evaluation"""
+        ruleset = RuleSet(parse_rules([
+            {"rule": "no_goal", "condition": "NOT goal_exists OR goal_amount == 0",
+             "action": "suggest_action('Set a goal.')"},
+            {"rule": "untracked_goal", "condition": "goal_exists AND NOT expenses_tracking",
+             "action": "warn_user('Track your spending.')"},
+            {"rule": "tracking", "condition": "expenses_tracking",
+             "action": "suggest_action('Keep tracking.')"},
+        ]))
+        rng = np.random.default_rng(5)
+        n = 200
+        columns = {field: rng.integers(0, 2 if field in ('expenses_tracking', 'goal_exists')
+                                       else 100, n)
+                   for field in FIELDS}
+
+        matrix = evaluate_batch(columns, ruleset)
+
+        assert matrix.dtype == bool
+        for i, row in enumerate(matrix):
+            facts = {field: columns[field][i].item() for field in FIELDS}
+            assert [ruleset.names[j] for j in np.flatnonzero(row)] == ruleset.fired_rules(facts)
+
+    def test_missing_column_rejected(self, sample_user_data):
+        """A column set without every UserData field is rejected"""
+        columns = columns_from_facts([sample_user_data])
+        del columns['goal_amount']
+
+        with pytest.raises(KeyError):
+            evaluate_batch(columns)
+
+
+# Pytest fixtures for common test data (sample_user_data lives in conftest.py)
 @pytest.fixture
 def problematic_user_data():
     """Fixture providing problematic financial data for tests"""
@@ -0,0 +1,177 @@
+import csv
+import json
+import random
+from unittest.mock import patch
+
+import pytest
+
+import bulk_advice
+import rules
+from rules import FIELDS, RULESET, RuleSet, parse_rules
+from test_rules import random_facts
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def cohort():
+    rng = random.Random(21)
+    return [random_facts(rng) for _ in range(25)]
+
+
+class TestBulkAdvice:
+    """Test cases for the streaming cohort scoring CLI"""
+
+    def test_csv_to_jsonl(self, tmp_path, cohort):
+        """Every row is scored exactly as the rule set would score it"""
+        source, target = tmp_path / "cohort.csv", tmp_path / "advice.jsonl"
+        write_csv(source, cohort)
+
+        result = bulk_advice.run(str(source), str(target), chunk_size=4, progress=None)
+
+        records = [json.loads(line) for line in target.read_text().splitlines()]
+        assert result['rows'] == len(records) == len(cohort)
+        for facts, record in zip(cohort, records):
+            assert record['advice'] == RULESET.evaluate(facts)
+            assert record['rules'] == RULESET.fired_rules(facts)
+            assert record['savings'] == facts['savings']
+
+    def test_jsonl_to_csv(self, tmp_path, cohort):
+        """JSON-lines input and CSV output work the same way"""
+        source, target = tmp_path / "cohort.jsonl", tmp_path / "advice.csv"
+        source.write_text("".join(json.dumps(row) + "\n" for row in cohort))
+
+        bulk_advice.main([str(source), "-o", str(target), "-q"])
+
+        with open(target, newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == len(cohort)
+        for facts, row in zip(cohort, rows):
+            assert row['advice_text'].split("\n") == (RULESET.evaluate(facts) or [""])
+
+    def test_to_db_in_batches(self, tmp_path, cohort):
+        """Rows with advice are inserted into advice_log in fixed-size batches"""
+        source = tmp_path / "cohort.jsonl"
+        source.write_text("".join(json.dumps(row) + "\n" for row in cohort))
+        batches = []
+
+        with patch('db.insert_advice_batch', side_effect=lambda rows: batches.append(list(rows))):
+            bulk_advice.run(str(source), to_db=True, user_id=7, db_batch_size=10, progress=None)
+
+        inserted = [row for batch in batches for row in batch]
+        expected = [facts for facts in cohort if RULESET.evaluate(facts)]
+        assert all(len(batch) <= 10 for batch in batches)
+        assert len(inserted) == len(expected)
+        assert {row[0] for row in inserted} == {7}
+        assert inserted[0][1:10] == tuple(expected[0][field] for field in FIELDS)
+        assert inserted[0][10] is None
+        assert RULESET.messages_for_mask(inserted[0][11]) == RULESET.evaluate(expected[0])
+
+    def test_reloaded_catalog_used(self, tmp_path, cohort, monkeypatch):
+        """Rows are scored, named and masked with the catalog live at run time"""
+        source, target = tmp_path / "cohort.jsonl", tmp_path / "advice.jsonl"
+        source.write_text("".join(json.dumps(row) + "\n" for row in cohort))
+        reloaded = RuleSet(parse_rules([
+            {"id": 5, "rule": "any_debt", "condition": "debt_percent > 0",
+             "action": "warn_user('You have debt.')"},
+        ]))
+        monkeypatch.setattr(rules, 'RULESET', reloaded)
+        batches = []
+
+        with patch('db.insert_advice_batch', side_effect=batches.append):
+            bulk_advice.run(str(source), str(target), to_db=True, user_id=7, progress=None)
+
+        records = [json.loads(line) for line in target.read_text().splitlines()]
+        for facts, record in zip(cohort, records):
+            assert record['rules'] == reloaded.fired_rules(facts)
+            assert record['advice'] == reloaded.evaluate(facts)
+        assert {row[11] for batch in batches for row in batch} == {1 << 5}
+
+    def test_user_id_column_used(self, tmp_path, sample_user_data):
+        """A user_id column overrides --user-id"""
+        source = tmp_path / "cohort.csv"
+        write_csv(source, [dict(sample_user_data, user_id=3)])
+        batches = []
+
+        with patch('db.insert_advice_batch', side_effect=batches.append):
+            bulk_advice.run(str(source), to_db=True, user_id=7, progress=None)
+
+        assert batches[0][0][0] == 3
+
+    @pytest.mark.parametrize("text, expected", [
+        ("True", True), ("false", False), ("1", True), ("0", False), ("yes", True), ("", False),
+    ])
+    def test_boolean_columns(self, sample_user_data, text, expected):
+        """Checkbox columns accept the usual spellings"""
+        row = dict(sample_user_data, expenses_tracking=text)
+
+        assert bulk_advice.coerce_row(row, 1)['expenses_tracking'] is expected
+
+    def test_bad_row_reported_with_line(self, sample_user_data):
+        """Malformed rows name the row and field"""
+        row = dict(sample_user_data, debt_percent="lots")
+
+        with pytest.raises(ValueError, match="row 12: bad value for 'debt_percent'"):
+            bulk_advice.coerce_row(row, 12)
+        del row['debt_percent']
+        with pytest.raises(ValueError, match="missing field 'debt_percent'"):
+            bulk_advice.coerce_row(row, 12)
+
+    def test_out_of_range_row_rejected(self, sample_user_data):
+        """Rows are validated like form input: percentages must be 0-100"""
+        row = dict(sample_user_data, wants_percent="150")
+
+        with pytest.raises(ValueError, match="row 3: bad value for 'wants_percent'"):
+            bulk_advice.coerce_row(row, 3)
+
+    def test_bad_user_id_reported_with_line(self, tmp_path, sample_user_data):
+        """A non-numeric user_id names its row"""
+        source = tmp_path / "cohort.csv"
+        write_csv(source, [dict(sample_user_data, user_id=3), dict(sample_user_data, user_id="x")])
+
+        with pytest.raises(ValueError, match="row 2: bad user_id 'x'"):
+            bulk_advice.run(str(source), str(tmp_path / "advice.jsonl"), progress=None)
+
+    def test_bad_row_inserts_nothing(self, tmp_path, cohort):
+        """The file is checked before any batch reaches advice_log"""
+        source = tmp_path / "cohort.jsonl"
+        rows = cohort + [dict(cohort[0], debt_percent="lots")]
+        source.write_text("".join(json.dumps(row) + "\n" for row in rows))
+        batches = []
+
+        with patch('db.insert_advice_batch', side_effect=batches.append):
+            with pytest.raises(ValueError, match=f"row {len(rows)}: bad value"):
+                bulk_advice.run(str(source), to_db=True, user_id=7, chunk_size=4,
+                                db_batch_size=2, progress=None)
+
+        assert batches == []
+
+    def test_missing_user_id_rejected_before_insert(self, tmp_path, cohort):
+        """Without --user-id every row needs a user_id before anything is inserted"""
+        source = tmp_path / "cohort.jsonl"
+        rows = [dict(facts, user_id=1) for facts in cohort] + [cohort[0]]
+        source.write_text("".join(json.dumps(row) + "\n" for row in rows))
+        batches = []
+
+        with patch('db.insert_advice_batch', side_effect=batches.append):
+            with pytest.raises(ValueError, match=f"row {len(rows)}: no user_id"):
+                bulk_advice.run(str(source), to_db=True, db_batch_size=2, progress=None)
+
+        assert batches == []
+
+    def test_main_reports_bad_row(self, tmp_path, cohort, capsys):
+        """main exits non-zero with the error and leaves no partial output file"""
+        source, target = tmp_path / "cohort.csv", tmp_path / "advice.jsonl"
+        write_csv(source, cohort + [dict(cohort[0], savings_percent="150")])
+
+        with pytest.raises(SystemExit) as exit_info:
+            bulk_advice.main([str(source), "-o", str(target), "-q", "--chunk-size", "4"])
+
+        assert exit_info.value.code == 1
+        assert f"row {len(cohort) + 1}: bad value for 'savings_percent'" in capsys.readouterr().err
+        assert not target.exists()
@@ -0,0 +1,215 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import mysql.connector
+import pytest
+from mysql.connector.errors import PoolError
+
+import db
+import passwords
+
+
+def make_connection():
+    conn = MagicMock()
+    conn.in_transaction = False
+    return conn
+
+
+@pytest.fixture
+def connect():
+    return MagicMock(side_effect=make_connection)
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing():
+    """Hash inline with a cheap scrypt cost so tests stay fast"""
+    hasher, pool = passwords._hasher, passwords._pool
+    passwords.configure(hasher=passwords.ScryptHasher(n=16), workers=0)
+    yield
+    passwords.configure(hasher=hasher)
+    passwords._pool = pool
+
+
+@pytest.fixture
+def pool(connect):
+    pool = db.ConnectionPool(size=2, timeout=0.2, health_check_interval=60, connect=connect)
+    db._history_cache.clear()
+    with patch('db._pool', pool):
+        yield pool
+    db._history_cache.clear()
+
+
+class TestConnectionPool:
+    """Test cases for the process-wide connection pool"""
+
+    def test_connections_use_utc(self):
+        """Every MySQL session runs on UTC, the clock created_at is stored in"""
+        with patch('mysql.connector.connect') as connect:
+            db.get_connection()
+
+        assert connect.call_args.kwargs['time_zone'] == '+00:00'
+
+    def test_connection_reused(self, pool, connect):
+        """Sequential checkouts share a single connection"""
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        assert first is second
+        connect.assert_called_once()
+        stats = pool.stats()
+        assert stats['checkouts'] == 2
+        assert stats['connections_created'] == 1
+        assert stats['in_use'] == 0
+        assert stats['idle'] == 1
+
+    def test_pool_size_bounds_connections(self, pool, connect):
+        """A checkout waits for a free slot and times out when none is returned"""
+        with pool.connection(), pool.connection():
+            with pytest.raises(PoolError):
+                with pool.connection():
+                    pass
+
+        assert connect.call_count == 2
+        assert pool.stats()['timeouts'] == 1
+
+    def test_waiting_checkout_gets_returned_connection(self, pool):
+        """A blocked checkout proceeds once another thread checks in"""
+        pool.timeout = 2
+        results = []
+        with pool.connection() as a, pool.connection():
+            worker = threading.Thread(target=lambda: results.append(pool._acquire()))
+            worker.start()
+            worker.join(0.05)
+            assert worker.is_alive()
+        worker.join(1)
+
+        assert results[0] is a
+        assert pool.stats()['wait_time_max'] > 0
+        pool._release(results[0])
+
+    def test_health_check_replaces_dead_connection(self, pool, connect):
+        """Stale idle connections that fail a ping are replaced"""
+        with pool.connection() as first:
+            first.conn.ping.side_effect = mysql.connector.errors.InterfaceError("gone")
+        pool.health_check_interval = 0
+
+        with pool.connection() as second:
+            pass
+
+        assert second is not first
+        first.conn.close.assert_called_once()
+        assert pool.stats()['connections_discarded'] == 1
+        assert connect.call_count == 2
+
+    def test_open_transaction_rolled_back_on_checkin(self, pool):
+        """A connection is never returned to the pool mid-transaction"""
+        with pool.connection() as pooled:
+            pooled.conn.in_transaction = True
+
+        pooled.conn.rollback.assert_called_once()
+
+    def test_broken_connection_discarded(self, pool):
+        """Connections that raise operational errors are not reused"""
+        with pytest.raises(mysql.connector.errors.OperationalError):
+            with pool.connection() as broken:
+                raise mysql.connector.errors.OperationalError("lost connection")
+
+        with pool.connection() as fresh:
+            pass
+
+        assert fresh is not broken
+
+    def test_prepared_statement_reused(self, pool):
+        """Each statement is prepared once per connection"""
+        with pool.connection() as pooled:
+            first = pooled.statement(db.SELECT_USER_SQL)
+        with pool.connection() as pooled:
+            second = pooled.statement(db.SELECT_USER_SQL)
+
+        assert first is second
+        pooled.conn.cursor.assert_called_once_with(prepared=True, dictionary=False)
+
+
+class TestDataAccess:
+    """The data-access functions go through the shared pool"""
+
+    def cursor(self, pool):
+        with pool.connection() as pooled:
+            return pooled.conn.cursor.return_value
+
+    def test_check_credentials_valid(self, pool):
+        """Valid credentials return the user id"""
+        cursor = self.cursor(pool)
+        cursor.fetchall.return_value = [(1, passwords.hash_password("test123"))]
+
+        assert db.check_credentials("testuser", "test123") == 1
+        cursor.execute.assert_called_once_with(db.SELECT_USER_SQL, ("testuser",))
+
+    def test_legacy_hash_rehashed_on_login(self, pool):
+        """An old SHA-256 row is upgraded to the current KDF on a successful login"""
+        cursor = self.cursor(pool)
+        legacy = passwords.LegacySha256Hasher().hash("test123")
+        cursor.fetchall.return_value = [(1, legacy)]
+
+        assert db.check_credentials("testuser", "test123") == 1
+        sql, (new_hash, user_id) = cursor.execute.call_args.args
+        assert sql == db.UPDATE_PASSWORD_SQL
+        assert user_id == 1
+        assert new_hash.startswith("scrypt$")
+        assert passwords.verify_password("test123", new_hash) == (True, False)
+
+    def test_wrong_password_not_rehashed(self, pool):
+        """A failed login never rewrites the stored hash"""
+        cursor = self.cursor(pool)
+        legacy = passwords.LegacySha256Hasher().hash("test123")
+        cursor.fetchall.return_value = [(1, legacy)]
+
+        assert db.check_credentials("testuser", "wrong") is None
+        cursor.execute.assert_called_once()
+
+    def test_check_credentials_invalid(self, pool):
+        """Unknown users are rejected"""
+        cursor = self.cursor(pool)
+        cursor.fetchall.return_value = []
+
+        assert db.check_credentials("nonexistent", "wrongpass") is None
+
+    def test_create_user_duplicate(self, pool):
+        """Duplicate usernames report failure"""
+        cursor = self.cursor(pool)
+        cursor.execute.side_effect = mysql.connector.errors.IntegrityError("Duplicate entry")
+
+        assert db.create_user("existinguser", "password123") is False
+
+    def test_insert_and_history_share_one_connection(self, pool, connect, sample_user_data):
+        """A submit followed by a history read needs only one connection"""
+        cursor = self.cursor(pool)
+        cursor.fetchall.return_value = [{'advice_text': 'Test advice'}]
+
+        db.insert_advice_to_db(1, sample_user_data, "Test advice")
+        history = db.get_user_advice_history(1)
+
+        assert history == [{'advice_text': 'Test advice'}]
+        connect.assert_called_once()
+        assert pool.stats()['checkouts'] == 3
+
+
+    def test_history_cached_until_insert(self, pool, connect, sample_user_data):
+        """Repeated history reads hit the cache until the user submits again"""
+        cursor = self.cursor(pool)
+        cursor.fetchall.return_value = [{'advice_text': 'Test advice'}]
+        before = db.history_cache_stats()
+
+        db.get_user_advice_history(1)
+        db.get_user_advice_history(1)
+        assert cursor.execute.call_count == 1
+
+        db.insert_advice_to_db(1, sample_user_data, "Test advice")
+        db.get_user_advice_history(1)
+        assert cursor.execute.call_count == 3
+
+        stats = db.history_cache_stats()
+        assert stats['hits'] - before['hits'] == 1
+        assert stats['misses'] - before['misses'] == 2
@@ -0,0 +1,63 @@
+import random
+
+from decision_table import DecisionTable, get_decision_table, verify_against_engine
+from rules import RULESET, RuleSet, parse_rules
+from test_rules import random_facts
+
+
+class TestDecisionTable:
+    """Test cases for the precomputed threshold decision table"""
+
+    def test_threshold_rules_tabulated(self):
+        """Single-field threshold rules go in the table, relational ones stay residual"""
+        table = DecisionTable(RULESET)
+
+        assert table.residual_rules == (RULESET.names.index('low_savings_for_goal'),)
+        boundaries = dict(zip(table.fields, table.boundaries))
+        assert boundaries['savings_percent'] == (10, 20)
+        assert boundaries['emergency_fund'] == (500,)
+        assert table.size == len(table.table)
+
+    def test_verified_against_engine_over_slider_domain(self, sample_user_data):
+        """The table agrees with experta on every region and slider value"""
+        table = DecisionTable(RULESET)
+
+        assert verify_against_engine(table, sample_user_data) == []
+        assert verify_against_engine(table, dict(sample_user_data, goal_exists=False)) == []
+
+    def test_matches_compiled_evaluator(self):
+        """Random inputs, including fractional amounts, match the rule set"""
+        table = DecisionTable(RULESET)
+        rng = random.Random(5)
+        for _ in range(2000):
+            facts = random_facts(rng)
+            facts['emergency_fund'] += rng.choice((0, 0.5, -0.5))
+            assert list(table.evaluate(facts)) == RULESET.evaluate(facts)
+
+    def test_multi_field_threshold_rule(self):
+        """A conjunction of thresholds on different fields is tabulated too"""
+        ruleset = RuleSet(parse_rules([
+            {"rule": "squeezed", "condition": "savings_percent <= 5 AND wants_percent > 40",
+             "action": "warn_user('Squeezed.')"},
+            {"rule": "no_goal", "condition": "NOT goal_exists",
+             "action": "suggest_action('Set a goal.')"},
+        ]))
+        table = DecisionTable(ruleset)
+
+        assert table.table_rules == (0,)
+        assert table.residual_rules == (1,)
+        assert table.evaluate({'savings_percent': 5, 'wants_percent': 41, 'goal_exists': True}) == (
+            "⚠️ Squeezed.",)
+        assert table.evaluate({'savings_percent': 6, 'wants_percent': 41, 'goal_exists': False}) == (
+            "✅ Set a goal.",)
+
+    def test_rebuilt_when_rules_change(self):
+        """The shared table follows the rule set it is asked for"""
+        other = RuleSet(parse_rules([
+            {"rule": "pay_debt", "condition": "debt_percent > 50", "action": "warn_user('x')"},
+        ]))
+
+        assert get_decision_table(RULESET) is get_decision_table(RULESET)
+        rebuilt = get_decision_table(other)
+        assert rebuilt.fingerprint == other.fingerprint
+        assert rebuilt.boundaries == ((50,),)
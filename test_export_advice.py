@@ -0,0 +1,103 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+import export_advice
+from rules import RULESET
+from storage import EXPORT_COLUMNS, SQLiteStorage
+from test_storage import advice_values
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "budget.db"))
+    storage.add_user("alice", "hash")
+    storage.add_user("bob", "hash")
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def logged(storage, sample_user_data):
+    """Five evaluations by alice and two by bob, interleaved"""
+    mask = RULESET.mask(RULESET.fired_indices(sample_user_data))
+    start = datetime.datetime(2024, 3, 1, 8)
+    storage.insert_advice_batch([
+        advice_values(2 if i in (2, 5) else 1, sample_user_data, None, mask)
+        + (start + datetime.timedelta(minutes=i),)
+        for i in range(7)
+    ])
+    return mask
+
+
+def export(fmt, storage, **kwargs):
+    out = io.StringIO()
+    export_advice.write_export(out, fmt, storage=storage, **kwargs)
+    return out.getvalue()
+
+
+class TestExportAdvice:
+    """Test cases for the streamed advice_log export"""
+
+    def test_sqlite_batches(self, storage, logged):
+        """SQLite export reads every row in id order, batch_size at a time"""
+        batches = list(storage.export_advice(None, 3))
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        ids = [row[0] for batch in batches for row in batch]
+        assert ids == sorted(ids) and len(ids) == 7
+        assert all(len(row) == len(EXPORT_COLUMNS) for batch in batches for row in batch)
+
+    def test_user_filter(self, storage, logged):
+        """Only the given user's rows are exported"""
+        rows = [row for batch in storage.export_advice(2, 1) for row in batch]
+        assert [row[1] for row in rows] == [2, 2]
+
+    def test_csv(self, storage, logged, sample_user_data):
+        """CSV has the header and one row per evaluation, advice rendered from the mask"""
+        rows = list(csv.DictReader(io.StringIO(export('csv', storage, batch_size=2))))
+        assert len(rows) == 7
+        assert list(rows[0]) == list(EXPORT_COLUMNS)
+        assert rows[0]['advice_text'] == "\n".join(RULESET.evaluate(sample_user_data))
+        assert rows[0]['rule_mask'] == str(logged)
+
+    def test_jsonl(self, storage, logged, sample_user_data):
+        """JSON lines carry one object per evaluation"""
+        lines = export('jsonl', storage, user_id=1).splitlines()
+        records = [json.loads(line) for line in lines]
+        assert len(records) == 5
+        assert {record['user_id'] for record in records} == {1}
+        assert records[0]['savings'] == sample_user_data['savings']
+        assert records[0]['advice_text'] == "\n".join(RULESET.evaluate(sample_user_data))
+
+    def test_batch_size_does_not_change_output(self, storage, logged):
+        """Any batch size gives the same file"""
+        assert export('csv', storage, batch_size=1) == export('csv', storage, batch_size=1000)
+        assert export('jsonl', storage, batch_size=4) == export('jsonl', storage, batch_size=7)
+
+    def test_one_chunk_per_batch(self, storage, logged):
+        """The export is produced a batch at a time"""
+        chunks = list(export_advice.iter_export('jsonl', batch_size=3, storage=storage))
+        assert [chunk.count("\n") for chunk in chunks] == [3, 3, 1]
+
+    def test_download_bytes_capped(self, storage, logged):
+        """The app's download gets the same export as bytes, up to a size cap"""
+        full = export('csv', storage).encode('utf-8')
+
+        assert export_advice.export_bytes('csv', batch_size=2, max_bytes=len(full),
+                                          storage=storage) == full
+        with pytest.raises(export_advice.ExportTooLarge):
+            export_advice.export_bytes('csv', batch_size=2, max_bytes=len(full) - 1,
+                                       storage=storage)
+
+    def test_empty(self, storage):
+        """With no rows, CSV is just the header and JSON lines is empty"""
+        assert export('csv', storage).splitlines() == [",".join(EXPORT_COLUMNS)]
+        assert export('jsonl', storage) == ""
+
+    def test_unknown_format(self, storage):
+        """An unknown format is rejected"""
+        with pytest.raises(ValueError):
+            export('xml', storage)
@@ -0,0 +1,111 @@
+import pickle
+import random
+
+import pytest
+
+from advisor import IncrementalAdvisor, fact_key, run_engine
+from batch_advisor import columns_from_facts, evaluate_batch
+from facts import FIELDS, BudgetFacts, FactBatch, FactError, values_of
+from rules import RULESET, BudgetAdvisor
+from test_rules import random_facts
+
+
+class TestBudgetFacts:
+    """Test cases for the validated, slotted fact record"""
+
+    def test_reads_like_user_facts(self, sample_user_data):
+        """A record has the same keys, values and equality as the dict it came from"""
+        facts = BudgetFacts.from_mapping(sample_user_data)
+
+        assert facts == sample_user_data
+        assert dict(facts) == sample_user_data
+        assert list(facts) == list(FIELDS)
+        assert facts['savings'] == facts.savings == 500
+        assert values_of(facts) == values_of(sample_user_data) == facts.as_tuple()
+        assert not hasattr(facts, '__dict__')
+
+    def test_values_converted_once(self):
+        """Strings, whole floats and 0/1 checkboxes become numbers and bools"""
+        facts = BudgetFacts("15", 10.0, 5, "yes", "1000", 25, 0, 500.5, "2000")
+
+        assert facts.as_tuple() == (15, 10, 5, True, 1000, 25, False, 500.5, 2000)
+        assert type(facts.debt_percent) is int and facts.expenses_tracking is True
+
+    @pytest.mark.parametrize("field, value", [
+        ('savings_percent', 101), ('debt_percent', -1), ('emergency_fund', -5),
+        ('savings', float('nan')), ('wants_percent', "lots"), ('goal_exists', "maybe"),
+        ('goal_amount', True),
+    ])
+    def test_bad_values_rejected(self, sample_user_data, field, value):
+        """Out-of-range or unparseable values name the field"""
+        with pytest.raises(FactError, match=f"'{field}'"):
+            BudgetFacts.from_mapping(dict(sample_user_data, **{field: value}))
+
+    def test_missing_field(self, sample_user_data):
+        """A mapping without one of the nine fields is rejected"""
+        del sample_user_data['savings']
+        with pytest.raises(FactError, match="missing field 'savings'"):
+            BudgetFacts.from_mapping(sample_user_data)
+
+    def test_read_only_and_hashable(self, sample_user_data):
+        """Records cannot be changed in place; replace() makes a validated copy"""
+        facts = BudgetFacts.from_mapping(sample_user_data)
+        with pytest.raises(AttributeError):
+            facts.savings = 0
+        changed = facts.replace(savings=900)
+
+        assert changed.savings == 900 and facts.savings == 500
+        assert {facts, facts.replace()} == {facts}
+        assert pickle.loads(pickle.dumps(changed)) == changed
+        with pytest.raises(FactError):
+            facts.replace(debt_percent=200)
+
+    def test_engine_and_memo_take_records(self, sample_user_data):
+        """The engine, incremental advisor and memo key treat a record like its dict"""
+        facts = BudgetFacts.from_mapping(sample_user_data)
+        engine = BudgetAdvisor()
+        expected = RULESET.evaluate(sample_user_data)
+
+        assert run_engine(engine, facts) == expected
+        assert RULESET.evaluate(facts) == expected
+        assert IncrementalAdvisor().evaluate(facts) == expected
+        assert fact_key(facts) == fact_key(sample_user_data)
+
+
+class TestFactBatch:
+    """Test cases for the columnar batch of records"""
+
+    def test_round_trip(self):
+        """Records come back out of a batch equal to what went in"""
+        rng = random.Random(4)
+        records = [BudgetFacts.from_mapping(random_facts(rng)) for _ in range(50)]
+        batch = FactBatch(records)
+
+        assert len(batch) == 50
+        assert list(batch) == records
+        assert batch[7] == records[7]
+        assert batch.nbytes == 50 * (7 * 8 + 2)
+
+    def test_evaluates_like_columns(self):
+        """evaluate_batch gives the same matrix for a batch as for dict columns"""
+        rng = random.Random(9)
+        facts = [random_facts(rng) for _ in range(200)]
+
+        matrix = evaluate_batch(FactBatch(facts))
+        assert (matrix == evaluate_batch(columns_from_facts(facts))).all()
+
+    def test_columns_share_memory(self):
+        """The NumPy columns are views of the batch's arrays, with bool checkboxes"""
+        batch = FactBatch([{field: 1 for field in FIELDS}])
+        columns = batch.columns()
+
+        assert columns['expenses_tracking'].dtype == bool
+        assert columns['savings'][0] == 1.0
+        assert not columns['savings'].flags.owndata
+
+    def test_append_validates(self, sample_user_data):
+        """Plain mappings are validated on the way in"""
+        batch = FactBatch()
+        with pytest.raises(FactError):
+            batch.append(dict(sample_user_data, wants_percent=150))
+        assert len(batch) == 0
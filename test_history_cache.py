@@ -0,0 +1,84 @@
+from history_cache import HistoryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHistoryCache:
+    """Test cases for the per-user advice history cache"""
+
+    def test_hit_and_miss_counted(self):
+        """Lookups are counted as hits or misses"""
+        cache = HistoryCache()
+        assert cache.get(1) is None
+        cache.put(1, ('row',))
+
+        assert cache.get(1) == ('row',)
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+        assert stats['hit_rate'] == 0.5
+
+    def test_entries_expire_after_ttl(self):
+        """Entries older than the TTL are treated as misses"""
+        clock = FakeClock()
+        cache = HistoryCache(ttl=10, clock=clock)
+        cache.put(1, ('row',))
+
+        clock.now = 9.9
+        assert cache.get(1) == ('row',)
+        clock.now = 10
+        assert cache.get(1) is None
+        assert cache.stats()['expirations'] == 1
+
+    def test_least_recently_used_evicted(self):
+        """The least recently read user is evicted first"""
+        cache = HistoryCache(max_users=2)
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        cache.get(1)
+        cache.put(3, 'c')
+
+        assert cache.get(2) is None
+        assert cache.get(1) == 'a'
+        assert cache.get(3) == 'c'
+        assert cache.stats()['evictions'] == 1
+
+    def test_invalidate_drops_entry(self):
+        """Invalidating a user forces the next read to the database"""
+        cache = HistoryCache()
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        cache.invalidate(1)
+
+        assert cache.get(1) is None
+        assert cache.get(2) == 'b'
+
+    def test_stale_put_ignored_after_invalidate(self):
+        """A read that raced with a write does not cache its stale result"""
+        cache = HistoryCache()
+        generation = cache.generation(1)
+        cache.invalidate(1)
+        cache.put(1, 'stale', generation)
+
+        assert cache.get(1) is None
+        cache.put(1, 'fresh', cache.generation(1))
+        assert cache.get(1) == 'fresh'
+
+    def test_generations_bounded(self):
+        """Generations are kept for at most max_users users, without reviving stale puts"""
+        cache = HistoryCache(max_users=2)
+        generation = cache.generation(1)
+        cache.invalidate(1)
+        for user_id in range(2, 100):
+            cache.invalidate(user_id)
+
+        assert cache.stats()['generations'] == 2
+        cache.put(1, 'stale', generation)
+        assert cache.get(1) is None
+        cache.put(1, 'fresh', cache.generation(1))
+        assert cache.get(1) == 'fresh'
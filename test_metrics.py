@@ -0,0 +1,72 @@
+import random
+
+from advisor import run_engine
+from metrics import EngineMetrics, InstrumentedEngineMixin
+from rules import RULESET, BudgetAdvisor, build_engine_class
+from test_rules import random_facts
+
+
+def instrumented():
+    metrics = EngineMetrics()
+    return build_engine_class(RULESET, 'InstrumentedBudgetAdvisor', metrics=metrics), metrics
+
+
+class TestEngineMetrics:
+    """Test cases for the engine instrumentation hooks"""
+
+    def test_fire_counts_match_rules(self):
+        """Every fired rule is counted once per run"""
+        engine_class, metrics = instrumented()
+        engine = engine_class()
+        rng = random.Random(5)
+        expected = dict.fromkeys(RULESET.names, 0)
+        for _ in range(50):
+            facts = random_facts(rng)
+            run_engine(engine, facts)
+            for name in RULESET.fired_rules(facts):
+                expected[name] += 1
+
+        snapshot = metrics.snapshot()
+        assert snapshot['fires'] == expected
+        assert snapshot['activations'] == sum(expected.values())
+        assert snapshot['facts_declared'] == 50
+        for phase in ('reset', 'declare', 'run'):
+            assert snapshot['phases'][phase]['count'] == 50
+            assert sum(snapshot['phases'][phase]['buckets']) == 50
+
+    def test_advice_unchanged(self, sample_user_data):
+        """Instrumented engines give the same advice as plain ones"""
+        engine_class, _ = instrumented()
+
+        plain = run_engine(BudgetAdvisor(), sample_user_data)
+        assert run_engine(engine_class(), sample_user_data) == plain
+
+    def test_plain_engine_has_no_hooks(self):
+        """With instrumentation off nothing is wrapped"""
+        assert not issubclass(BudgetAdvisor, InstrumentedEngineMixin)
+        assert BudgetAdvisor.run is BudgetAdvisor.__mro__[1].run
+
+    def test_prometheus_format(self, sample_user_data):
+        """The text export has counters for each rule and a cumulative histogram"""
+        engine_class, metrics = instrumented()
+        run_engine(engine_class(), dict(sample_user_data, savings_percent=5))
+
+        lines = metrics.prometheus().splitlines()
+        assert 'budget_engine_rule_fires_total{rule="low_savings"} 1' in lines
+        assert 'budget_engine_rule_fires_total{rule="pay_debt"} 0' in lines
+        assert 'budget_engine_phase_seconds_bucket{phase="run",le="+Inf"} 1' in lines
+        assert 'budget_engine_phase_seconds_count{phase="reset"} 1' in lines
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in lines
+                   if line.startswith('budget_engine_phase_seconds_bucket{phase="run"')]
+        assert buckets == sorted(buckets)
+
+    def test_write_textfile(self, tmp_path):
+        """Metrics can be written to a file for a textfile collector"""
+        metrics = EngineMetrics(['low_savings'])
+        metrics.fired('low_savings')
+        path = tmp_path / "budget.prom"
+
+        metrics.write_textfile(str(path))
+
+        assert 'budget_engine_rule_fires_total{rule="low_savings"} 1' in path.read_text()
+        assert [p.name for p in tmp_path.iterdir()] == ["budget.prom"]
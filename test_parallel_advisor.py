@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+import rules
+from parallel_advisor import ParallelAdvisor
+from rules import RULESET, RuleSet, parse_rules
+from test_rules import random_facts
+
+
+@pytest.fixture(scope='module')
+def advisor():
+    with ParallelAdvisor(workers=2, chunk_size=7, max_pending=3) as advisor:
+        yield advisor
+
+
+class TestParallelAdvisor:
+    """Worker processes give the same advice as the engine, in input order"""
+
+    def test_matches_single_process(self, advisor):
+        """Every record gets the advice of a direct evaluation"""
+        rng = random.Random(2)
+        records = [random_facts(rng) for _ in range(150)]
+
+        assert list(advisor.advise(records)) == [RULESET.evaluate(facts) for facts in records]
+
+    def test_score_pairs_records_with_masks(self, advisor):
+        """score() yields each input record with its rule mask, in order"""
+        rng = random.Random(6)
+        records = [dict(random_facts(rng), user_id=i) for i in range(30)]
+
+        scored = list(advisor.score(records))
+        assert [record['user_id'] for record, _ in scored] == list(range(30))
+        assert [mask for _, mask in scored] == [
+            RULESET.mask(RULESET.fired_indices(facts)) for facts in records]
+
+    def test_bounded_read_ahead(self, advisor):
+        """Records are read at most max_pending chunks ahead of the results"""
+        rng = random.Random(1)
+        consumed = []
+
+        def records():
+            for i in range(200):
+                consumed.append(i)
+                yield random_facts(rng)
+
+        results = advisor.score(records())
+        for yielded in range(1, 60):
+            next(results)
+            assert len(consumed) <= (advisor.max_pending + 1) * advisor.chunk_size + yielded
+        results.close()
+
+    def test_workers_use_the_parents_catalog(self, monkeypatch):
+        """Workers evaluate the catalog live in the parent, not a fresh rules.json load"""
+        reloaded = RuleSet(parse_rules([
+            {"id": 3, "rule": "some_debt", "condition": "debt_percent > 10",
+             "action": "warn_user('Watch your debt.')"},
+            {"id": 8, "rule": "much_debt", "condition": "debt_percent > 50",
+             "action": "warn_user('Watch your debt.')"},
+        ]))
+        monkeypatch.setattr(rules, 'RULESET', reloaded)
+        rng = random.Random(8)
+        records = [random_facts(rng) for _ in range(40)]
+
+        with ParallelAdvisor(workers=1, chunk_size=16) as advisor:
+            masks = [mask for _, mask in advisor.score(records)]
+
+        # Rules sharing a message are still told apart.
+        assert masks == [reloaded.mask(reloaded.fired_indices(facts)) for facts in records]
+        assert (1 << 3) | (1 << 8) in masks
+
+    def test_empty_input(self, advisor):
+        """No records means no work"""
+        assert list(advisor.advise([])) == []
+
+    def test_rejects_bad_sizes(self):
+        """Worker count and chunk size must be positive"""
+        with pytest.raises(ValueError):
+            ParallelAdvisor(workers=0)
+        with pytest.raises(ValueError):
+            ParallelAdvisor(chunk_size=0)
@@ -0,0 +1,80 @@
+import hashlib
+
+import pytest
+
+import passwords
+from passwords import LegacySha256Hasher, ScryptHasher
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing():
+    """Hash inline with a cheap scrypt cost so tests stay fast"""
+    hasher, pool = passwords._hasher, passwords._pool
+    passwords.configure(hasher=ScryptHasher(n=16), workers=0)
+    yield
+    passwords.configure(hasher=hasher)
+    passwords._pool = pool
+
+
+class TestPasswordHashing:
+    """Test cases for the pluggable password hasher"""
+
+    def test_hash_is_salted_and_self_describing(self):
+        """Each hash carries its own parameters and a fresh salt"""
+        first = passwords.hash_password("test123")
+        second = passwords.hash_password("test123")
+
+        assert first != second
+        assert first.split('$')[:4] == ['scrypt', '16', '8', '1']
+
+    def test_verify_current_hash(self):
+        """A current hash verifies and needs no rehash"""
+        encoded = passwords.hash_password("test123")
+
+        assert passwords.verify_password("test123", encoded) == (True, False)
+        assert passwords.verify_password("wrong", encoded) == (False, False)
+
+    def test_legacy_sha256_needs_rehash(self):
+        """Old unsalted SHA-256 rows still verify and are flagged for upgrade"""
+        legacy = hashlib.sha256(b"test123").hexdigest()
+
+        assert LegacySha256Hasher().hash("test123") == legacy
+        assert passwords.verify_password("test123", legacy) == (True, True)
+        assert passwords.verify_password("wrong", legacy) == (False, False)
+
+    def test_old_parameters_need_rehash(self):
+        """Hashes made with a lower cost verify but are flagged for upgrade"""
+        cheaper = ScryptHasher(n=8).hash("test123")
+
+        assert passwords.verify_password("test123", cheaper) == (True, True)
+
+    def test_unknown_scheme_rejected(self):
+        """Hashes from an unknown scheme are rejected"""
+        with pytest.raises(ValueError):
+            passwords.verify_password("test123", "md5$abc")
+
+    @pytest.mark.parametrize("encoded", [
+        "scrypt$16$8$1$c2FsdA==",            # truncated
+        "scrypt$sixteen$8$1$c2FsdA==$a2V5",  # non-numeric cost
+        "scrypt$16$8$1$c2FsdA$a2V5",         # bad base64 padding
+        "scrypt$15$8$1$c2FsdA==$a2V5",       # n not a power of two
+    ])
+    def test_corrupted_hash_fails_verification(self, encoded):
+        """A damaged stored hash fails verification instead of raising"""
+        assert passwords.verify_password("test123", encoded) == (False, False)
+
+    def test_invalid_cost_rejected(self):
+        """scrypt's n parameter must be a power of two"""
+        with pytest.raises(ValueError):
+            ScryptHasher(n=1000)
+
+    def test_hashing_in_worker_process(self):
+        """Hashing through the process pool gives verifiable hashes"""
+        passwords.configure(workers=1)
+        try:
+            encoded = passwords.hash_password("test123")
+            assert passwords.verify_password("test123", encoded) == (True, False)
+            # Never forked from the (multithreaded) server process.
+            assert passwords._pool._get_executor()._mp_context.get_start_method() == 'spawn'
+        finally:
+            passwords._pool.shutdown()
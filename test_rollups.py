@@ -0,0 +1,111 @@
+import datetime
+import random
+
+import pytest
+
+import rollups
+from rules import RULESET
+from storage import SQLiteStorage, utc_now
+from test_rules import random_facts
+from test_storage import advice_values
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "budget.db"))
+    storage.add_user("alice", "hash")
+    yield storage
+    storage.close()
+
+
+def log_cohort(storage, day, count, seed):
+    """Log ``count`` random evaluations on ``day``; returns their facts"""
+    rng = random.Random(seed)
+    cohort = [random_facts(rng) for _ in range(count)]
+    start = datetime.datetime.combine(day, datetime.time(8))
+    storage.insert_advice_batch([
+        advice_values(1, facts, None, RULESET.mask(RULESET.fired_indices(facts)))
+        + (start + datetime.timedelta(minutes=i),)
+        for i, facts in enumerate(cohort)
+    ])
+    return cohort
+
+
+DAY1 = datetime.date(2024, 3, 1)
+DAY2 = datetime.date(2024, 3, 2)
+
+
+class TestRollups:
+    """Test cases for the incrementally maintained advice_log rollups"""
+
+    def test_matches_full_scan(self, storage):
+        """Rolled-up stats equal a GROUP BY over every row"""
+        cohorts = {DAY1: log_cohort(storage, DAY1, 50, 1), DAY2: log_cohort(storage, DAY2, 30, 2)}
+
+        assert rollups.refresh(storage=storage) == 80
+
+        daily = rollups.daily_stats(DAY1, DAY2, storage=storage)
+        fires = rollups.rule_stats(DAY1, DAY2, storage=storage)
+        assert [row['day'] for row in daily] == [DAY1, DAY2]
+        for row in daily:
+            cohort = cohorts[row['day']]
+            assert row['evaluations'] == len(cohort)
+            assert row['avg_debt_percent'] == pytest.approx(
+                sum(facts['debt_percent'] for facts in cohort) / len(cohort))
+            for name in RULESET.names:
+                expected = sum(name in RULESET.fired_rules(facts) for facts in cohort)
+                assert fires[row['day']][name] == expected
+
+    def test_only_new_rows_folded(self, storage):
+        """A refresh processes just the rows since the high-water mark"""
+        log_cohort(storage, DAY1, 20, 1)
+        rollups.refresh(storage=storage)
+        assert rollups.refresh(storage=storage) == 0
+
+        log_cohort(storage, DAY1, 5, 2)
+
+        assert rollups.refresh(batch_size=2, storage=storage) == 5
+        assert rollups.daily_stats(DAY1, DAY1, storage=storage)[0]['evaluations'] == 25
+
+    def test_recent_rows_wait_for_grace(self, storage, sample_user_data):
+        """The mark stops before the first row younger than the grace period"""
+        log_cohort(storage, DAY1, 4, 1)
+        old = datetime.datetime.combine(DAY1, datetime.time(20))
+        storage.insert_advice_batch([
+            advice_values(1, sample_user_data, None) + (utc_now(),),
+            advice_values(1, sample_user_data, None) + (old,),
+        ])
+
+        assert rollups.refresh(storage=storage, grace=60) == 4
+        assert rollups.refresh(storage=storage, grace=60) == 0
+        assert storage.rollup_high_water(rollups.ROLLUP_NAME) == 4
+
+        assert rollups.refresh(storage=storage, grace=0) == 2
+        assert rollups.daily_stats(DAY1, DAY1, storage=storage)[0]['evaluations'] == 5
+
+    def test_text_rows_counted(self, storage, sample_user_data):
+        """Rows not yet backfilled count toward rule fires when their text is known"""
+        advice = "\n".join([RULESET.messages[0], RULESET.messages[1]])
+        created_at = datetime.datetime.combine(DAY1, datetime.time(9))
+        storage.insert_advice_batch([
+            advice_values(1, sample_user_data, advice) + (created_at,),
+            advice_values(1, sample_user_data, "Advice from an old catalog") + (created_at,),
+        ])
+
+        rollups.refresh(storage=storage)
+
+        assert rollups.daily_stats(DAY1, DAY1, storage=storage)[0]['evaluations'] == 2
+        counts = rollups.rule_stats(DAY1, DAY1, storage=storage)[DAY1]
+        assert counts[RULESET.names[0]] == counts[RULESET.names[1]] == 1
+        assert sum(counts.values()) == 2
+
+    def test_stale_high_water_rejected(self, storage):
+        """A job that lost the race to another refresh changes nothing"""
+        log_cohort(storage, DAY1, 3, 1)
+        rows = storage.advice_since(0, 10)
+        days, rule_days = rollups.fold(rows, RULESET)
+
+        assert storage.apply_rollup('test', 0, rows[-1][0], days, rule_days) is True
+        assert storage.apply_rollup('test', 0, rows[-1][0], days, rule_days) is False
+        assert storage.rollup_high_water('test') == rows[-1][0]
+        assert rollups.daily_stats(DAY1, DAY1, storage=storage)[0]['evaluations'] == 3
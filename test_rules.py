@@ -0,0 +1,272 @@
+import json
+import os
+import random
+
+import pytest
+
+from rules import (
+    FIELDS, RULES_PATH, RULESET, BudgetAdvisor, RuleCatalog, RuleCatalogError, RuleSet,
+    UserData, build_engine_class, load_rules, parse_rules,
+)
+
+
+def random_facts(rng):
+    return {
+        'savings_percent': rng.randint(0, 100),
+        'debt_percent': rng.randint(0, 100),
+        'subscription_percent': rng.randint(0, 100),
+        'expenses_tracking': rng.random() < 0.5,
+        'emergency_fund': rng.randint(0, 1000),
+        'wants_percent': rng.randint(0, 100),
+        'goal_exists': rng.random() < 0.5,
+        'savings': rng.randint(0, 3000),
+        'goal_amount': rng.randint(0, 3000),
+    }
+
+
+def run_engine(engine_class, facts):
+    engine = engine_class()
+    engine.reset()
+    engine.declare(UserData(**facts))
+    engine.run()
+    return engine.advice_list
+
+
+class TestRuleCatalog:
+    """Test cases for loading and validating rules.json"""
+
+    def test_catalog_loads_all_rules(self):
+        """Every rule in rules.json is compiled in file order"""
+        assert RULESET.names == (
+            'low_savings', 'pay_debt', 'encourage_investment', 'recommend_track_expenses',
+            'recommend_reduce_subscriptions', 'low_emergency_fund', 'low_savings_for_goal',
+            'high_wants_spending',
+        )
+
+    def test_action_kind_sets_prefix(self):
+        """The action kind decides the marker in front of the message"""
+        messages = dict(zip(RULESET.names, RULESET.messages))
+
+        assert messages['low_savings'] == "⚠️ Your savings are below 10% of your income."
+        assert messages['encourage_investment'] == "✅ Consider investment as part of your savings."
+        assert messages['low_emergency_fund'] == "📌 Build an emergency fund for unexpected expenses."
+
+    def test_unknown_field_rejected(self):
+        """A misspelled field name is reported with a suggestion"""
+        entries = [{"rule": "low_savings", "condition": "saving_percent < 10",
+                    "action": "warn_user('Low savings')"}]
+
+        with pytest.raises(RuleCatalogError, match="did you mean 'savings_percent'"):
+            parse_rules(entries)
+
+    @pytest.mark.parametrize("condition", [
+        "savings_percent <",
+        "__import__('os').system('true')",
+        "savings_percent < 'ten'",
+        "0 < savings_percent < 10",
+    ])
+    def test_bad_condition_rejected(self, condition):
+        """Conditions outside the small comparison grammar are rejected"""
+        entries = [{"rule": "bad", "condition": condition, "action": "warn_user('x')"}]
+
+        with pytest.raises(RuleCatalogError):
+            parse_rules(entries)
+
+    def test_bad_action_rejected(self):
+        """Only the known action kinds are accepted"""
+        entries = [{"rule": "bad", "condition": "debt_percent > 20", "action": "shout('x')"}]
+
+        with pytest.raises(RuleCatalogError, match="unknown action"):
+            parse_rules(entries)
+
+    def test_duplicate_rule_rejected(self):
+        """Rule names must be unique"""
+        entry = {"rule": "pay_debt", "condition": "debt_percent > 20", "action": "warn_user('x')"}
+
+        with pytest.raises(RuleCatalogError, match="Duplicate"):
+            parse_rules([entry, entry])
+
+    @pytest.mark.parametrize("rule_id", [-1, 63, "3", True])
+    def test_bad_rule_id_rejected(self, rule_id):
+        """Rule ids must be small non-negative integers"""
+        entries = [{"id": rule_id, "rule": "pay_debt", "condition": "debt_percent > 20",
+                    "action": "warn_user('x')"}]
+
+        with pytest.raises(RuleCatalogError, match="id must be"):
+            parse_rules(entries)
+
+    def test_duplicate_rule_id_rejected(self):
+        """Two rules cannot share a mask bit"""
+        entries = [{"id": 4, "rule": "a", "condition": "debt_percent > 20", "action": "warn_user('x')"},
+                   {"id": 4, "rule": "b", "condition": "debt_percent > 50", "action": "warn_user('y')"}]
+
+        with pytest.raises(RuleCatalogError, match="duplicate id 4"):
+            parse_rules(entries)
+
+    def test_load_rules_from_file(self, tmp_path):
+        """load_rules reads an alternative catalog file"""
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps([
+            {"rule": "no_goal", "condition": "NOT goal_exists OR goal_amount == 0",
+             "action": "suggest_action('Set a goal.')"},
+        ]))
+
+        ruleset = load_rules(str(path))
+
+        assert ruleset.fired_rules({'goal_exists': False, 'goal_amount': 100}) == ['no_goal']
+        assert ruleset.fired_rules({'goal_exists': True, 'goal_amount': 100}) == []
+
+
+class TestCompiledRuleSet:
+    """The compiled evaluator and the generated experta engine must agree"""
+
+    def test_evaluate_matches_engine(self):
+        """Native evaluation gives the same advice as BudgetAdvisor"""
+        rng = random.Random(7)
+        for _ in range(300):
+            facts = random_facts(rng)
+            assert set(RULESET.evaluate(facts)) == set(run_engine(BudgetAdvisor, facts))
+
+    def test_generated_engine_for_custom_catalog(self):
+        """Relational and single-field terms both work in a generated engine"""
+        ruleset = RuleSet(parse_rules([
+            {"rule": "short_of_goal", "condition": "goal_exists == true AND savings < goal_amount * 0.5",
+             "action": "recommend_action('Save more.')"},
+            {"rule": "moderate_wants", "condition": "wants_percent >= 10 AND wants_percent <= 30",
+             "action": "suggest_action('Wants are fine.')"},
+        ]))
+        engine_class = build_engine_class(ruleset)
+
+        facts = dict(random_facts(random.Random(1)), goal_exists=True, savings=400,
+                     goal_amount=1000, wants_percent=20)
+        assert set(run_engine(engine_class, facts)) == set(ruleset.evaluate(facts))
+        assert len(ruleset.evaluate(facts)) == 2
+
+        facts.update(savings=600, wants_percent=31)
+        assert run_engine(engine_class, facts) == ruleset.evaluate(facts) == []
+
+    def test_fired_indices_follow_catalog_order(self):
+        """Advice is returned in catalog order"""
+        facts = dict.fromkeys(FIELDS, 0)
+        facts.update(expenses_tracking=True, emergency_fund=1000, debt_percent=50)
+
+        assert RULESET.fired_rules(facts) == ['low_savings', 'pay_debt']
+
+    def test_rules_by_field(self):
+        """The field index lists every rule whose condition reads the field"""
+        for field in FIELDS:
+            assert RULESET.rules_by_field[field] == tuple(
+                i for i, rule in enumerate(RULESET.rules) if field in rule.fields)
+        assert RULESET.rules_by_field['goal_amount'] == tuple(
+            i for i, name in enumerate(RULESET.names) if name == 'low_savings_for_goal')
+
+    def test_masks_use_rule_ids(self):
+        """Masks are keyed by rule id, not catalog position"""
+        ruleset = RuleSet(parse_rules([
+            {"id": 9, "rule": "pay_debt", "condition": "debt_percent > 20", "action": "warn_user('Debt')"},
+            {"id": 2, "rule": "low_savings", "condition": "savings_percent < 10",
+             "action": "warn_user('Save')"},
+        ]))
+
+        assert ruleset.mask([0, 1]) == (1 << 9) | (1 << 2)
+        assert ruleset.mask_for_messages(["⚠️ Save"]) == 1 << 2
+        assert ruleset.mask_for_messages(["⚠️ Save", "Other"]) is None
+        assert ruleset.messages_for_mask((1 << 9) | (1 << 2) | (1 << 30)) == ["⚠️ Debt", "⚠️ Save"]
+
+    def test_mask_round_trip(self):
+        """Rendering a stored mask gives back the evaluated advice"""
+        rng = random.Random(3)
+        for _ in range(200):
+            facts = random_facts(rng)
+            mask = RULESET.mask(RULESET.fired_indices(facts))
+            assert RULESET.messages_for_mask(mask) == RULESET.evaluate(facts)
+
+
+def write_catalog(path, emergency_fund_cutoff=500, text=None):
+    """Write rules.json to ``path`` with another emergency fund threshold, or raw ``text``."""
+    if text is None:
+        with open(RULES_PATH, encoding='utf-8') as f:
+            entries = json.load(f)
+        for entry in entries:
+            if entry['rule'] == 'low_emergency_fund':
+                entry['condition'] = f"emergency_fund < {emergency_fund_cutoff}"
+        text = json.dumps(entries)
+    path.write_text(text, encoding='utf-8')
+    # Make every write visible to the mtime check, however fast the tests run.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestRuleCatalogReload:
+    """rules.json edits are picked up without a restart"""
+
+    def test_edit_swapped_in(self, tmp_path):
+        """A changed threshold is compiled and replaces the rule set and engine class"""
+        path = tmp_path / "rules.json"
+        write_catalog(path)
+        catalog = RuleCatalog(str(path), interval=0)
+        old_ruleset, old_engine_class = catalog.current
+        facts = dict(random_facts(random.Random(0)), emergency_fund=700)
+        assert 'low_emergency_fund' not in catalog.ruleset.fired_rules(facts)
+
+        write_catalog(path, emergency_fund_cutoff=1000)
+
+        assert catalog.reload_if_changed()
+        assert 'low_emergency_fund' in catalog.ruleset.fired_rules(facts)
+        assert catalog.engine_class.ruleset is catalog.ruleset
+        assert catalog.ruleset.fingerprint != old_ruleset.fingerprint
+        # Holders of the old pair still have a complete, working catalog.
+        assert old_engine_class.ruleset is old_ruleset
+        assert catalog.stats()['reloads'] == 1
+
+    def test_same_content_not_reloaded(self, tmp_path):
+        """Touching the file without changing it keeps the compiled catalog"""
+        path = tmp_path / "rules.json"
+        write_catalog(path)
+        catalog = RuleCatalog(str(path), interval=0)
+        current = catalog.current
+
+        write_catalog(path)
+
+        assert not catalog.reload_if_changed()
+        assert catalog.current is current
+
+    def test_bad_file_rejected(self, tmp_path):
+        """A file that does not compile is logged and the running rules are kept"""
+        path = tmp_path / "rules.json"
+        write_catalog(path)
+        catalog = RuleCatalog(str(path), interval=0)
+        current = catalog.current
+
+        for text in ('[{"rule": "broken"', '[{"rule": "x", "condition": "rent > 1", '
+                                            '"action": "warn_user(\'Rent\')"}]'):
+            write_catalog(path, text=text)
+            assert not catalog.reload_if_changed()
+            assert catalog.current is current
+        assert catalog.stats()['rejected'] == 2
+        assert "unknown field 'rent'" in catalog.stats()['last_error']
+
+        write_catalog(path, emergency_fund_cutoff=800)
+        assert catalog.reload_if_changed()
+        assert catalog.stats()['last_error'] is None
+
+    def test_checks_are_throttled(self, tmp_path):
+        """The file is looked at most once per interval unless forced"""
+        path = tmp_path / "rules.json"
+        write_catalog(path)
+        catalog = RuleCatalog(str(path), interval=3600)
+        catalog.reload_if_changed()
+
+        write_catalog(path, emergency_fund_cutoff=900)
+
+        assert not catalog.reload_if_changed()
+        assert catalog.reload_if_changed(force=True)
+
+    def test_negative_interval_disables(self, tmp_path):
+        """A negative interval turns automatic reloading off"""
+        path = tmp_path / "rules.json"
+        write_catalog(path)
+        catalog = RuleCatalog(str(path), interval=-1)
+        write_catalog(path, emergency_fund_cutoff=900)
+
+        assert not catalog.reload_if_changed()
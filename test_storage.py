@@ -0,0 +1,317 @@
+import datetime
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import backfill_rule_masks
+import db
+import passwords
+from rules import RULESET
+from storage import SQLiteStorage, utc_now
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "budget.db"))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def sqlite_db(storage):
+    """The db module running on a fresh SQLite backend"""
+    hasher, pool = passwords._hasher, passwords._pool
+    passwords.configure(hasher=passwords.ScryptHasher(n=16), workers=0)
+    previous = db._storage
+    db.configure_storage(storage)
+    yield db
+    db._storage = previous
+    db._history_cache.clear()
+    passwords.configure(hasher=hasher)
+    passwords._pool = pool
+
+
+def advice_values(user_id, data, advice_text, rule_mask=None):
+    return (user_id,) + tuple(data[field] for field in (
+        'savings_percent', 'debt_percent', 'subscription_percent', 'expenses_tracking',
+        'emergency_fund', 'wants_percent', 'goal_exists', 'savings', 'goal_amount'
+    )) + (advice_text, rule_mask)
+
+
+class TestSQLiteStorage:
+    """Test cases for the embedded SQLite backend"""
+
+    def test_wal_mode(self, storage):
+        """The database is opened in WAL mode with the tuned pragmas"""
+        conn = sqlite3.connect(storage.path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+    def test_users(self, storage):
+        """Users can be added, found and have their hash updated"""
+        assert storage.add_user("alice", "hash1") is True
+        assert storage.add_user("alice", "hash2") is False
+
+        user_id, password_hash = storage.find_user("alice")
+        assert password_hash == "hash1"
+        storage.update_password(user_id, "hash3")
+        assert storage.find_user("alice") == (user_id, "hash3")
+        assert storage.find_user("bob") is None
+
+    def test_history_newest_first(self, storage, sample_user_data):
+        """History returns the latest rows first, up to the limit"""
+        storage.add_user("alice", "hash")
+        user_id = storage.find_user("alice")[0]
+        start = datetime.datetime(2024, 1, 1, 12, 0, 0)
+        storage.insert_advice_batch([
+            advice_values(user_id, sample_user_data, f"advice {i}")
+            + (start + datetime.timedelta(minutes=i),)
+            for i in range(5)
+        ])
+
+        history = storage.advice_history(user_id, 3)
+        assert [row['advice_text'] for row in history] == ["advice 4", "advice 3", "advice 2"]
+        assert history[0]['created_at'] == start + datetime.timedelta(minutes=4)
+        assert set(history[0]) == {'id', 'created_at', 'savings_percent', 'debt_percent',
+                                   'wants_percent', 'advice_text', 'rule_mask'}
+
+    def test_keyset_pages(self, storage, sample_user_data):
+        """Pages follow each other without gaps or repeats, even within one second"""
+        storage.add_user("alice", "hash")
+        user_id = storage.find_user("alice")[0]
+        start = datetime.datetime(2024, 1, 1, 12, 0, 0)
+        storage.insert_advice_batch([
+            advice_values(user_id, sample_user_data, f"advice {i}")
+            + (start + datetime.timedelta(seconds=i // 3),)
+            for i in range(10)
+        ])
+
+        seen, before = [], None
+        while True:
+            page = storage.advice_history(user_id, 4, before)
+            seen += [row['advice_text'] for row in page]
+            if len(page) < 4:
+                break
+            before = db.history_cursor(page[-1])
+
+        assert seen == [f"advice {i}" for i in range(9, -1, -1)]
+
+    def test_history_uses_index(self, storage):
+        """Both history queries are served by the (user_id, created_at) index"""
+        from storage import SQLITE_SELECT_HISTORY_BEFORE_SQL, SQLITE_SELECT_HISTORY_SQL
+
+        conn = sqlite3.connect(storage.path)
+        now = datetime.datetime.now().isoformat(sep=' ')
+        for sql, params in ((SQLITE_SELECT_HISTORY_SQL, (1, 10)),
+                            (SQLITE_SELECT_HISTORY_BEFORE_SQL, (1, now, now, 5, 10))):
+            plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+            assert "idx_advice_log_user_created" in plan
+            assert "TEMP B-TREE" not in plan
+        conn.close()
+
+    def test_failed_batch_rolled_back(self, storage, sample_user_data):
+        """A batch that fails part-way leaves nothing behind"""
+        storage.add_user("alice", "hash")
+        user_id = storage.find_user("alice")[0]
+        now = datetime.datetime.now()
+        good = advice_values(user_id, sample_user_data, "ok") + (now,)
+        bad = advice_values(user_id + 100, sample_user_data, "no such user") + (now,)
+
+        with pytest.raises(sqlite3.IntegrityError):
+            storage.insert_advice_batch([good, bad])
+        assert storage.advice_history(user_id, 10) == []
+
+    def test_shared_connection_across_threads(self, storage, sample_user_data):
+        """Concurrent sessions can use the one shared connection"""
+        storage.add_user("alice", "hash")
+        user_id = storage.find_user("alice")[0]
+
+        def submit():
+            for _ in range(20):
+                storage.insert_advice(advice_values(user_id, sample_user_data, "advice")
+                                      + (utc_now(),))
+                storage.advice_history(user_id, 10)
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert storage.stats()['queries'] >= 160 + 2
+        assert len(storage.advice_history(user_id, 100)) == 80
+
+
+class TestSQLiteBackend:
+    """The data-access functions run unchanged on the SQLite backend"""
+
+    def test_signup_login_and_history(self, sqlite_db, sample_user_data):
+        """A full signup, login, submit and history round trip"""
+        assert sqlite_db.create_user("alice", "secret") is True
+        assert sqlite_db.create_user("alice", "other") is False
+        user_id = sqlite_db.check_credentials("alice", "secret")
+        assert user_id is not None
+        assert sqlite_db.check_credentials("alice", "wrong") is None
+
+        sqlite_db.insert_advice_to_db(user_id, sample_user_data, "Test advice")
+        history = sqlite_db.get_user_advice_history(user_id)
+
+        assert len(history) == 1
+        assert history[0]['advice_text'] == "Test advice"
+        assert isinstance(history[0]['created_at'], datetime.datetime)
+
+    def test_history_pages(self, sqlite_db, sample_user_data):
+        """Older pages continue where the cached first page ends"""
+        sqlite_db.create_user("alice", "secret")
+        user_id = sqlite_db.check_credentials("alice", "secret")
+        for i in range(sqlite_db.HISTORY_LIMIT + 3):
+            sqlite_db.insert_advice_to_db(user_id, sample_user_data, f"advice {i}")
+
+        first = sqlite_db.get_user_advice_history(user_id)
+        older = sqlite_db.get_user_advice_history(
+            user_id, before=sqlite_db.history_cursor(first[-1]))
+
+        assert len(first) == sqlite_db.HISTORY_LIMIT
+        assert [row['advice_text'] for row in older] == ["advice 2", "advice 1", "advice 0"]
+
+    def test_history_read_racing_a_flush_not_cached(self, sqlite_db, storage, sample_user_data,
+                                                    monkeypatch):
+        """A read that misses a row committed mid-read does not cache that result"""
+        sqlite_db.create_user("alice", "secret")
+        user_id = sqlite_db.check_credentials("alice", "secret")
+        commit = threading.Event()
+        write = sqlite_db.insert_advice_batch
+        monkeypatch.setattr(sqlite_db, 'insert_advice_batch',
+                            lambda rows: commit.wait(2) and write(rows))
+        writer = sqlite_db.enable_write_behind(batch_size=1, flush_interval=60)
+        read = storage.advice_history
+
+        def read_then_flush(*args):
+            # The database is read before the commit, pending_for after it.
+            rows = read(*args)
+            commit.set()
+            deadline = time.monotonic() + 2
+            while writer.stats()['batches'] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return rows
+
+        try:
+            sqlite_db.insert_advice_to_db(user_id, sample_user_data, "queued")
+            monkeypatch.setattr(storage, 'advice_history', read_then_flush)
+            sqlite_db.get_user_advice_history(user_id)
+            monkeypatch.setattr(storage, 'advice_history', read)
+
+            history = sqlite_db.get_user_advice_history(user_id)
+        finally:
+            commit.set()
+            sqlite_db.disable_write_behind(timeout=2)
+
+        assert [row['advice_text'] for row in history] == ["queued"]
+
+    def test_one_clock_for_every_insert_path(self, sqlite_db, storage, sample_user_data,
+                                            monkeypatch):
+        """Synchronous and write-behind inserts both store UTC, whatever the local zone"""
+        if not hasattr(time, 'tzset'):
+            pytest.skip("needs time.tzset")
+        monkeypatch.setenv('TZ', 'Asia/Kuala_Lumpur')
+        time.tzset()
+        try:
+            sqlite_db.create_user("alice", "secret")
+            user_id = sqlite_db.check_credentials("alice", "secret")
+            sqlite_db.enable_write_behind(batch_size=1, flush_interval=60)
+            try:
+                sqlite_db.insert_advice_to_db(user_id, sample_user_data, "queued")
+            finally:
+                sqlite_db.disable_write_behind(timeout=2)
+            sqlite_db.insert_advice_to_db(user_id, sample_user_data, "direct")
+        finally:
+            monkeypatch.delenv('TZ')
+            time.tzset()
+
+        rows = storage.advice_history(user_id, 10)
+        assert [row['advice_text'] for row in rows] == ["direct", "queued"]
+        database_now = datetime.datetime.fromisoformat(
+            sqlite3.connect(storage.path).execute("SELECT CURRENT_TIMESTAMP").fetchone()[0])
+        assert all(abs(row['created_at'] - database_now) < datetime.timedelta(minutes=1)
+                   for row in rows)
+
+    def test_legacy_hash_rehashed(self, sqlite_db, storage):
+        """Logging in with a legacy hash stores the current KDF's hash"""
+        storage.add_user("alice", passwords.LegacySha256Hasher().hash("secret"))
+
+        user_id = sqlite_db.check_credentials("alice", "secret")
+
+        stored_id, stored_hash = storage.find_user("alice")
+        assert stored_id == user_id
+        assert stored_hash.startswith("scrypt$")
+
+    def test_advice_stored_as_rule_mask(self, sqlite_db, storage, sample_user_data):
+        """Catalog advice is stored as a mask and rendered back to the same text"""
+        sqlite_db.create_user("alice", "secret")
+        user_id = sqlite_db.check_credentials("alice", "secret")
+        advice = RULESET.evaluate(dict(sample_user_data, savings_percent=5, debt_percent=30))
+
+        sqlite_db.insert_advice_to_db(user_id, sample_user_data, "\n".join(advice))
+
+        raw = storage.advice_history(user_id, 1)[0]
+        assert raw['advice_text'] is None
+        assert raw['rule_mask'] == RULESET.mask_for_messages(advice)
+        assert sqlite_db.get_user_advice_history(user_id)[0]['advice_text'] == "\n".join(advice)
+        counts = sqlite_db.rule_fire_counts()
+        assert counts['low_savings'] == counts['pay_debt'] == 1
+        assert counts['encourage_investment'] == 0
+
+    def test_unknown_advice_kept_as_text(self, sqlite_db, storage, sample_user_data):
+        """Advice the catalog does not know is stored verbatim"""
+        sqlite_db.create_user("alice", "secret")
+        user_id = sqlite_db.check_credentials("alice", "secret")
+
+        sqlite_db.insert_advice_to_db(user_id, sample_user_data, "Custom advice")
+
+        raw = storage.advice_history(user_id, 1)[0]
+        assert (raw['advice_text'], raw['rule_mask']) == ("Custom advice", None)
+
+    def test_unknown_backend(self, monkeypatch):
+        """A misspelled BUDGET_DB_BACKEND is reported"""
+        monkeypatch.setattr(db, 'BACKEND', 'postgres')
+        monkeypatch.setattr(db, '_storage', None)
+        with pytest.raises(ValueError, match="postgres"):
+            db.get_storage()
+
+
+class TestBackfill:
+    """Converting text rows from before rule masks existed"""
+
+    def test_backfill(self, sqlite_db, storage, sample_user_data):
+        """Catalog text becomes a mask; unrecognised text is left alone"""
+        storage.add_user("alice", "hash")
+        user_id = storage.find_user("alice")[0]
+        advice = [RULESET.messages[0], RULESET.messages[3]]
+        for text in ["\n".join(advice), "Advice from an old catalog", "\n".join(advice)]:
+            storage.insert_advice(advice_values(user_id, sample_user_data, text) + (utc_now(),))
+
+        counts = backfill_rule_masks.backfill(batch_size=2, progress=None)
+
+        assert counts == {'scanned': 3, 'converted': 2, 'unmatched': 1}
+        rows = storage.advice_history(user_id, 10)
+        assert [row['rule_mask'] for row in rows] == [RULESET.mask([0, 3]), None,
+                                                      RULESET.mask([0, 3])]
+        assert [row['advice_text'] for row in sqlite_db.get_user_advice_history(user_id)] == [
+            "\n".join(advice), "Advice from an old catalog", "\n".join(advice)]
+        assert backfill_rule_masks.backfill(progress=None)['converted'] == 0
+
+    def test_old_database_gains_column(self, tmp_path):
+        """Opening a database from before rule masks adds the column"""
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE advice_log (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                     "advice_text TEXT, created_at TEXT)")
+        conn.close()
+
+        SQLiteStorage(path).close()
+
+        conn = sqlite3.connect(path)
+        assert 'rule_mask' in {row[1] for row in conn.execute("PRAGMA table_info(advice_log)")}
+        conn.close()
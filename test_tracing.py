@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+
+import pytest
+
+import db
+import passwords
+import tracing
+from storage import SQLiteStorage
+
+
+@pytest.fixture
+def trace_records(caplog):
+    caplog.set_level(logging.WARNING, logger='budget.trace')
+    return lambda: [json.loads(r.getMessage()) for r in caplog.records if r.name == 'budget.trace']
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    hasher, pool = passwords._hasher, passwords._pool
+    passwords.configure(hasher=passwords.ScryptHasher(n=16), workers=0)
+    previous = db._storage
+    db.configure_storage(SQLiteStorage(str(tmp_path / 'budget.db')))
+    yield
+    db._storage = previous
+    db._history_cache.clear()
+    passwords.configure(hasher=hasher)
+    passwords._pool = pool
+
+
+class TestSpans:
+    """Spans are recorded inside a request and cost nothing outside one."""
+
+    def test_no_request_is_a_noop(self):
+        with tracing.span('outside') as record:
+            assert record is None
+        assert tracing.current() is None
+
+    def test_nested_spans(self):
+        with tracing.request('test', slow_ms=float('inf')) as trace:
+            with tracing.span('outer', kind='a'):
+                with tracing.span('inner') as inner:
+                    inner['rows'] = 3
+        assert [(s['name'], s['depth']) for s in trace.spans] == [('outer', 0), ('inner', 1)]
+        assert trace.spans[0]['kind'] == 'a'
+        assert trace.spans[1]['rows'] == 3
+        assert trace.spans[0]['duration_ms'] >= trace.spans[1]['duration_ms']
+        assert tracing.current() is None
+
+    def test_request_ids_are_unique(self):
+        with tracing.request('a', slow_ms=float('inf')) as first:
+            pass
+        with tracing.request('b', slow_ms=float('inf')) as second:
+            pass
+        assert first.request_id != second.request_id
+
+    def test_db_calls_are_traced(self, sqlite_db):
+        with tracing.request('login', slow_ms=float('inf')) as trace:
+            db.create_user('alice', 'pw')
+            db.check_credentials('alice', 'pw')
+            db.get_user_advice_history(1)
+        names = [s['name'] for s in trace.spans]
+        assert names == ['passwords.hash', 'db.add_user', 'db.find_user',
+                         'passwords.verify', 'db.history']
+
+
+class TestSlowLog:
+    """Slow requests, and a sample of the rest, are logged as JSON lines."""
+
+    def test_slow_request_logged(self, trace_records):
+        with tracing.request('slow', slow_ms=0) as trace:
+            with tracing.span('work'):
+                pass
+        [record] = trace_records()
+        assert record['request_id'] == trace.request_id
+        assert record['reason'] == 'slow'
+        assert [s['name'] for s in record['spans']] == ['work']
+
+    def test_fast_request_not_logged(self, trace_records):
+        with tracing.request('fast', slow_ms=float('inf'), sample_rate=0):
+            pass
+        assert trace_records() == []
+
+    def test_sampled_request_logged(self, trace_records):
+        with tracing.request('fast', slow_ms=float('inf'), sample_rate=1):
+            pass
+        assert [r['reason'] for r in trace_records()] == ['sampled']
+
+    def test_error_recorded(self, trace_records):
+        with pytest.raises(ValueError):
+            with tracing.request('broken', slow_ms=0):
+                raise ValueError("boom")
+        [record] = trace_records()
+        assert record['error'] == "ValueError: boom"
+
+
+class TestProfile:
+    """A profiled request dumps cProfile stats to ``PROFILE_DIR``."""
+
+    def test_profile_dumped(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tracing, 'PROFILE_DIR', str(tmp_path))
+        with tracing.request('advice', profile=True, slow_ms=float('inf')) as trace:
+            sum(range(1000))
+        assert os.listdir(tmp_path) == [f"advice-{trace.request_id}.prof"]
+
+    def test_profile_needs_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tracing, 'PROFILE_DIR', None)
+        with tracing.request('advice', profile=True, slow_ms=float('inf')):
+            pass
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from rules import RULESET
+from test_rules import random_facts
+from what_if import sweep
+
+
+@pytest.fixture
+def struggling_user(sample_user_data):
+    return dict(sample_user_data, savings_percent=5, wants_percent=40, debt_percent=25)
+
+
+class TestSweep:
+    """The batched grid agrees with evaluating each point on its own"""
+
+    def test_grid_matches_single_evaluation(self):
+        """Every grid point gets the advice of a one-off evaluation"""
+        rng = random.Random(4)
+        for _ in range(5):
+            facts = random_facts(rng)
+            result = sweep(facts, {'savings_percent': range(0, 101, 7), 'savings': range(0, 3000, 250)})
+            for i, savings_percent in enumerate(range(0, 101, 7)):
+                for j, savings in enumerate(range(0, 3000, 250)):
+                    point = dict(facts, savings_percent=savings_percent, savings=savings)
+                    assert [RULESET.names[k] for k in range(len(RULESET)) if result.fired[i, j, k]] \
+                        == RULESET.fired_rules(point)
+
+    def test_default_slider_range(self, struggling_user):
+        """Fields named without values sweep their whole slider range"""
+        result = sweep(struggling_user, ['savings_percent', 'wants_percent'])
+
+        assert result.shape == (101, 101)
+        assert len(result.records()) == 101 * 101
+
+    def test_one_axis(self, struggling_user):
+        """A single field can be swept on its own"""
+        result = sweep(struggling_user, ['debt_percent'])
+
+        assert result.fires('pay_debt').tolist() == [d > 20 for d in range(101)]
+
+    def test_rejects_bad_axes(self, struggling_user):
+        """Unknown fields, too many axes and unbounded fields are refused"""
+        with pytest.raises(KeyError):
+            sweep(struggling_user, ['rent'])
+        with pytest.raises(ValueError):
+            sweep(struggling_user, ['savings_percent', 'debt_percent', 'wants_percent'])
+        with pytest.raises(ValueError):
+            sweep(struggling_user, ['savings'])
+
+
+class TestMinimalChanges:
+    """The nearest grid point that clears each piece of advice"""
+
+    def test_slider_thresholds(self, struggling_user):
+        """Each warning clears at the threshold nearest the current value"""
+        changes = {c.rule: c.changes for c in
+                   sweep(struggling_user, ['savings_percent', 'wants_percent']).minimal_changes()}
+
+        assert changes == {'low_savings': {'savings_percent': 10},
+                           'high_wants_spending': {'wants_percent': 30}}
+
+    def test_matches_brute_force(self):
+        """No cheaper clearing change exists anywhere on the grid"""
+        rng = random.Random(8)
+        for _ in range(20):
+            facts = random_facts(rng)
+            result = sweep(facts, ['savings_percent', 'debt_percent'])
+            for change in result.minimal_changes():
+                cost = sum(abs(value - facts[field]) for field, value in change.changes.items())
+                cheapest = min(
+                    abs(s - facts['savings_percent']) + abs(d - facts['debt_percent'])
+                    for s in range(101) for d in range(101)
+                    if change.rule not in RULESET.fired_rules(
+                        dict(facts, savings_percent=s, debt_percent=d)))
+                assert cost == cheapest
+
+    def test_reports_new_advice(self, sample_user_data):
+        """A change that clears one rule but fires another says so"""
+        facts = dict(sample_user_data, savings_percent=5)
+        [change] = [c for c in sweep(facts, {'savings_percent': [0, 5, 25]}).minimal_changes()
+                    if c.rule == 'low_savings']
+
+        assert change.changes == {'savings_percent': 25}
+        assert change.introduces == ['encourage_investment']
+
+    def test_uncleared_rule_left_out(self, struggling_user):
+        """Advice the swept fields cannot affect is not listed"""
+        changes = sweep(struggling_user, ['wants_percent']).minimal_changes()
+
+        assert [c.rule for c in changes] == ['high_wants_spending']
@@ -0,0 +1,139 @@
+"""Lightweight request tracing for the Streamlit app.
+
+Each rerun of ``app.py`` runs inside ``request()``, which gives it a request id
+and collects the timed ``span()`` blocks entered while it runs: pool checkout,
+each query, password hashing and the engine run. Requests slower than
+``BUDGET_TRACE_SLOW_MS`` are written as one JSON line to the ``budget.trace``
+logger (and to ``BUDGET_TRACE_LOG`` if set). A ``BUDGET_TRACE_SAMPLE_RATE``
+fraction of the other requests is logged too, as a baseline.
+
+Outside a request ``span()`` does nothing but one context-variable lookup.
+
+With ``BUDGET_PROFILE_DIR`` set, a session opened with ``?profile=1`` also runs
+every rerun under cProfile and dumps the stats there, one ``.prof`` file per
+request, for ``python -m pstats`` or snakeviz.
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+SLOW_MS = float(os.environ.get('BUDGET_TRACE_SLOW_MS', '500'))
+SAMPLE_RATE = float(os.environ.get('BUDGET_TRACE_SAMPLE_RATE', '0'))
+TRACE_LOG = os.environ.get('BUDGET_TRACE_LOG')
+PROFILE_DIR = os.environ.get('BUDGET_PROFILE_DIR')
+
+logger = logging.getLogger('budget.trace')
+
+
+class Trace:
+    """The spans recorded during one request."""
+
+    def __init__(self, name: str, request_id: Optional[str] = None):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans: List[dict] = []
+        self.depth = 0
+        self.error = None
+
+    def as_dict(self) -> dict:
+        return {
+            'request_id': self.request_id,
+            'name': self.name,
+            'duration_ms': round(self.duration * 1e3, 3),
+            'error': self.error,
+            'spans': self.spans,
+        }
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('budget_trace', default=None)
+_log_configured = False
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as part of the current request; a no-op outside one.
+
+    Yields the span's attribute dict (None outside a request) so the block can
+    add attributes it only knows at the end, e.g. whether a cache hit.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    record = {'name': name, 'depth': trace.depth, 'start_ms': 0.0, 'duration_ms': 0.0}
+    if attrs:
+        record.update(attrs)
+    trace.spans.append(record)
+    trace.depth += 1
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        end = time.perf_counter()
+        trace.depth -= 1
+        record['start_ms'] = round((start - trace.start) * 1e3, 3)
+        record['duration_ms'] = round((end - start) * 1e3, 3)
+
+
+def _configure_log():
+    global _log_configured
+    if _log_configured:
+        return
+    _log_configured = True
+    if TRACE_LOG:
+        handler = logging.FileHandler(TRACE_LOG, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+def _finish(trace: Trace, slow_ms: float, sample_rate: float):
+    duration_ms = trace.duration * 1e3
+    if duration_ms >= slow_ms:
+        reason = 'slow'
+    elif sample_rate and random.random() < sample_rate:
+        reason = 'sampled'
+    else:
+        return
+    _configure_log()
+    record = trace.as_dict()
+    record['reason'] = reason
+    logger.warning(json.dumps(record, default=str))
+
+
+@contextmanager
+def request(name: str, profile: bool = False, slow_ms: Optional[float] = None,
+            sample_rate: Optional[float] = None):
+    """Trace one request (one Streamlit rerun); yields its ``Trace``."""
+    trace = Trace(name)
+    token = _current.set(trace)
+    profiler = cProfile.Profile() if profile and PROFILE_DIR else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield trace
+    except Exception as exc:
+        trace.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        trace.duration = time.perf_counter() - trace.start
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}-{trace.request_id}.prof"))
+        _current.reset(token)
+        _finish(trace, SLOW_MS if slow_ms is None else slow_ms,
+                SAMPLE_RATE if sample_rate is None else sample_rate)